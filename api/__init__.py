@@ -8,16 +8,33 @@ import os
 import sys
 import json
 import re
-import requests
+import threading
 from datetime import date
 from api.helper import log
+from api.worker import WorkerPool, HIGH, LOW
+from api.dedup import TTLSet, event_key
+from api.journal import Journal
+from api.fastpath import FastPath, no_op_reason
+from api.reorder import ReorderBuffer
+from api.send import SendClient
+from api.collector import ResponseCollector
+from api.outbound import OutboundScheduler
+from api.spool import Spool
+from api.templates import Menu
+from api.actions import SenderActions
+from api.messenger_profile import MENU_PAYLOADS, set_messenger_profile
+from api.fanout import FanOut
+from api.breaker import OPEN
+from api.shedding import LoadShedder, SenderStates, QUIET, BUSY,\
+    SCORE_FLOW, busy_message, classify_sender
+from api import metrics
 from flask import Flask, request
 import random
 import traceback
 from flask_pymongo import PyMongo
 from api.errors import FacebookException, IdentityException,\
     MultiplePlayersException, PlatformException, NotCaptainException,\
-    BatterException
+    BatterException, PLATFORMMESSAGE, DatabaseException
 from random import randint
 from base64 import b64encode
 from api.variables import *
@@ -32,7 +49,112 @@ mongo = PyMongo(app)
 from api.db import get_user, lookup_player, save_user, update_player,\
     already_in_league, lookup_player_email, add_homeruns, add_score, add_ss,\
     submit_score, get_games, get_upcoming_games, league_leaders, add_game,\
-    change_batter, fun_meter, get_events, game_summary
+    change_batter, fun_meter, get_events, game_summary, user_batch,\
+    batched_user, graph_breaker, graph_bulkhead, warm_cache
+
+
+# shared by every thread so the send api connections are kept alive
+send_client = SendClient(GRAPH_URL + "me/messages",
+                         PAGE_ACCESS_TOKEN,
+                         pool_size=SEND_POOL_SIZE,
+                         connect_timeout=SEND_CONNECT_TIMEOUT,
+                         read_timeout=SEND_READ_TIMEOUT,
+                         batch_url=GRAPH_URL,
+                         breaker=graph_breaker,
+                         bulkhead=graph_bulkhead)
+# the spool is drained by a single thread so the outbound workers have to
+# deliver its messages, never that thread itself
+if SPOOL_DIR != "" and OUTBOUND_WORKERS <= 0:
+    raise ValueError("SPOOL_DIR needs OUTBOUND_WORKERS")
+# batches are posted by the thread handling the events so they can not be
+# spooled, paced or delivered by the outbound workers
+if SEND_BATCH and (SPOOL_DIR != "" or
+                   OUTBOUND_WORKERS > 0 or
+                   OUTBOUND_PAGE_RATE > 0 or
+                   OUTBOUND_RECIPIENT_RATE > 0):
+    raise ValueError("SEND_BATCH can not be used with SPOOL_DIR, "
+                     "OUTBOUND_WORKERS or the outbound rates")
+# paces and retries the replies, keeping each recipient's in order
+outbound = OutboundScheduler(send_client.post,
+                             workers=OUTBOUND_WORKERS,
+                             page_rate=OUTBOUND_PAGE_RATE,
+                             page_burst=OUTBOUND_PAGE_BURST,
+                             recipient_rate=OUTBOUND_RECIPIENT_RATE,
+                             recipient_burst=OUTBOUND_RECIPIENT_BURST,
+                             retries=OUTBOUND_RETRIES,
+                             backoff=OUTBOUND_BACKOFF,
+                             max_backoff=OUTBOUND_MAX_BACKOFF,
+                             size=SENDER_STATES_SIZE,
+                             blocked=lambda: graph_breaker.state() == OPEN)
+# typing indicators and read receipts are cosmetic so never wait on them
+actions = SenderActions(send_client.post,
+                        workers=SENDER_ACTION_WORKERS,
+                        threshold=TYPING_THRESHOLD)
+# independent reads of a step are made at once
+fan_out = FanOut(workers=FANOUT_WORKERS,
+                 deadline=FANOUT_DEADLINE,
+                 error=lambda: PlatformException(PLATFORMMESSAGE))
+# the replies are written to disk first so a restart does not lose them
+if SPOOL_DIR != "":
+    spool = Spool(SPOOL_DIR,
+                  outbound.submit,
+                  depth=outbound.depth,
+                  segment_bytes=SPOOL_SEGMENT_BYTES,
+                  in_flight=SPOOL_IN_FLIGHT)
+    # deliver what a previous worker left behind
+    spool.start()
+else:
+    spool = None
+# the events already received so redeliveries can be dropped
+seen_events = TTLSet("dedup", DEDUP_SIZE, DEDUP_TTL)
+# the handlers below are only looked up once called since they are defined
+# further down
+# informational requests get a busy reply when too many events are waiting
+shedder = LoadShedder(QUEUE_CAPACITY, SHED_TYPING_DEPTH)
+# the last stored state of the recent senders so their events are put in
+# the right lane and the ignored ones are dropped early
+sender_states = SenderStates(SENDER_STATES_SIZE)
+busy_replies = WorkerPool("busy", 1, lambda sender_id: send_busy(sender_id))
+busy_dropped = metrics.counter("shed.busy_dropped")
+if FAST_PATH:
+    app.wsgi_app = FastPath(app.wsgi_app,
+                            ignored=lambda sender: ignored_sender(sender))
+if WORKERS > 0:
+    # one lane per worker so each sender's events stay in order
+    # and score submissions go ahead of informational requests
+    workers = WorkerPool("events",
+                         WORKERS,
+                         lambda job: background_events(job),
+                         key=lambda job: events_sender(job),
+                         priority=lambda job: events_priority(job),
+                         max_wait=PRIORITY_MAX_WAIT)
+else:
+    workers = None
+if WORKERS > 0 and REORDER_HOLD > 0:
+    reorder = ReorderBuffer(REORDER_HOLD,
+                            REORDER_SIZE,
+                            lambda sender_id, events: dispatch(sender_id,
+                                                               events))
+else:
+    reorder = None
+# the raw webhook posts so they can be replayed
+if JOURNAL_DIR != "":
+    journal = Journal(JOURNAL_DIR,
+                      JOURNAL_SEGMENT_BYTES,
+                      JOURNAL_SEGMENT_SECONDS)
+else:
+    journal = None
+# the menu is registered in the background so a slow graph does not hold up
+# the start
+if PERSISTENT_MENU:
+    threading.Thread(target=set_messenger_profile,
+                     name="profile",
+                     daemon=True).start()
+# likewise the season wide data is loaded before the first user asks
+if PLATFORM_CACHE_WARMUP:
+    threading.Thread(target=warm_cache,
+                     name="warmup",
+                     daemon=True).start()
 
 
 @app.route('/', methods=['GET'])
@@ -49,65 +171,54 @@ def verify():
 
 
 def typing_on(sender_id):
-    """Lets the user know the bot is processing
+    """Lets the user know the bot is processing (in the background)
     """
-    params = {
-        "access_token": PAGE_ACCESS_TOKEN
-    }
-    headers = {
-        "Content-Type": "application/json"
-    }
-    data = {
-            "recipient": {
-                         "id": sender_id},
-            "sender_action": "typing_on"
-        }
-    data = json.dumps(data)
-    r = requests.post("https://graph.facebook.com/v2.6/me/messages",
-                      headers=headers, data=data, params=params)
-    if r.status_code != 200:
-        log(r.status_code)
-        log(r.text)
+    actions.typing_on(sender_id)
 
 
 def typing_off(sender_id):
     """Lets the user know the bot is processing
     """
-    params = {
-        "access_token": PAGE_ACCESS_TOKEN
-    }
-    headers = {
-        "Content-Type": "application/json"
-    }
     data = {
             "recipient": {
                          "id": sender_id},
             "sender_action": "typing_off"
         }
-    data = json.dumps(data)
-    r = requests.post("https://graph.facebook.com/v2.6/me/messages",
-                      headers=headers, data=data, params=params)
-    if r.status_code != 200:
-        log(r.status_code)
-        log(r.text)
+    queue_outbound(data, sender_id=sender_id)
 
 
 def punch_it(data):
-    """Sends the message to the user
-    """
-    params = {
-        "access_token": PAGE_ACCESS_TOKEN
-    }
-    headers = {
-        "Content-Type": "application/json"
-    }
+    """Sends the message (dict or already encoded string) to the user
+    """
     log(data)
-    data = json.dumps(data)
-    r = requests.post("https://graph.facebook.com/v2.6/me/messages",
-                      headers=headers, data=data, params=params)
-    if r.status_code != 200:
-        log(r.status_code)
-        log(r.text)
+    queue_outbound(data)
+
+
+def send_batch(messages):
+    """Sends the messages (dicts or encoded strings) as graph batch requests
+
+    The messages graph failed to send are sent once more, on their own and
+    in order. They are not retried after that since SEND_BATCH runs without
+    OUTBOUND_WORKERS, so the outbound scheduler sends them inline.
+    """
+    for data in messages:
+        log(data)
+    results = send_client.post_batch(messages)
+    for (data, result) in zip(messages, results):
+        code = None if result is None else result[0]
+        if code is None or code == 429 or code >= 500:
+            outbound.submit(data)
+
+
+def queue_outbound(data, sender_id=None):
+    """Queues a send api message (dict or encoded string) for delivery
+
+    The recipient (sender_id) is read from the message when not given.
+    """
+    if spool is not None:
+        spool.append(data)
+    else:
+        outbound.submit(data, sender_id=sender_id)
 
 
 def send_buttons(message_text, sender_id, buttons):
@@ -118,6 +229,20 @@ def send_buttons(message_text, sender_id, buttons):
         sender_id: the facebook id (?)
         buttons: the list of buttons
     """
+    for data in button_messages(message_text, sender_id, buttons):
+        punch_it(data)
+
+
+def button_messages(message_text, sender_id, buttons):
+    """Returns the messages needed to send the user some buttons
+
+    Parameters:
+        message_text: the message (subheader) (string)
+        sender_id: the facebook id (?)
+        buttons: the list of buttons
+    Returns:
+        messages: the send api messages (list)
+    """
     if len(buttons) > 0 and len(buttons) <= 3:
         b = "button"
         data = {
@@ -134,7 +259,7 @@ def send_buttons(message_text, sender_id, buttons):
                                            }
                              }
                 }
-        punch_it(data)
+        return [data]
     elif len(buttons) > 0 and len(buttons) <= 29:
         b = "generic"
         # uncomment and add if you want add a url
@@ -168,11 +293,11 @@ def send_buttons(message_text, sender_id, buttons):
                                            }
                              }
                 }
-        punch_it(data)
+        return [data]
     else:
         # split into two messages
-        send_buttons(message_text, sender_id, buttons=buttons[0:29])
-        send_buttons("More options", sender_id, buttons=buttons[29:])
+        return (button_messages(message_text, sender_id, buttons[0:29]) +
+                button_messages("More options", sender_id, buttons[29:]))
 
 
 def send_quick_replies(message_text, sender_id, quick_replies):
@@ -183,6 +308,19 @@ def send_quick_replies(message_text, sender_id, quick_replies):
         sender_id: the facebook id (?)
         quick_replies: list of quick replies
     """
+    punch_it(quick_reply_message(message_text, sender_id, quick_replies))
+
+
+def quick_reply_message(message_text, sender_id, quick_replies):
+    """Returns the message that sends some quick replies to the user
+
+    Parameters:
+        message_text: the text for the message (string)
+        sender_id: the facebook id (?)
+        quick_replies: list of quick replies
+    Returns:
+        data: the send api message (dict)
+    """
     # there is no point of breaking up quick replies
     data = {
             "recipient": {
@@ -192,7 +330,7 @@ def send_quick_replies(message_text, sender_id, quick_replies):
                         "quick_replies": quick_replies
                         }
             }
-    punch_it(data)
+    return data
 
 
 def send_message(message_text, sender_id, quick_replies=[], buttons=[]):
@@ -204,6 +342,40 @@ def send_message(message_text, sender_id, quick_replies=[], buttons=[]):
         quick_replies: list of quick replies
         buttons: list of buttons
     """
+    for data in build_messages(message_text,
+                               sender_id,
+                               quick_replies=quick_replies,
+                               buttons=buttons):
+        punch_it(data)
+    actions.finished(sender_id)
+    if TYPING_OFF_AFTER_REPLY:
+        typing_off(sender_id)
+
+
+def build_messages(message_text, sender_id, quick_replies=[], buttons=[]):
+    """Returns the send api messages for a reply
+
+    Parameters:
+        message_text: the text for the message (string)
+        sender_id: the facebook id (?)
+        quick_replies: list of quick replies
+        buttons: list of buttons
+    Returns:
+        messages: the send api messages in the order to send them (list)
+    """
+    menu = quick_replies if len(quick_replies) > 0 else buttons
+    if isinstance(menu, Menu) and isinstance(sender_id, str):
+        # only the sender and text are spliced into the encoded menu
+        return menu.messages(message_text, sender_id, build_messages)
+    if len(quick_replies) > 0:
+        # send some quick replies
+        return [quick_reply_message(message_text,
+                                    sender_id,
+                                    quick_replies=quick_replies)]
+    elif len(buttons) > 0:
+        # send some buttons
+        return button_messages(message_text, sender_id, buttons)
+    # just send the normal text
     data = {
             "recipient": {
                         "id": sender_id},
@@ -211,122 +383,338 @@ def send_message(message_text, sender_id, quick_replies=[], buttons=[]):
                         "text": message_text
                         }
             }
-    if len(quick_replies) > 0:
-        # send some quick replies
-        send_quick_replies(message_text,
-                           sender_id,
-                           quick_replies=quick_replies)
-    elif len(buttons) > 0:
-        # send some buttons
-        send_buttons(message_text, sender_id, buttons)
-    else:
-        # just send the normal text
-        punch_it(data)
-    typing_off(sender_id)
+    return [data]
 
 
 @app.route('/', methods=['POST'])
 def webhook():
     # endpoint for processing incoming messaging events
+    if journal is not None:
+        # journal the body as received before anything can go wrong
+        journal.append(request.get_data())
     data = request.get_json()
     # you may not want to log every incoming message in production,
     # but it's good for testing
     log("Incoming message")
     log(data)
+    failed = False
     if data["object"] == "page":
-        for entry in data["entry"]:
-            for messaging_event in entry["messaging"]:
+        for sender_id, events in group_events(data).items():
+            if workers is None:
+                # the other senders are still handled, only the failed
+                # ones are forgotten for the redelivery to handle
                 try:
-                    if messaging_event.get("message"):
-                        # someone sent us a message
-                        # the facebook ID of the person sending you the message
-                        sender_id = messaging_event["sender"]["id"]
-                        # the recipient's ID, should be your page's facebook ID
-                        recipient_id = messaging_event["recipient"]["id"]
-                        # the message's text
-                        if "text" in messaging_event['message'].keys():
-                            message_text = messaging_event["message"]["text"]
-                        else:
-                            message_text = ""
-                            parse_message(message_text, sender_id)
-                        typing_on(sender_id)
-                        (user, created) = get_user(sender_id, mongo)
-                        if created or user["pid"] < 0:
-                            log("Trying to figure you out")
-                            log(user)
-                            if user["state"] == PID:
-                                # see if can do it based upon name
-                                log("Matching name based upon facebook")
-                                determine_player(user, sender_id)
-                            elif user["state"] == EMAIL:
-                                # see if they gave us an email
-                                log("Checking email")
-                                check_email(user, message_text, sender_id)
-                            log(user)
-                        else:
-                            log(user)
-                            payload = get_payload(messaging_event)
-                            figure_out(user, message_text, payload, sender_id)
-                            log(user)
-                    if messaging_event.get("delivery"):
-                        # delivery confirmation
-                        pass
-                    if messaging_event.get("optin"):
-                        # optin confirmation
-                        pass
-                    if messaging_event.get("postback"):
-                        # user clicked/tapped "postback"
-                        # button in earlier message
-                        sender_id = messaging_event["sender"]["id"]
-                        # the recipient's ID, should be your page's facebook ID
-                        recipient_id = messaging_event["recipient"]["id"]
-                        # the message's text
-                        pay = get_postback_payload(messaging_event)
-                        if pay is not None:
-                            (user, created) = get_user(sender_id, mongo)
-                            log(user)
-                            update_payload(user,
-                                           pay,
-                                           sender_id)
-                            log(user)
-                except FacebookException as e:
-                    log(str(e))
-                    sender_id = messaging_event["sender"]["id"]
-                    send_message(str(e), sender_id)
-                except NotCaptainException as e:
-                    sender_id = messaging_event["sender"]["id"]
-                    (user, created) = get_user(sender_id, mongo)
-                    user['state'] = BASE
-                    save_user(user, mongo)
-                    log(str(e))
-                    send_message(str(e), sender_id)
-                except PlatformException as e:
-                    sender_id = messaging_event["sender"]["id"]
-                    (user, created) = get_user(sender_id, mongo)
-                    if user['pid'] > 0:
-                        user['state'] = BASE
-                        save_user(user, mongo)
-                    else:
-                        # dont know who this is
-                        user['state'] = PID
-                        save_user(user, mongo)
-                    log(str(e))
-                    send_message(str(e), sender_id)
-                except Exception as e:
+                    handle_events(events)
+                except Exception:
                     traceback.print_exc()
-                    sender_id = messaging_event["sender"]["id"]
-                    log(str(e))
-                    if user["pid"] > 0:
-                        user['state'] = BASE
-                        save_user(user, mongo)
-                    else:
-                        user['state'] = PID
-                        save_user(user, mongo)
-                    send_message("Something fucked up, let an admin know",
-                                 sender_id)
+                    failed = True
+            elif reorder is not None:
+                # put back in order with any of their events still coming
+                reorder.add(sender_id, events)
+            else:
+                # acknowledge right away and let a worker handle it
+                dispatch(sender_id, events)
+    if failed:
+        return "failed", 500
     return "ok", 200
 
 
+def dispatch(sender_id, events):
+    """Queue a sender's events for the background workers
+
+    Parameters:
+        sender_id: the facebook id of the sender (string)
+        events: the sender's messaging events (list)
+    """
+    event_class = classify_sender(sender_id, events, sender_states)
+    decision = shedder.decide(events,
+                              workers.depth(),
+                              event_class=event_class)
+    if decision == BUSY:
+        reply_busy(sender_id)
+    else:
+        workers.submit((events, decision == QUIET, event_class))
+
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    # the metrics of the bot, protected by the verify token
+    if (not request.args.get("verify_token") == VERIFY_TOKEN):
+        return "Verification token mismatch", 403
+    return json.dumps(metrics.snapshot()), 200
+
+
+def valid_event(messaging_event):
+    """Returns whether the messaging event can be processed
+
+    Parameters:
+        messaging_event: the facebook messaging event (dict)
+    Returns:
+        True if it has a sender id, False otherwise
+    """
+    return (isinstance(messaging_event, dict) and
+            isinstance(messaging_event.get("sender"), dict) and
+            "id" in messaging_event["sender"])
+
+
+def group_events(data):
+    """Groups the messaging events of a webhook post by their sender
+
+    Events the bot does nothing with and redelivered events are dropped.
+    Events that fail to be handled are forgotten again so facebook's
+    redelivery of them gets through, see handle_events.
+
+    Parameters:
+        data: the webhook post (dict)
+    Returns:
+        senders: sender id to their list of events in order (dict)
+    """
+    senders = {}
+    for entry in data["entry"]:
+        for messaging_event in entry["messaging"]:
+            if not valid_event(messaging_event):
+                log("Invalid messaging event")
+                continue
+            sender_id = messaging_event["sender"]["id"]
+            # skip what the bot does nothing with before any i/o
+            reason = no_op_reason(messaging_event)
+            if reason is None and ignored_sender(sender_id):
+                reason = "ignored"
+            if reason is not None:
+                metrics.counter("filtered." + reason).inc()
+                continue
+            key = event_key(messaging_event)
+            if key is not None and not seen_events.add(key):
+                log("Dropping redelivered event {}".format(key))
+                continue
+            senders.setdefault(sender_id, []).append(messaging_event)
+    return senders
+
+
+def forget_events(events):
+    """Forget that the messaging events were delivered
+
+    Parameters:
+        events: the messaging events (list)
+    """
+    for messaging_event in events:
+        key = event_key(messaging_event)
+        if key is not None:
+            seen_events.discard(key)
+
+
+def handle_events(events, callback=None, typing=typing_on, collector=None):
+    """Process a sender's messaging events in order
+
+    The user is loaded once and saved once for all the events. Without a
+    callback the replies are collected and sent together once the user is
+    saved.
+
+    Parameters:
+        events: the messaging events of one sender (list)
+        callback: the thing to call with a result (function)
+        typing: the thing to call to show the bot is typing (function)
+        collector: collects the replies for the caller to send
+                   (ResponseCollector)
+    """
+    send = callback is None and collector is None
+    sender_id = events[0]["sender"]["id"]
+    if callback is None:
+        if collector is None:
+            collector = ResponseCollector(
+                            build_messages,
+                            typing,
+                            typing_off_after_reply=TYPING_OFF_AFTER_REPLY)
+        callback = collector.callback
+        typing = collector.typing
+    if send and MARK_SEEN and any(event.get("message") for event in events):
+        actions.mark_seen(sender_id)
+    try:
+        with user_batch(mongo):
+            for messaging_event in events:
+                if collector is not None:
+                    collector.event()
+                handle_event(messaging_event,
+                             callback=callback,
+                             typing=typing)
+            # remember where they are for prioritizing their next events
+            user = batched_user(sender_id)
+            if user is not None:
+                sender_states.remember(user['fid'], user['state'])
+    except Exception:
+        # let facebook's redelivery of the events through again
+        forget_events(events)
+        raise
+    finally:
+        if send:
+            # only turn off the indicator if it was actually shown
+            shown = [typed for typed in collector.typed
+                     if actions.finished(typed)]
+        if send and SEND_BATCH:
+            collector.flush_batch(send_batch, shown=shown)
+        elif send:
+            collector.flush(punch_it, typing_off, shown=shown)
+
+
+def handle_event(messaging_event, callback=send_message, typing=typing_on):
+    """Process a single messaging event
+
+    Parameters:
+        messaging_event: the facebook messaging event (dict)
+        callback: the thing to call with a result (function)
+        typing: the thing to call to show the bot is typing (function)
+    """
+    # unbound if getting the user is what failed
+    user = None
+    try:
+        if messaging_event.get("message"):
+            # someone sent us a message
+            # the facebook ID of the person sending you the message
+            sender_id = messaging_event["sender"]["id"]
+            # the recipient's ID, should be your page's facebook ID
+            recipient_id = messaging_event["recipient"]["id"]
+            # the message's text
+            if "text" in messaging_event['message'].keys():
+                message_text = messaging_event["message"]["text"]
+            else:
+                message_text = ""
+                parse_message(message_text, sender_id)
+            typing(sender_id)
+            (user, created) = get_user(sender_id, mongo)
+            if created or user["pid"] < 0:
+                log("Trying to figure you out")
+                log(user)
+                if user["state"] == PID:
+                    # see if can do it based upon name
+                    log("Matching name based upon facebook")
+                    determine_player(user, sender_id, callback=callback)
+                elif user["state"] == EMAIL:
+                    # see if they gave us an email
+                    log("Checking email")
+                    check_email(user, message_text, sender_id,
+                                callback=callback)
+                log(user)
+            else:
+                log(user)
+                payload = get_payload(messaging_event)
+                figure_out(user, message_text, payload, sender_id,
+                           callback=callback)
+                log(user)
+        if messaging_event.get("delivery"):
+            # delivery confirmation
+            pass
+        if messaging_event.get("optin"):
+            # optin confirmation
+            pass
+        if messaging_event.get("postback"):
+            # user clicked/tapped "postback"
+            # button in earlier message
+            sender_id = messaging_event["sender"]["id"]
+            # the recipient's ID, should be your page's facebook ID
+            recipient_id = messaging_event["recipient"]["id"]
+            # the message's text
+            pay = get_postback_payload(messaging_event)
+            if pay is not None:
+                (user, created) = get_user(sender_id, mongo)
+                log(user)
+                update_payload(user,
+                               pay,
+                               sender_id,
+                               callback=callback)
+                log(user)
+    except (FacebookException, DatabaseException) as e:
+        log(str(e))
+        sender_id = messaging_event["sender"]["id"]
+        callback(str(e), sender_id)
+    except NotCaptainException as e:
+        sender_id = messaging_event["sender"]["id"]
+        (user, created) = get_user(sender_id, mongo)
+        user['state'] = BASE
+        save_user(user, mongo)
+        log(str(e))
+        callback(str(e), sender_id)
+    except PlatformException as e:
+        sender_id = messaging_event["sender"]["id"]
+        (user, created) = get_user(sender_id, mongo)
+        if user['pid'] > 0:
+            user['state'] = BASE
+            save_user(user, mongo)
+        else:
+            # dont know who this is
+            user['state'] = PID
+            save_user(user, mongo)
+        log(str(e))
+        callback(str(e), sender_id)
+    except Exception as e:
+        traceback.print_exc()
+        sender_id = messaging_event["sender"]["id"]
+        log(str(e))
+        if user is not None:
+            if user["pid"] > 0:
+                user['state'] = BASE
+                save_user(user, mongo)
+            else:
+                user['state'] = PID
+                save_user(user, mongo)
+        callback("Something fucked up, let an admin know",
+                 sender_id)
+
+
+def skip_typing(sender_id):
+    """Used instead of typing_on when shedding load
+    """
+    pass
+
+
+def background_events(job):
+    """Process a sender's messaging events from a background worker
+
+    Parameters:
+        job: the sender's events, whether to skip typing and their class
+    """
+    (events, quiet, event_class) = job
+    with app.app_context():
+        handle_events(events, typing=skip_typing if quiet else typing_on)
+
+
+def events_sender(job):
+    """Returns the facebook id of who sent the job's messaging events
+    """
+    return job[0][0]["sender"]["id"]
+
+
+def ignored_sender(sender_id):
+    """Returns whether the bot never answers the sender
+
+    A remembered IGNORE state is only trusted for IGNORED_STATE_TTL seconds
+    so a sender whose stored state was changed is answered again.
+    """
+    return (sender_id in IGNORED_SENDERS or
+            sender_states.get(sender_id,
+                              max_age=IGNORED_STATE_TTL) == IGNORE)
+
+
+def events_priority(job):
+    """Returns the priority of a job, score flow ahead of the rest
+    """
+    return HIGH if job[2] == SCORE_FLOW else LOW
+
+
+def reply_busy(sender_id):
+    """Queue the busy reply for the sender unless too many are waiting
+    """
+    if busy_replies.depth() < max(QUEUE_CAPACITY, 1):
+        busy_replies.submit(sender_id)
+    else:
+        busy_dropped.inc()
+
+
+def send_busy(sender_id):
+    """Send the busy reply to the sender
+    """
+    punch_it(busy_message(sender_id))
+
+
 def get_postback_payload(message):
     """Returns the payload of the post
     """
@@ -393,54 +781,80 @@ def random_compliment():
     return COMPLIMENT[random.randint(0, len(COMPLIMENT) - 1)]
 
 
-def base_options(user, sender_id, callback=send_message, buttons=True):
+# the base options do not change so they are encoded once
+BASE_BUTTONS = Menu([{"type": "postback",
+                      "title": UPCOMING_TITLE,
+                      "payload": "{}".format(UPCOMING)},
+                     {"type": "postback",
+                      "title": LEAGUE_LEADERS_TITLE,
+                      "payload": "{}".format(LEADERS)},
+                     {"type": "postback",
+                      "title": EVENTS_TITLE,
+                      "payload": "{}".format(EVENTS)},
+                     {"type": "postback",
+                      "title": FUN_TITLE,
+                      "payload": "{}".format(FUN)}
+                     ], "buttons")
+CAPTAIN_BUTTONS = Menu(BASE_BUTTONS +
+                       [{"type": "postback",
+                         "title": SUBMIT_SCORE_TITLE,
+                         "payload": "{}".format(GAMES)}], "buttons")
+BASE_QUICK_REPLIES = Menu([{"content_type": "text",
+                            "title": UPCOMING_TITLE,
+                            "payload": "{}".format(UPCOMING)},
+                           {"content_type": "text",
+                            "title": LEAGUE_LEADERS_TITLE,
+                            "payload": "{}".format(LEADERS)},
+                           {"content_type": "text",
+                            "title": EVENTS_TITLE,
+                            "payload": "{}".format(EVENTS)},
+                           {"content_type": "text",
+                            "title": FUN_TITLE,
+                            "payload": "{}".format(FUN)}
+                           ], "quick_replies")
+CAPTAIN_QUICK_REPLIES = Menu(BASE_QUICK_REPLIES +
+                             [{"content_type": "text",
+                               "title": SUBMIT_SCORE_TITLE,
+                               "payload": "{}".format(GAMES)}],
+                             "quick_replies")
+
+
+def base_options(user, sender_id, callback=send_message, buttons=True,
+                 optional=False):
     """Present the base options
 
     Parameters:
         user: the user dictionary (dict)
         sender_id: the sender facebook id (? something)
         callback: the thing to call with a result (function)
+        optional: skip them when the persistent menu has them (boolean)
     """
+    if optional and PERSISTENT_MENU:
+        return
+    captain = user['captain'] >= 0
     if buttons:
-        options = [{"type": "postback",
-                    "title": UPCOMING_TITLE,
-                    "payload": "{}".format(UPCOMING)},
-                   {"type": "postback",
-                    "title": LEAGUE_LEADERS_TITLE,
-                    "payload": "{}".format(LEADERS)},
-                   {"type": "postback",
-                    "title": EVENTS_TITLE,
-                    "payload": "{}".format(EVENTS)},
-                   {"type": "postback",
-                    "title": FUN_TITLE,
-                    "payload": "{}".format(FUN)}
-                   ]
-        if user['captain'] >= 0:
-            options.append({"type": "postback",
-                            "title": SUBMIT_SCORE_TITLE,
-                            "payload": "{}".format(GAMES)},)
+        options = CAPTAIN_BUTTONS if captain else BASE_BUTTONS
         callback(random_intro(), sender_id, buttons=options)
     else:
-        options = [{"content_type": "text",
-                    "title": UPCOMING_TITLE,
-                    "payload": "{}".format(UPCOMING)},
-                   {"content_type": "text",
-                    "title": LEAGUE_LEADERS_TITLE,
-                    "payload": "{}".format(LEADERS)},
-                   {"content_type": "text",
-                    "title": EVENTS_TITLE,
-                    "payload": "{}".format(EVENTS)},
-                   {"content_type": "text",
-                    "title": FUN_TITLE,
-                    "payload": "{}".format(FUN)}
-                   ]
-        if user['captain'] >= 0:
-            options.append({"content_type": "text",
-                            "title": SUBMIT_SCORE_TITLE,
-                            "payload": "{}".format(GAMES)},)
+        options = CAPTAIN_QUICK_REPLIES if captain else BASE_QUICK_REPLIES
         callback(random_intro(), sender_id, quick_replies=options)
 
 
+def cancel_options(user, sender_id, callback=send_message):
+    """Present the base options after cancelling, just saying it was
+    cancelled when the persistent menu has them
+
+    Parameters:
+        user: the user dictionary (dict)
+        sender_id: the sender facebook id (? something)
+        callback: the thing to call with a result (function)
+    """
+    if PERSISTENT_MENU:
+        callback(CANCELING_COMMENT, sender_id)
+    else:
+        base_options(user, sender_id, callback=callback)
+
+
 def display_homeruns(user, sender_id, callback=send_message):
     """Display the batters for homerunes"""
     options = []
@@ -524,16 +938,16 @@ def display_league_leaders(user, sender_id, callback=send_message):
         sender_id: the sender facebook id (? something)
         callback: the thing to call with a result (function)
     """
-    leaders = league_leaders("hr")
+    (hr, ss) = fan_out.run([lambda: league_leaders("hr"),
+                            lambda: league_leaders("ss")])
     comment = [HR_TITLE]
-    for leader in leaders:
+    for leader in hr:
         comment.append("{} ({}): {:d}".format(leader['name'],
                                               leader['team'],
                                               leader['hits']))
     callback("\n".join(comment), sender_id)
-    leaders = league_leaders("ss")
     comment = [SS_TITLE]
-    for leader in leaders:
+    for leader in ss:
         comment.append("{} ({}): {:d}".format(leader['name'],
                                               leader['team'],
                                               leader['hits']))
@@ -559,6 +973,21 @@ def display_fun(user, sender_id, callback=send_message):
     callback(message, sender_id)
 
 
+SUMMARY_REPLIES = Menu([{'content_type': "text",
+                         "title": SUBMIT_TITLE,
+                         "payload": "submit",
+                         "image_url":
+                         "http://www.clker.com/cliparts/Z/n/g/w/C/y/"
+                         "green-dot-md.png"},
+                        {'content_type': "text",
+                         "title": CANCEL_COMMENT,
+                         "payload": "cancel",
+                         "image_url":
+                         "http://www.clker.com/cliparts/T/G/b/7/r/A/"
+                         "red-dot-md.png"},
+                        ], "quick_replies")
+
+
 def display_summary(user, sender_id, callback=send_message):
     """displays a submit score summary
 
@@ -568,18 +997,7 @@ def display_summary(user, sender_id, callback=send_message):
         callback: the thing to call with a result (function)
     """
     summary = game_summary(user)
-    replies = [{'content_type': "text",
-                "title": SUBMIT_TITLE,
-                "payload": "submit",
-                "image_url":
-                "http://www.clker.com/cliparts/Z/n/g/w/C/y/green-dot-md.png"},
-               {'content_type': "text",
-                "title": CANCEL_COMMENT,
-                "payload": "cancel",
-                "image_url":
-                "http://www.clker.com/cliparts/T/G/b/7/r/A/red-dot-md.png"},
-               ]
-    callback("\n".join(summary), sender_id, quick_replies=replies)
+    callback("\n".join(summary), sender_id, quick_replies=SUMMARY_REPLIES)
 
 
 def display_events(user, sender_id, callback=send_message):
@@ -624,7 +1042,7 @@ def determine_player(user, sender_id, callback=send_message):
             save_user(user, mongo)
             callback(WELCOME_LEAGUE.format(user['name']), sender_id)
             callback(HELP_COMMENT, sender_id)
-            base_options(user, sender_id, callback=callback)
+            base_options(user, sender_id, callback=callback, optional=True)
 
 
 def check_email(user, message, sender_id, callback=send_message):
@@ -655,7 +1073,10 @@ def check_email(user, message, sender_id, callback=send_message):
                 save_user(user, mongo)
                 callback(WELCOME_LEAGUE.format(user['name']), sender_id)
                 callback(HELP_COMMENT, sender_id)
-                base_options(user, sender_id, callback=callback)
+                base_options(user,
+                             sender_id,
+                             callback=callback,
+                             optional=True)
         except IdentityException:
             callback(NOT_FOUND_COMMENT, sender_id)
     else:
@@ -719,6 +1140,17 @@ def update_payload(user,
         sender_id: the facebook id (?)
         callback: the thing to call with a result (function)
     """
+    if payload == GET_STARTED:
+        figure_out(user, "", None, sender_id, callback=callback)
+        return
+    if payload in MENU_PAYLOADS and user['state'] not in (IGNORE,
+                                                          PID,
+                                                          EMAIL,
+                                                          BASE):
+        # picked from the persistent menu part way through submitting
+        user['state'] = BASE
+        user['game'] = {}
+        save_user(user, mongo)
     if user['state'] == BASE:
         # quite a few options
         if payload == GAMES:
@@ -827,6 +1259,7 @@ def figure_out(user, message_text, payload, sender_id, callback=send_message):
                 print("yep")
                 update_payload(user, GAMES, sender_id, callback=callback)
             else:
+                # the only reply to what was not understood so always sent
                 base_options(user, sender_id, callback=callback)
         elif user['state'] == GAMES:
             if message_text.lower() in ["cancel",
@@ -836,7 +1269,7 @@ def figure_out(user, message_text, payload, sender_id, callback=send_message):
                 user['state'] = BASE
                 save_user(user, mongo)
                 callback(CANCELING_COMMENT, sender_id)
-                base_options(user, sender_id, callback=callback)
+                base_options(user, sender_id, callback=callback, optional=True)
             elif payload is None:
                 user['state'] = BASE
                 save_user(user, mongo)
@@ -854,7 +1287,7 @@ def figure_out(user, message_text, payload, sender_id, callback=send_message):
                                          CANCEL_COMMENT.lower()):
                     user['state'] = BASE
                     save_user(user, mongo)
-                    base_options(user, sender_id, callback=callback)
+                    cancel_options(user, sender_id, callback=callback)
                 else:
                     callback(NEED_GAME_NUMBER_COMMENT, sender_id)
                     user['state'] = BASE
@@ -867,7 +1300,7 @@ def figure_out(user, message_text, payload, sender_id, callback=send_message):
                                         CANCEL_COMMENT.lower()]:
                 user['state'] = BASE
                 save_user(user, mongo)
-                base_options(user, sender_id, callback=callback)
+                cancel_options(user, sender_id, callback=callback)
             elif score < 0:
                 # said something random
                 callback(DIDNT_UNDERSTAND_COMMENT, sender_id)
@@ -0,0 +1,170 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Sends the sender actions without holding up the events
+'''
+import heapq
+import itertools
+import os
+import threading
+import time
+from api.worker import WorkerPool
+from api import metrics
+
+
+def sender_action(sender_id, action):
+    """Returns the send api message for a sender action
+
+    Parameters:
+        sender_id: the facebook id (string)
+        action: typing_on, typing_off or mark_seen (string)
+    Returns:
+        data: the send api message (dict)
+    """
+    return {"recipient": {"id": sender_id}, "sender_action": action}
+
+
+class _Typing():
+    def __init__(self, sender_id):
+        self.sender_id = sender_id
+        self.sent = False
+        self.finished = False
+
+
+class SenderActions():
+    """Sends typing indicators and read receipts in the background
+
+    The typing indicator is only sent once a sender's events have been
+    processing for threshold seconds, so quick replies never need one, and
+    is skipped altogether if they finish before it is sent. The replies do
+    not go through here so when the sender finishes while their typing
+    indicator is still being posted it could reach graph after the replies
+    and stay on, so typing off is posted as soon as it has been. When the
+    queue of actions is full new ones are dropped since they are only
+    cosmetic.
+
+    Parameters:
+        send: posts a send api message (function)
+        workers: the number of sending threads, 0 sends inline (int)
+        threshold: seconds of processing before showing typing (float)
+        size: the most actions waiting to be sent (int)
+        clock: the function returning the current time (function)
+    """
+    def __init__(self, send, workers=1, threshold=0, size=1000,
+                 clock=time.monotonic):
+        self.send = send
+        self.threshold = threshold
+        self.size = size
+        self.clock = clock
+        self._condition = threading.Condition()
+        self._typing = {}
+        self._due = []
+        self._sequence = itertools.count()
+        self._pid = None
+        if workers > 0:
+            self.pool = WorkerPool("actions", workers, self._post)
+        else:
+            self.pool = None
+        self.sent = metrics.counter("actions.sent")
+        self.skipped = metrics.counter("actions.typing_skipped")
+        self.cleared = metrics.counter("actions.typing_cleared")
+        self.dropped = metrics.counter("actions.dropped")
+
+    def typing_on(self, sender_id):
+        """Show the sender the bot is typing once past the threshold
+
+        Parameters:
+            sender_id: the facebook id (string)
+        """
+        with self._condition:
+            if sender_id in self._typing:
+                return
+            typing = _Typing(sender_id)
+            self._typing[sender_id] = typing
+            if self.threshold > 0:
+                self._start()
+                heapq.heappush(self._due,
+                               (self.clock() + self.threshold,
+                                next(self._sequence),
+                                typing))
+                self._condition.notify()
+                return
+        self._submit(typing)
+
+    def finished(self, sender_id):
+        """Stop the sender's typing indicator from being sent
+
+        Parameters:
+            sender_id: the facebook id (string)
+        Returns:
+            shown: whether the typing indicator was sent (boolean)
+        """
+        with self._condition:
+            typing = self._typing.pop(sender_id, None)
+            if typing is None:
+                return False
+            typing.finished = True
+            if not typing.sent:
+                self.skipped.inc()
+            return typing.sent
+
+    def mark_seen(self, sender_id):
+        """Let the sender know their message was seen
+
+        Parameters:
+            sender_id: the facebook id (string)
+        """
+        self._submit(sender_action(sender_id, "mark_seen"))
+
+    def _submit(self, item):
+        if self.pool is None:
+            self._post(item)
+        elif self.pool.depth() >= self.size:
+            self.dropped.inc()
+        else:
+            self.pool.submit(item)
+
+    def _post(self, item):
+        if not isinstance(item, _Typing):
+            self.send(item)
+            self.sent.inc()
+            return
+        with self._condition:
+            if item.finished:
+                return
+            item.sent = True
+        try:
+            self.send(sender_action(item.sender_id, "typing_on"))
+            self.sent.inc()
+        finally:
+            with self._condition:
+                late = item.finished
+        if late:
+            # the replies may have beaten it to graph
+            self.send(sender_action(item.sender_id, "typing_off"))
+            self.sent.inc()
+            self.cleared.inc()
+
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        threading.Thread(target=self._run,
+                         name="actions",
+                         daemon=True).start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if len(self._due) == 0:
+                    self._condition.wait()
+                    continue
+                wait = self._due[0][0] - self.clock()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                (__, __, typing) = heapq.heappop(self._due)
+                if typing.finished:
+                    continue
+            self._submit(typing)
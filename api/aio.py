@@ -0,0 +1,333 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Asyncio version of the webhook served as an ASGI application
+
+The sender's user is loaded and saved with motor and the replies are sent
+with aiohttp while the state machine itself runs unchanged on a thread pool,
+so one process keeps many conversations in flight. The other mongo calls of
+the state machine still block its thread on flask-pymongo: creating a user
+motor did not find and looking up whether a player is already in the
+league. Needs the packages in requirements-async.txt.
+'''
+import asyncio
+import json
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+import aiohttp
+from motor.motor_asyncio import AsyncIOMotorClient
+import api
+from api import metrics
+from api.db import user_batch
+from api.helper import log
+from api.fastpath import FastPath
+from api.reorder import ReorderBuffer
+from api.collector import ResponseCollector
+from api.shedding import BUSY, QUIET, busy_message
+from api.variables import URL, GRAPH_URL, PAGE_ACCESS_TOKEN, VERIFY_TOKEN,\
+    ASYNC_THREADS, REORDER_HOLD, REORDER_SIZE, TYPING_OFF_AFTER_REPLY,\
+    SEND_CONNECT_TIMEOUT, SEND_READ_TIMEOUT
+
+
+class _PendingUsers():
+    """Stands in for mongo to collect the users a step saved"""
+    def __init__(self):
+        self.db = self
+        self.users = self
+        self.saved = []
+
+    def save(self, user):
+        self.saved.append(user)
+
+
+class AsyncBot():
+    """An ASGI application that processes the messaging events with asyncio
+
+    Each sender's events are processed in the order they arrived while
+    different senders are processed concurrently.
+
+    Parameters:
+        users: the async users collection (defaults to motor on URL)
+        threads: the number of threads running state machine steps (int)
+    """
+    def __init__(self, users=None, threads=ASYNC_THREADS):
+        self._users = users
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.session = None
+        self._tails = {}
+        self.waiting = 0
+        self.fast_path = FastPath(None, ignored=api.ignored_sender)
+        self.loop = None
+        if REORDER_HOLD > 0:
+            self.reorder = ReorderBuffer(REORDER_HOLD,
+                                         REORDER_SIZE,
+                                         self.released)
+        else:
+            self.reorder = None
+        self.in_flight = metrics.gauge("aio.in_flight")
+        self.steps = metrics.histogram("aio.step_seconds")
+        self.sent = metrics.counter("aio.sent")
+        self.send_errors = metrics.counter("aio.send_errors")
+        self.failed = metrics.counter("aio.failed")
+
+    @property
+    def users(self):
+        if self._users is None:
+            client = AsyncIOMotorClient(URL)
+            self._users = client.get_default_database().users
+        return self._users
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        body = await _read_body(receive)
+        if scope["path"] != "/":
+            (status, text) = (404, "Not found")
+        elif scope["method"] == "GET":
+            (status, text) = self.verify(scope["query_string"])
+        elif scope["method"] == "POST":
+            (status, text) = self.webhook(body)
+        else:
+            (status, text) = (405, "Method not allowed")
+        await send({"type": "http.response.start",
+                    "status": status,
+                    "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body",
+                    "body": text.encode("utf-8")})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.drain()
+                if self.session is not None:
+                    await self.session.close()
+                self.executor.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def verify(self, query_string):
+        """Echo back the challenge when registering the webhook
+
+        Parameters:
+            query_string: the raw query string (bytes)
+        Returns:
+            (status, text): the status code and the body of the response
+        """
+        args = parse_qs(query_string.decode("utf-8"))
+        if (args.get("hub.mode") == ["subscribe"] and
+                args.get("hub.challenge")):
+            if args.get("hub.verify_token") != [VERIFY_TOKEN]:
+                log("Not right token")
+                return (403, "Verification token mismatch")
+            return (200, args["hub.challenge"][0])
+        return (200, "Hello world")
+
+    def webhook(self, body):
+        """Schedule the messaging events of a post and acknowledge it
+
+        Parameters:
+            body: the raw body of the post (bytes)
+        Returns:
+            (status, text): the status code and the body of the response
+        """
+        if self.fast_path.no_op(body):
+            self.fast_path.filtered.inc()
+            self.fast_path.filtered_bytes.inc(len(body))
+            return (200, "ok")
+        if api.journal is not None:
+            api.journal.append(body)
+        data = json.loads(body.decode("utf-8"))
+        log("Incoming message")
+        log(data)
+        if data.get("object") == "page":
+            for sender_id, events in api.group_events(data).items():
+                if self.reorder is not None:
+                    self.loop = asyncio.get_event_loop()
+                    self.reorder.add(sender_id, events)
+                else:
+                    self.dispatch(sender_id, events)
+        return (200, "ok")
+
+    def dispatch(self, sender_id, events):
+        """Shed or schedule a sender's events
+
+        Parameters:
+            sender_id: the facebook id of the sender (string)
+            events: the sender's messaging events (list)
+        """
+        event_class = api.classify_sender(sender_id,
+                                          events,
+                                          api.sender_states)
+        decision = api.shedder.decide(events,
+                                      self.waiting,
+                                      event_class=event_class)
+        if decision == BUSY:
+            asyncio.ensure_future(self.post(busy_message(sender_id)))
+        else:
+            self.schedule(sender_id, events, quiet=decision == QUIET)
+
+    def released(self, sender_id, events):
+        """Dispatch events released by the reorder buffer on the loop"""
+        self.loop.call_soon_threadsafe(self.dispatch, sender_id, events)
+
+    def schedule(self, sender_id, events, quiet=False):
+        """Process the sender's events after their earlier events
+
+        Parameters:
+            sender_id: the facebook id of the sender (string)
+            events: the sender's messaging events (list)
+            quiet: whether to skip the typing indicator (boolean)
+        Returns:
+            task: the task processing the events (asyncio.Task)
+        """
+        previous = self._tails.get(sender_id)
+        task = asyncio.ensure_future(self.process(events, previous, quiet))
+        self._tails[sender_id] = task
+        self.waiting += len(events)
+
+        def done(finished):
+            self.waiting -= len(events)
+            if self._tails.get(sender_id) is finished:
+                del self._tails[sender_id]
+        task.add_done_callback(done)
+        return task
+
+    async def drain(self):
+        """Wait for every scheduled event to be processed"""
+        while len(self._tails) > 0:
+            await asyncio.wait(list(self._tails.values()))
+
+    async def process(self, events, previous=None, quiet=False):
+        """Process a sender's events
+
+        Parameters:
+            events: the sender's messaging events (list)
+            previous: the task processing their earlier events (asyncio.Task)
+            quiet: whether to skip the typing indicator (boolean)
+        """
+        if previous is not None:
+            await asyncio.wait([previous])
+        loop = asyncio.get_event_loop()
+        sender_id = events[0]["sender"]["id"]
+        self.in_flight.inc()
+        start = loop.time()
+        try:
+            typing = None
+            if not quiet and any(event.get("message") for event in events):
+                # cosmetic so the replies never wait on it
+                typing = asyncio.ensure_future(self.quietly(
+                            self.action(sender_id, "typing_on")))
+            user = await self.users.find_one({"fid": sender_id})
+            replies = []
+            saved = await loop.run_in_executor(self.executor,
+                                               self.step,
+                                               events,
+                                               user,
+                                               replies)
+            for user in saved:
+                await self.users.replace_one({"_id": user["_id"]},
+                                             user,
+                                             upsert=True)
+            # typing on still in flight could reach graph after the replies
+            late = typing is not None and not typing.done()
+            for data in replies:
+                await self.post(data)
+            if typing is not None:
+                await typing
+            if len(replies) == 0 and typing is not None:
+                await self.action(sender_id, "typing_off")
+            elif len(replies) > 0 and (TYPING_OFF_AFTER_REPLY or late):
+                await self.action(sender_id, "typing_off")
+        except Exception as e:
+            self.failed.inc()
+            traceback.print_exc()
+            log(str(e))
+        finally:
+            self.steps.observe(loop.time() - start)
+            self.in_flight.dec()
+
+    def step(self, events, user, replies):
+        """Run the state machine over the events (on a worker thread)
+
+        A user that was not found and the league lookups are made with the
+        blocking api.mongo, only the loaded user and the saves go through
+        motor.
+
+        Parameters:
+            events: the sender's messaging events (list)
+            user: the user already loaded, None if not found (dict)
+            replies: where the send api messages are collected (list)
+        Returns:
+            saved: the users to save (list)
+        """
+        pending = _PendingUsers()
+        collector = ResponseCollector(api.build_messages, api.skip_typing)
+        preload = [user] if user is not None else []
+        with api.app.app_context():
+            with user_batch(pending, preload=preload):
+                api.handle_events(events, collector=collector)
+        replies.extend(collector.messages)
+        return pending.saved
+
+    async def quietly(self, coroutine):
+        """Await a coroutine, logging rather than raising its error"""
+        try:
+            await coroutine
+        except Exception as e:
+            self.send_errors.inc()
+            log(str(e))
+
+    async def action(self, sender_id, action):
+        """Send a sender action (typing_on, typing_off)"""
+        await self.post({"recipient": {"id": sender_id},
+                         "sender_action": action})
+
+    async def post(self, data):
+        """Send a message to the send api
+
+        Failures are logged rather than raised so a lost message does not
+        stop the sender's other replies, same as the SendClient.
+
+        Parameters:
+            data: the send api message (dict or encoded string)
+        """
+        if self.session is None:
+            timeout = aiohttp.ClientTimeout(sock_connect=SEND_CONNECT_TIMEOUT,
+                                            sock_read=SEND_READ_TIMEOUT)
+            self.session = aiohttp.ClientSession(timeout=timeout)
+        if "message" in data:
+            log(data)
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        try:
+            async with self.session.post(
+                    GRAPH_URL + "me/messages",
+                    params={"access_token": PAGE_ACCESS_TOKEN},
+                    headers={"Content-Type": "application/json"},
+                    data=data) as r:
+                self.sent.inc()
+                if r.status != 200:
+                    self.send_errors.inc()
+                    log(r.status)
+                    log(await r.text())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.send_errors.inc()
+            log(str(e))
+
+
+async def _read_body(receive):
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
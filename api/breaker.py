@@ -0,0 +1,147 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Circuit breakers so an outage fails fast instead of tying up workers
+'''
+import threading
+import time
+from api import metrics
+
+# the states of a breaker as exported in the metrics
+CLOSED = 0
+HALF_OPEN = 1
+OPEN = 2
+
+
+class CircuitOpenException(Exception):
+    pass
+
+
+class CircuitBreaker():
+    """Stops calling a dependency after it keeps failing
+
+    A call fails when it raises, when failed says its result is a failure or
+    when it takes longer than latency seconds. After failures failures in a
+    row the breaker opens and calls fail straight away with error. Once it
+    has been open for reset seconds a single call is let through as a probe
+    which closes the breaker if it works and opens it again if it does not.
+    A call that finishes after the breaker changed state since it started
+    is not counted so a late success can not close an opened breaker.
+
+    Parameters:
+        name: the name used for the metrics (string)
+        failures: the failures in a row that open the breaker (int)
+        latency: the seconds after which a call counts as failed, 0 for no
+                 limit, can be given per call (float)
+        reset: the seconds to stay open before probing (float)
+        error: returns the exception raised while open (function)
+        clock: the function returning the current time (function)
+    """
+    def __init__(self, name, failures=5, latency=0, reset=30,
+                 error=CircuitOpenException, clock=time.monotonic):
+        self.name = name
+        self.failures = failures
+        self.latency = latency
+        self.reset = reset
+        self.error = error
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failed = 0
+        self._opened = 0
+        self._probing = False
+        # changes with the state so late calls can be told apart
+        self._generation = 0
+        self.opened = metrics.counter("breaker." + name + ".opened")
+        self.rejected = metrics.counter("breaker." + name + ".rejected")
+        self.slow = metrics.counter("breaker." + name + ".slow")
+        metrics.gauge("breaker." + name + ".state", self.state)
+
+    def state(self):
+        """Returns CLOSED, HALF_OPEN or OPEN"""
+        with self._lock:
+            if (self._state == OPEN and
+                    self.clock() - self._opened >= self.reset):
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Returns whether a call may go ahead (a probe when half open)"""
+        return self._allow() is not None
+
+    def _allow(self):
+        # the generation of the allowed call, None if not allowed
+        with self._lock:
+            if self._state == CLOSED:
+                return self._generation
+            if self._probing:
+                return None
+            if (self._state == OPEN and
+                    self.clock() - self._opened < self.reset):
+                return None
+            self._change(HALF_OPEN)
+            self._probing = True
+            return self._generation
+
+    def record(self, success, generation=None):
+        """Record how an allowed call went
+
+        Parameters:
+            success: whether the call worked (boolean)
+            generation: the generation the call was allowed in, ignored if
+                        the state has changed since, None for the current
+                        (int)
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._probing = False
+            if success:
+                if self._state != CLOSED:
+                    self._change(CLOSED)
+                self._failed = 0
+                return
+            self._failed += 1
+            if self._state == HALF_OPEN or self._failed >= self.failures:
+                if self._state != OPEN:
+                    self.opened.inc()
+                self._change(OPEN)
+                self._opened = self.clock()
+
+    def _change(self, state):
+        self._state = state
+        self._generation += 1
+
+    def call(self, function, failed=None, error=None, latency=None):
+        """Call a function through the breaker
+
+        Parameters:
+            function: makes the call (function)
+            failed: returns whether a result is a failure (function)
+            error: returns the exception to raise while open (function)
+            latency: the seconds after which this call counts as failed,
+                     defaults to the breaker's (float)
+        Raises:
+            the error while open or whatever the function raises
+        Returns:
+            the result of the function
+        """
+        generation = self._allow()
+        if generation is None:
+            self.rejected.inc()
+            raise (error or self.error)()
+        if latency is None:
+            latency = self.latency
+        start = self.clock()
+        try:
+            result = function()
+        except Exception:
+            self.record(False, generation)
+            raise
+        success = failed is None or not failed(result)
+        if success and latency > 0 and self.clock() - start > latency:
+            self.slow.inc()
+            success = False
+        self.record(success, generation)
+        return result
@@ -0,0 +1,69 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Bulkheads so one slow dependency can not take every thread
+'''
+import threading
+import time
+from api import metrics
+
+
+class BulkheadFullException(Exception):
+    pass
+
+
+class Bulkhead():
+    """Limits how many threads can be calling a dependency at once
+
+    A call waits up to timeout seconds for one of the size slots and fails
+    with error if none frees up, so when a dependency slows down only the
+    threads calling it back up while the rest keep serving other users.
+
+    Parameters:
+        name: the name used for the metrics (string)
+        size: the most calls at once, 0 for no limit (int)
+        timeout: the seconds to wait for a slot (float)
+        error: returns the exception raised when full (function)
+    """
+    def __init__(self, name, size=10, timeout=1,
+                 error=BulkheadFullException):
+        self.name = name
+        self.size = size
+        self.timeout = timeout
+        self.error = error
+        self._slots = threading.BoundedSemaphore(size) if size > 0 else None
+        self.in_use = metrics.gauge("bulkhead." + name + ".in_use")
+        self.waiting = metrics.gauge("bulkhead." + name + ".waiting")
+        self.rejected = metrics.counter("bulkhead." + name + ".rejected")
+        self.wait = metrics.histogram("bulkhead." + name + ".wait_seconds")
+
+    def call(self, function, error=None):
+        """Call a function once a slot is free
+
+        Parameters:
+            function: makes the call (function)
+            error: returns the exception to raise when full (function)
+        Raises:
+            the error when full or whatever the function raises
+        Returns:
+            the result of the function
+        """
+        if self._slots is None:
+            return function()
+        started = time.monotonic()
+        self.waiting.inc()
+        try:
+            acquired = self._slots.acquire(timeout=self.timeout)
+        finally:
+            self.waiting.dec()
+            self.wait.observe(time.monotonic() - started)
+        if not acquired:
+            self.rejected.inc()
+            raise (error or self.error)()
+        self.in_use.inc()
+        try:
+            return function()
+        finally:
+            self.in_use.dec()
+            self._slots.release()
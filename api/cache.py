@@ -0,0 +1,241 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Caches the platform data that is the same for every user
+'''
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from api.helper import log
+from api import metrics
+
+# returned by get when the key is not cached
+MISSING = object()
+
+
+class TTLCache():
+    """A bounded cache whose entries expire after some time
+
+    Entries are kept from least to most recently used so when the cache is
+    full the least recently used one is evicted. The values are shared
+    between callers so they must not be changed.
+
+    Parameters:
+        name: the name used for the metrics (string)
+        size: the most entries held at once (int)
+        clock: the function returning the current time (function)
+    """
+    def __init__(self, name, size, clock=time.monotonic):
+        self.size = size
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = metrics.counter(name + ".hits")
+        self.misses = metrics.counter(name + ".misses")
+        self.evictions = metrics.counter(name + ".evictions")
+        self.stale = metrics.counter(name + ".stale")
+        metrics.gauge(name + ".size", self.__len__)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """Returns the value cached for the key
+
+        Parameters:
+            key: the key of the value
+        Returns:
+            value: the value or MISSING if not cached or expired
+        """
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                self.misses.inc()
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits.inc()
+            return entry[1]
+
+    def lookup(self, key):
+        """Returns the value cached for the key even once it has expired
+
+        Parameters:
+            key: the key of the value
+        Returns:
+            (value, fresh): the value or MISSING if not cached and whether
+                            it has not expired yet
+        """
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses.inc()
+                return (MISSING, False)
+            self._entries.move_to_end(key)
+            if entry[0] <= now:
+                self.stale.inc()
+                return (entry[1], False)
+            self.hits.inc()
+            return (entry[1], True)
+
+    def put(self, key, value, ttl):
+        """Cache a value for ttl seconds
+
+        Parameters:
+            key: the key of the value
+            value: the value to cache
+            ttl: the seconds until it expires (float)
+        """
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions.inc()
+
+    def load(self, key, ttl, function):
+        """Returns the cached value or the result of function, caching it
+
+        Nothing is cached when function raises.
+
+        Parameters:
+            key: the key of the value
+            ttl: the seconds to cache a loaded value (float)
+            function: loads the value (function)
+        Returns:
+            value: the cached or loaded value
+        """
+        value = self.get(key)
+        if value is MISSING:
+            value = function()
+            self.put(key, value, ttl)
+        return value
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+
+
+class Refresher():
+    """Serves cached values once stale while refreshing them in the
+    background
+
+    Only the first read of a key waits on its load. From then on the key is
+    reloaded by a background thread as it expires, and a read that finds it
+    stale gets the last value straight away. A key stops being refreshed
+    once it has not been read for idle seconds or has been evicted.
+
+    Parameters:
+        cache: where the values are kept (TTLCache)
+        ttl: returns the seconds a value of an endpoint stays fresh
+             (function)
+        idle: the seconds without a read before refreshing stops (float)
+        retry: the seconds before retrying a failed refresh (float)
+        clock: the function returning the current time (function)
+    """
+    def __init__(self, cache, ttl, idle=86400, retry=30,
+                 clock=time.monotonic):
+        self.cache = cache
+        self.ttl = ttl
+        self.idle = idle
+        self.retry = retry
+        self.clock = clock
+        self._condition = threading.Condition()
+        self._keys = {}
+        self._due = []
+        self._sequence = itertools.count()
+        self._pid = None
+        self.refreshed = metrics.counter("refresh.refreshed")
+        self.failed = metrics.counter("refresh.failed")
+        metrics.gauge("refresh.keys", lambda: len(self._keys))
+
+    def load(self, endpoint, key, function):
+        """Returns the value of the key, loading it only if never cached
+
+        Parameters:
+            endpoint: the endpoint the value is from (string)
+            key: the key of the value
+            function: loads the value (function)
+        Returns:
+            value: the fresh, stale or newly loaded value
+        """
+        (value, fresh) = self.cache.lookup(key)
+        now = self.clock()
+        with self._condition:
+            refresh = self._keys.get(key)
+            if refresh is not None:
+                refresh["read"] = now
+        if value is MISSING:
+            value = function()
+            self.cache.put(key, value, self.ttl(endpoint))
+            self._schedule(endpoint, key, function, now + self.ttl(endpoint))
+        elif not fresh:
+            # only happens when it is no longer being refreshed
+            self._schedule(endpoint, key, function, now)
+        return value
+
+    def _schedule(self, endpoint, key, function, due):
+        with self._condition:
+            if key in self._keys:
+                return
+            self._keys[key] = {"endpoint": endpoint,
+                               "function": function,
+                               "read": self.clock(),
+                               "due": due}
+            self._start()
+            heapq.heappush(self._due, (due, next(self._sequence), key))
+            self._condition.notify()
+
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        threading.Thread(target=self._run,
+                         name="refresh",
+                         daemon=True).start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if len(self._due) == 0:
+                    self._condition.wait()
+                    continue
+                wait = self._due[0][0] - self.clock()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                (due, __, key) = heapq.heappop(self._due)
+                refresh = self._keys[key]
+                if (self.clock() - refresh["read"] > self.idle or
+                        key not in self.cache):
+                    # no one is reading it any more
+                    del self._keys[key]
+                    continue
+            self._refresh(key, refresh)
+
+    def _refresh(self, key, refresh):
+        ttl = self.ttl(refresh["endpoint"])
+        if ttl <= 0:
+            with self._condition:
+                del self._keys[key]
+            return
+        try:
+            self.cache.put(key, refresh["function"](), ttl)
+            self.refreshed.inc()
+        except Exception as e:
+            self.failed.inc()
+            log(str(e))
+            ttl = min(ttl, self.retry)
+        with self._condition:
+            refresh["due"] = self.clock() + ttl
+            heapq.heappush(self._due,
+                           (refresh["due"], next(self._sequence), key))
@@ -0,0 +1,133 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Collects the replies to a sender's events so they are sent together
+'''
+from api import metrics
+from api.send import BATCH_LIMIT
+
+# buckets for counting send api calls
+CALL_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16)
+
+
+class ResponseCollector():
+    """Records the replies made while handling a sender's events
+
+    Used as the callback of the state machine so nothing is sent while the
+    events are handled. The typing indicator is only shown once however many
+    events ask for it and the replies are sent afterwards in the order they
+    were made followed by a single typing off.
+
+    A reply already clears the typing indicator so the typing off after the
+    replies can be left out.
+
+    Parameters:
+        build: returns the send api messages of a reply (function)
+        typing: shows the sender the bot is typing (function)
+        typing_off_after_reply: send typing off even after a reply (boolean)
+    """
+    def __init__(self, build, typing, typing_off_after_reply=True):
+        self.build = build
+        self._typing = typing
+        self.typing_off_after_reply = typing_off_after_reply
+        self.messages = []
+        self.replied = []
+        self.typed = []
+        self._per_event = []
+        self.merged = metrics.counter("outbound.actions_merged")
+        self.messages_per_event = metrics.histogram(
+                                    "outbound.messages_per_event",
+                                    buckets=CALL_BUCKETS)
+        self.calls_per_batch = metrics.histogram("outbound.calls_per_batch",
+                                                 buckets=CALL_BUCKETS)
+
+    def event(self):
+        """Start counting the replies of the next event"""
+        self._per_event.append(0)
+
+    def callback(self, message_text, sender_id, quick_replies=[], buttons=[]):
+        """Record a reply (same arguments as send_message)"""
+        messages = self.build(message_text,
+                              sender_id,
+                              quick_replies=quick_replies,
+                              buttons=buttons)
+        self.messages.extend(messages)
+        if sender_id in self.replied:
+            # only one typing off is sent after the replies
+            self.merged.inc()
+        else:
+            self.replied.append(sender_id)
+        if len(self._per_event) == 0:
+            self.event()
+        self._per_event[-1] += len(messages)
+
+    def typing(self, sender_id):
+        """Show the sender the bot is typing unless it already is"""
+        if sender_id in self.typed:
+            self.merged.inc()
+            return
+        self.typed.append(sender_id)
+        self._typing(sender_id)
+
+    def flush(self, send, typing_off, shown=None):
+        """Send the collected replies in order
+
+        Parameters:
+            send: sends a send api message (function)
+            typing_off: stops showing the sender the bot is typing (function)
+            shown: the senders actually shown the typing indicator, defaults
+                   to everyone it was asked for (list)
+        Returns:
+            calls: the number of send api calls made by the flush (int)
+        """
+        calls = 0
+        for data in self.messages:
+            send(data)
+            calls += 1
+        for sender_id in self._typing_offs(shown):
+            typing_off(sender_id)
+            calls += 1
+        self._flushed(calls, shown)
+        return calls
+
+    def flush_batch(self, send_batch, limit=BATCH_LIMIT, shown=None):
+        """Send the collected replies and typing offs as batch requests
+
+        Parameters:
+            send_batch: sends a list of send api messages together (function)
+            limit: the most messages in one batch request (int)
+            shown: the senders actually shown the typing indicator (list)
+        Returns:
+            calls: the number of send api calls made by the flush (int)
+        """
+        messages = self.messages + [{"recipient": {"id": sender_id},
+                                     "sender_action": "typing_off"}
+                                    for sender_id in self._typing_offs(shown)]
+        if len(messages) > 0:
+            send_batch(messages)
+        calls = (len(messages) + limit - 1) // limit
+        self._flushed(calls, shown)
+        return calls
+
+    def _typing_offs(self, shown):
+        shown = self.typed if shown is None else shown
+        senders = []
+        for sender_id in self.replied + shown:
+            if sender_id in senders:
+                continue
+            if sender_id in self.replied and not self.typing_off_after_reply:
+                # the reply cleared the indicator
+                continue
+            senders.append(sender_id)
+        return senders
+
+    def _flushed(self, calls, shown):
+        for count in self._per_event:
+            self.messages_per_event.observe(count)
+        shown = self.typed if shown is None else shown
+        self.calls_per_batch.observe(calls + len(shown))
+        self.messages = []
+        self.replied = []
+        self.typed = []
+        self._per_event = []
@@ -3,14 +3,180 @@ Created on May 3, 2017
 
 @author: d6fraser
 '''
+import copy
 import requests
+import threading
 import unittest
+from contextlib import contextmanager
 from datetime import date, datetime
 from api.helper import log, loads
 from api.errors import FacebookException, PlatformException,\
-                       PLATFORMMESSAGE, NotCaptainException, IdentityException,\
+                       PLATFORMMESSAGE, DatabaseException, DATABASEMESSAGE,\
+                       NotCaptainException, IdentityException,\
                        BatterException
-from api.variables import PID, HEADERS, BASEURL, PAGE_ACCESS_TOKEN
+from api.variables import PID, HEADERS, BASEURL, PAGE_ACCESS_TOKEN,\
+                          GRAPH_URL, BREAKER_FAILURES, BREAKER_LATENCY,\
+                          BREAKER_RESET, PLATFORM_TIMEOUT, GRAPH_BULKHEAD,\
+                          PLATFORM_POOL_SIZE, PLATFORM_CONNECT_TIMEOUT,\
+                          PLATFORM_TIMEOUTS, SEND_CONNECT_TIMEOUT,\
+                          SEND_READ_TIMEOUT, PLATFORM_CACHE_TTLS,\
+                          PLATFORM_CACHE_SIZE, PLATFORM_CACHE_QUIET_TTLS,\
+                          GAME_DAYS, PLATFORM_CACHE_IDLE,\
+                          GRAPH_BULKHEAD_TIMEOUT, PLATFORM_BULKHEAD,\
+                          PLATFORM_BULKHEAD_TIMEOUT, MONGO_BULKHEAD,\
+                          MONGO_BULKHEAD_TIMEOUT
+from api.breaker import CircuitBreaker
+from api.bulkhead import Bulkhead
+from api.cache import TTLCache, Refresher
+from api.singleflight import SingleFlight
+from api.platform_client import PlatformClient, server_error,\
+    parse_timeouts
+from api import metrics
+
+# the users loaded and saved while inside a user_batch on this thread
+_batch = threading.local()
+USER_LOADS = metrics.counter("users.loads")
+USER_SAVES = metrics.counter("users.saves")
+USER_SAVES_COALESCED = metrics.counter("users.saves_coalesced")
+# fail fast while the platform or facebook are down
+platform_breaker = CircuitBreaker("platform",
+                                  failures=BREAKER_FAILURES,
+                                  latency=BREAKER_LATENCY,
+                                  reset=BREAKER_RESET,
+                                  error=lambda:
+                                  PlatformException(PLATFORMMESSAGE))
+graph_breaker = CircuitBreaker("graph",
+                               failures=BREAKER_FAILURES,
+                               latency=BREAKER_LATENCY,
+                               reset=BREAKER_RESET)
+# keep a slow dependency from taking the threads the others need
+platform_bulkhead = Bulkhead("platform",
+                             size=PLATFORM_BULKHEAD,
+                             timeout=PLATFORM_BULKHEAD_TIMEOUT,
+                             error=lambda: PlatformException(PLATFORMMESSAGE))
+graph_bulkhead = Bulkhead("graph",
+                          size=GRAPH_BULKHEAD,
+                          timeout=GRAPH_BULKHEAD_TIMEOUT)
+mongo_bulkhead = Bulkhead("mongo",
+                          size=MONGO_BULKHEAD,
+                          timeout=MONGO_BULKHEAD_TIMEOUT,
+                          error=lambda: DatabaseException(DATABASEMESSAGE))
+# every request to the platform goes through here
+platform = PlatformClient(BASEURL,
+                          pool_size=PLATFORM_POOL_SIZE,
+                          connect_timeout=PLATFORM_CONNECT_TIMEOUT,
+                          read_timeout=PLATFORM_TIMEOUT,
+                          timeouts=parse_timeouts(PLATFORM_TIMEOUTS),
+                          breaker=platform_breaker,
+                          bulkhead=platform_bulkhead,
+                          single_flight=SingleFlight("platform.flight"))
+# the platform data that is the same for every user
+platform_cache = TTLCache("platform.cache", PLATFORM_CACHE_SIZE)
+CACHE_TTLS = parse_timeouts(PLATFORM_CACHE_TTLS)
+QUIET_CACHE_TTLS = parse_timeouts(PLATFORM_CACHE_QUIET_TTLS)
+
+
+def cache_ttl(endpoint):
+    """Returns the seconds to cache an endpoint, shorter on game days when
+    the stats keep changing
+
+    Parameters:
+        endpoint: the platform endpoint (string)
+    Returns:
+        ttl: the seconds, 0 to not cache (float)
+    """
+    if date.today().weekday() in GAME_DAYS:
+        return CACHE_TTLS.get(endpoint, 0)
+    return QUIET_CACHE_TTLS.get(endpoint, 0)
+
+
+# keeps the cached data fresh so users are not the ones waiting on it
+refresher = Refresher(platform_cache, cache_ttl, idle=PLATFORM_CACHE_IDLE)
+
+
+def facebook_unavailable():
+    """Returns the exception for when facebook can not be reached
+    """
+    return FacebookException("Facebook services not available")
+
+
+def mongo_call(function, *args, **kwargs):
+    """Calls a mongo method within the mongo bulkhead
+    """
+    return mongo_bulkhead.call(lambda: function(*args, **kwargs))
+
+
+def cached(endpoint, params, load):
+    """Returns the cached response of a season wide platform request
+
+    Parameters:
+        endpoint: the platform endpoint (string)
+        params: the parameters of the request including the year (dict)
+        load: requests the response when not cached (function)
+    Returns:
+        the response loaded now or the last one loaded
+    """
+    if cache_ttl(endpoint) <= 0:
+        return load()
+    key = (endpoint,) + tuple(sorted(params.items()))
+    return refresher.load(endpoint, key, load)
+
+
+def warm_cache():
+    """Load the season wide data so the first users do not wait on it
+    """
+    for load in (lambda: league_leaders("hr"),
+                 lambda: league_leaders("ss"),
+                 fun_meter,
+                 get_events):
+        try:
+            load()
+        except PlatformException as e:
+            log(str(e))
+
+
+@contextmanager
+def user_batch(mongo, preload=()):
+    """Load each user once and save each user once for a block of work
+
+    Inside the block get_user returns a copy of the last saved version of
+    the user (loading it only the first time) and save_user only records
+    the user. When the block finishes every changed user is written once.
+
+    Parameters:
+        mongo: the mongo db
+        preload: users already loaded (list of dicts)
+    """
+    if getattr(_batch, "users", None) is not None:
+        # already batching so let the outer block save
+        yield
+        return
+    _batch.users = {user['fid']: copy.deepcopy(user) for user in preload}
+    _batch.changed = []
+    try:
+        yield
+    finally:
+        users = _batch.users
+        changed = _batch.changed
+        _batch.users = None
+        _batch.changed = None
+        for fid in changed:
+            USER_SAVES.inc()
+            mongo_call(mongo.db.users.save, users[fid])
+
+
+def batched_user(identity):
+    """Returns the last saved version of a user in the current user_batch
+
+    Parameters:
+        identity: facebook id (string)
+    Returns:
+        user: the user, None if not loaded in the batch (dict)
+    """
+    batch = getattr(_batch, "users", None)
+    if batch is None or identity not in batch:
+        return None
+    return copy.deepcopy(batch[identity])
 
 
 def get_user(identity, mongo):
@@ -23,12 +189,27 @@ def get_user(identity, mongo):
         (user, created): the user and boolean to tell if created or not
     """
     created = False
-    user = mongo.db.users.find_one({'fid': identity})
+    batch = getattr(_batch, "users", None)
+    if batch is not None and identity in batch:
+        return (copy.deepcopy(batch[identity]), created)
+    USER_LOADS.inc()
+    user = mongo_call(mongo.db.users.find_one, {'fid': identity})
     if user is None:
         created = True
         # get the player's id
-        url = "https://graph.facebook.com/v2.6/{}?fields=first_name,last_name&access_token={}".format(identity, PAGE_ACCESS_TOKEN)
-        r = requests.get(url)
+        url = GRAPH_URL + "{}?fields=first_name,last_name&access_token={}".format(identity, PAGE_ACCESS_TOKEN)
+        try:
+            r = graph_bulkhead.call(
+                    lambda: graph_breaker.call(lambda: requests.get(
+                                url,
+                                timeout=(SEND_CONNECT_TIMEOUT,
+                                         SEND_READ_TIMEOUT)),
+                                               failed=server_error,
+                                               error=facebook_unavailable),
+                    error=facebook_unavailable)
+        except requests.RequestException as e:
+            log(str(e))
+            raise facebook_unavailable()
         log("Facebook profile")
         if (r.status_code) != 200:
             raise FacebookException("Facebook services not available")
@@ -36,18 +217,20 @@ def get_user(identity, mongo):
         d = r.json()
         name = d['first_name'] +" " + d['last_name']
         # now we know who this person is
-        mongo.db.users.insert({"fid": identity,
-                               "state": PID,
-                               "name": name,
-                               "pid": -1,
-                               "game": {},
-                               "teamroster": {},
-                               "captain": -1,
-                               "batter": -1
-                               })
-        user = mongo.db.users.find_one({'fid': identity})
+        mongo_call(mongo.db.users.insert, {"fid": identity,
+                                           "state": PID,
+                                           "name": name,
+                                           "pid": -1,
+                                           "game": {},
+                                           "teamroster": {},
+                                           "captain": -1,
+                                           "batter": -1
+                                           })
+        user = mongo_call(mongo.db.users.find_one, {'fid': identity})
         log("saved user")
         log(user)
+    if batch is not None and user is not None:
+        batch[identity] = copy.deepcopy(user)
     return (user, created)
 
 
@@ -62,7 +245,8 @@ def already_in_league(user, player, mongo):
         taken: True if someone already taken that player, False otherwise
     """
     taken = True
-    user = mongo.db.users.find_one({'pid': player['player_id']})
+    user = mongo_call(mongo.db.users.find_one,
+                      {'pid': player['player_id']})
     if user is None:
         taken = False
     return taken
@@ -70,7 +254,17 @@ def already_in_league(user, player, mongo):
 
 def save_user(user, mongo):
     """ Save the changes of the user"""
-    mongo.db.users.save(user)
+    batch = getattr(_batch, "users", None)
+    if batch is not None and user.get('fid') in batch:
+        # written once when the batch finishes
+        if user['fid'] in _batch.changed:
+            USER_SAVES_COALESCED.inc()
+        else:
+            _batch.changed.append(user['fid'])
+        batch[user['fid']] = copy.deepcopy(user)
+        return
+    USER_SAVES.inc()
+    mongo_call(mongo.db.users.save, user)
     return
 
 
@@ -85,9 +279,10 @@ def lookup_player(user):
         player: None if can't determine player other a player object
     """
     submission = {"player_name": user['name'], "active": 1}
-    r = requests.post(BASEURL + "api/view/player_lookup",
+    r = platform.post("api/view/player_lookup",
                       params=submission,
-                      headers=HEADERS)
+                      headers=HEADERS,
+                      shared=True)
     players = r.json()
     if (r.status_code != 200):
         raise PlatformException(PLATFORMMESSAGE)
@@ -111,9 +306,10 @@ def lookup_player_email(user, email):
         player: the player found
     """
     submission = {"email": email}
-    r = requests.post(BASEURL + "api/view/player_lookup",
+    r = platform.post("api/view/player_lookup",
                       params=submission,
-                      headers=HEADERS)
+                      headers=HEADERS,
+                      shared=True)
     if(r.status_code != 200):
         raise PlatformException(PLATFORMMESSAGE)
     players = r.json()
@@ -133,9 +329,10 @@ def update_player(user, player):
     """
     user['pid'] = player['player_id']
     params = {"player_id": user["pid"]}
-    r = requests.post(BASEURL + "api/view/players/team_lookup",
+    r = platform.post("api/view/players/team_lookup",
                       params=params,
-                      headers=HEADERS)
+                      headers=HEADERS,
+                      shared=True)
     if (r.status_code != 200):
         raise PlatformException(PLATFORMMESSAGE)
     # now look up teams
@@ -158,9 +355,10 @@ def get_upcoming_games(user):
         r.json(): a list of upcoming games
     """
     params = {"player_id": user["pid"]}
-    r = requests.post(BASEURL + "api/bot/upcoming_games",
+    r = platform.post("api/bot/upcoming_games",
                       data=params,
-                      headers=HEADERS)
+                      headers=HEADERS,
+                      shared=True)
     if (r.status_code != 200):
         raise PlatformException(PLATFORMMESSAGE)
     return r.json()
@@ -169,11 +367,16 @@ def get_upcoming_games(user):
 def get_events():
     """Returns a dictionary object of the events
     """
-    r = requests.get(BASEURL +
-                     "website/event/{}/json".format(date.today().year))
-    if (r.status_code != 200):
-        raise PlatformException(PLATFORMMESSAGE)
-    return r.json()
+    year = date.today().year
+
+    def load():
+        r = platform.get("website/event/{}/json".format(year),
+                         endpoint="website/event",
+                         shared=True)
+        if (r.status_code != 200):
+            raise PlatformException(PLATFORMMESSAGE)
+        return r.json()
+    return cached("website/event", {"year": year}, load)
 
 
 def fun_meter():
@@ -183,12 +386,16 @@ def fun_meter():
         fun: an amount of fun (int)
     """
     params = {"year": date.today().year}
-    r = requests.post(BASEURL + "api/view/fun",
-                      data=params,
-                      headers=HEADERS)
-    if (r.status_code != 200):
-        raise PlatformException(PLATFORMMESSAGE)
-    return r.json()
+
+    def load():
+        r = platform.post("api/view/fun",
+                          data=params,
+                          headers=HEADERS,
+                          shared=True)
+        if (r.status_code != 200):
+            raise PlatformException(PLATFORMMESSAGE)
+        return r.json()
+    return cached("api/view/fun", params, load)
 
 
 def league_leaders(stat):
@@ -200,12 +407,16 @@ def league_leaders(stat):
         r.json(): a list of leaders
     """
     params = {"stat": stat, "year": date.today().year}
-    r = requests.post(BASEURL + "api/view/league_leaders",
-                      data=params,
-                      headers=HEADERS)
-    if (r.status_code != 200):
-        raise PlatformException(PLATFORMMESSAGE)
-    return r.json()
+
+    def load():
+        r = platform.post("api/view/league_leaders",
+                          data=params,
+                          headers=HEADERS,
+                          shared=True)
+        if (r.status_code != 200):
+            raise PlatformException(PLATFORMMESSAGE)
+        return r.json()
+    return cached("api/view/league_leaders", params, load)
 
 
 def get_games(user):
@@ -217,9 +428,10 @@ def get_games(user):
         games: a list of games
     """
     params = {"player_id": user['pid'], "team": user['captain']}
-    r = requests.post(BASEURL + "api/bot/captain/games",
+    r = platform.post("api/bot/captain/games",
                       data=params,
-                      headers=HEADERS)
+                      headers=HEADERS,
+                      shared=True)
     if (r.status_code == 401):
         raise NotCaptainException("Says you are not a captain, check admin")
     elif (r.status_code != 200):
@@ -243,7 +455,7 @@ def submit_score(user):
     """
     submission = user['game']
     submission['player_id'] = user['pid']
-    r = requests.post(BASEURL + "api/bot/submit_score",
+    r = platform.post("api/bot/submit_score",
                       params=submission,
                       headers=HEADERS)
     print(r.text, r.status_code)
@@ -287,7 +499,9 @@ def add_game(user, game_id):
     user['batter'] = -1
     # update the team roster
     user['teamroster'] = {}
-    r = requests.get(BASEURL + "api/teamroster/{}".format(user['captain']))
+    r = platform.get("api/teamroster/{}".format(user['captain']),
+                     endpoint="api/teamroster",
+                     shared=True)
     if (r.status_code != 200):
         raise PlatformException(PLATFORMMESSAGE)
     players = r.json()['players']
@@ -0,0 +1,92 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Drops messaging events facebook redelivers
+'''
+import threading
+import time
+from collections import OrderedDict
+from api import metrics
+
+
+class TTLSet():
+    """A bounded set whose keys expire after some time
+
+    Keys are kept in the order they were added, which is also the order they
+    expire in, so expiring and evicting only ever look at the oldest keys.
+
+    Parameters:
+        name: the name used for the metrics (string)
+        size: the most keys held at once (int)
+        ttl: the number of seconds a key is remembered (float)
+        clock: the function returning the current time (function)
+    """
+    def __init__(self, name, size, ttl, clock=time.monotonic):
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = metrics.counter(name + ".hits")
+        self.misses = metrics.counter(name + ".misses")
+        self.evictions = metrics.counter(name + ".evictions")
+        metrics.gauge(name + ".size", self.__len__)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key):
+        """Adds the key to the set
+
+        Parameters:
+            key: the key to add
+        Returns:
+            True if the key was new, False if it was already in the set
+        """
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            if key in self._keys:
+                self.hits.inc()
+                return False
+            self.misses.inc()
+            self._keys[key] = now + self.ttl
+            while len(self._keys) > self.size:
+                self._keys.popitem(last=False)
+                self.evictions.inc()
+            return True
+
+    def discard(self, key):
+        """Removes the key from the set if it is there
+
+        Parameters:
+            key: the key to remove
+        """
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def _expire(self, now):
+        while len(self._keys) > 0:
+            key, expires = next(iter(self._keys.items()))
+            if expires > now:
+                break
+            del self._keys[key]
+
+
+def event_key(messaging_event):
+    """Returns the key that identifies a redelivered messaging event
+
+    Parameters:
+        messaging_event: the facebook messaging event (dict)
+    Returns:
+        key: the message id or postback sender and time, None if the event
+             does not need to be deduplicated (string)
+    """
+    message = messaging_event.get("message")
+    if isinstance(message, dict) and message.get("mid") is not None:
+        return "mid:{}".format(message["mid"])
+    if messaging_event.get("postback"):
+        return "postback:{}:{}".format(messaging_event["sender"]["id"],
+                                       messaging_event.get("timestamp"))
+    return None
@@ -19,6 +19,11 @@ class PlatformException(Exception):
     pass
 
 
+DATABASEMESSAGE = "Too busy right now - try again in a minute"
+class DatabaseException(Exception):
+    pass
+
+
 class MultiplePlayersException(Exception):
     def __init__(self, message, players):
         super().__init__(message)
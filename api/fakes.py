@@ -0,0 +1,80 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Fakes for Mongo and the Graph API shared by the tests and the
+benchmarks
+'''
+import copy
+import json
+import threading
+from http.server import HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    """A local http server handling every request on its own thread"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(handler):
+    """Returns a local server answering in the background
+
+    Parameters:
+        handler: handles the requests (BaseHTTPRequestHandler)
+    Returns:
+        server: the server listening on a free port (Server)
+    """
+    server = Server(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class response():
+    """A requests response with a status code, json body and headers"""
+    def __init__(self, status_code, data=None, headers={}):
+        self.status_code = status_code
+        self.data = data
+        self.headers = headers
+        self.text = "" if data is None else json.dumps(data)
+
+    def json(self):
+        return self.data
+
+
+class MemoryUsers():
+    """An in memory users collection with the pymongo calls the bot uses
+
+    Counts the finds and saves made.
+    """
+    def __init__(self, users):
+        self.documents = {user['fid']: copy.deepcopy(user) for user in users}
+        # so it can also stand in for the mongo client
+        self.db = self
+        self.users = self
+        self.finds = 0
+        self.saves = 0
+
+    def find_one(self, search):
+        self.finds += 1
+        for user in self.documents.values():
+            if all(user.get(k) == v for k, v in search.items()):
+                return copy.deepcopy(user)
+        return None
+
+    def save(self, user):
+        self.saves += 1
+        self.documents[user['fid']] = copy.deepcopy(user)
+
+    def replace_one(self, search, user, upsert=False):
+        self.save(user)
+
+
+class AsyncMemoryUsers(MemoryUsers):
+    """The in memory users collection with the motor calls the bot uses"""
+    async def find_one(self, search):
+        return MemoryUsers.find_one(self, search)
+
+    async def replace_one(self, search, user, upsert=False):
+        self.save(user)
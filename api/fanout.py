@@ -0,0 +1,81 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Makes independent reads at the same time within one step
+'''
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from api import metrics
+
+
+class FanOut():
+    """Runs independent calls in parallel under one deadline
+
+    The calls run on a shared pool while the calling thread waits on them
+    so a step takes as long as its slowest call instead of all of them
+    together. The pool is created lazily in every process so it is never
+    shared across a fork.
+
+    Parameters:
+        workers: the threads making the calls, 0 runs them in turn on the
+                 calling thread without a deadline (int)
+        deadline: the seconds all the calls have to finish in (float)
+        error: returns the exception raised when past the deadline
+               (function)
+    """
+    def __init__(self, workers=8, deadline=10, error=TimeoutError):
+        self.workers = workers
+        self.deadline = deadline
+        self.error = error
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.calls = metrics.counter("fanout.calls")
+        self.timeouts = metrics.counter("fanout.timeouts")
+        self.latency = metrics.histogram("fanout.seconds")
+
+    @property
+    def executor(self):
+        """The thread pool of this process"""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                                    max_workers=self.workers,
+                                    thread_name_prefix="fanout")
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, functions, deadline=None):
+        """Returns the results of the functions called in parallel
+
+        Parameters:
+            functions: the independent calls (list of functions)
+            deadline: the seconds they have to finish in, defaults to the
+                      deadline given when created (float)
+        Raises:
+            the error if past the deadline, otherwise the exception of the
+            first of the calls that failed
+        Returns:
+            results: the result of each function in order (list)
+        """
+        if deadline is None:
+            deadline = self.deadline
+        self.calls.inc(len(functions))
+        started = time.monotonic()
+        try:
+            if self.workers <= 0:
+                return [function() for function in functions]
+            futures = [self.executor.submit(function)
+                       for function in functions]
+            (__, pending) = wait(futures, timeout=deadline)
+            if len(pending) > 0:
+                self.timeouts.inc()
+                for future in pending:
+                    future.cancel()
+                raise self.error()
+            return [future.result() for future in futures]
+        finally:
+            self.latency.observe(time.monotonic() - started)
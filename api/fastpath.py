@@ -0,0 +1,98 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Filters webhook posts and events the bot does nothing with
+'''
+import io
+import re
+from api import metrics
+
+# the keys of the events the bot acts on
+_ACTIONABLE = (b'"message"', b'"postback"')
+_SENDER = re.compile(rb'"sender"\s*:\s*\{\s*"id"\s*:\s*"?([0-9A-Za-z_.-]+)')
+_OK = b"ok"
+
+
+class FastPath():
+    """WSGI middleware that answers no-op webhook posts without the app
+
+    A post is a no-op when it has no message or postback events (delivery,
+    read and optin confirmations) or when every sender in it is ignored.
+    Only the raw bytes are looked at so no JSON parsing, logging, Mongo or
+    Graph calls are made for them.
+
+    Parameters:
+        app: the wsgi application to wrap
+        ignored: returns whether a sender id is ignored (function)
+    """
+    def __init__(self, app, ignored=None):
+        self.app = app
+        self.ignored = ignored
+        self.filtered = metrics.counter("fastpath.filtered")
+        self.filtered_bytes = metrics.counter("fastpath.filtered_bytes")
+        self.passed = metrics.counter("fastpath.passed")
+
+    def __call__(self, environ, start_response):
+        if (environ.get("REQUEST_METHOD") != "POST" or
+                environ.get("PATH_INFO", "/") != "/"):
+            return self.app(environ, start_response)
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            length = 0
+        body = environ["wsgi.input"].read(length) if length > 0 else b""
+        if self.no_op(body):
+            self.filtered.inc()
+            self.filtered_bytes.inc(len(body))
+            start_response("200 OK", [("Content-Type", "text/plain"),
+                                      ("Content-Length", str(len(_OK)))])
+            return [_OK]
+        self.passed.inc()
+        # let the app read the body again
+        environ["wsgi.input"] = io.BytesIO(body)
+        return self.app(environ, start_response)
+
+    def no_op(self, body):
+        """Returns whether the bot would do nothing with the post
+
+        Parameters:
+            body: the raw body of the post (bytes)
+        Returns:
+            True if it can be answered right away, False otherwise
+        """
+        if len(body) == 0:
+            return False
+        if not any(key in body for key in _ACTIONABLE):
+            return True
+        if self.ignored is not None:
+            senders = _SENDER.findall(body)
+            if (len(senders) > 0 and
+                    all(self.ignored(sender.decode("utf-8"))
+                        for sender in senders)):
+                return True
+        return False
+
+
+def no_op_reason(messaging_event):
+    """Returns why the bot does nothing with a messaging event
+
+    Parameters:
+        messaging_event: the facebook messaging event (dict)
+    Returns:
+        reason: the kind of no-op event, None if the bot acts on it (string)
+    """
+    message = messaging_event.get("message")
+    if isinstance(message, dict):
+        if message.get("is_echo"):
+            return "echo"
+        if ("text" not in message and "quick_reply" not in message and
+                message.get("attachments")):
+            return "attachments"
+        return None
+    if messaging_event.get("postback"):
+        return None
+    for kind in ("delivery", "read", "optin"):
+        if messaging_event.get(kind):
+            return kind
+    return "other"
@@ -0,0 +1,106 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Append-only compressed journal of the raw webhook posts
+'''
+import gzip
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+from api import metrics
+
+
+class Journal():
+    """Appends raw webhook bodies to gzip segments in a directory
+
+    Every process writes its own segments and a segment is rolled over once
+    it holds enough bytes or is old enough. Each record is flushed as it is
+    written so a crash only loses the record being written.
+
+    Parameters:
+        directory: where the segments are written (string)
+        segment_bytes: the uncompressed bytes before rolling over (int)
+        segment_seconds: the age in seconds before rolling over (float)
+    """
+    def __init__(self, directory, segment_bytes, segment_seconds):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+        self._opened = 0
+        self._written = 0
+        self.records = metrics.counter("journal.records")
+        self.bytes = metrics.counter("journal.bytes")
+        self.segments = metrics.counter("journal.segments")
+
+    def append(self, body):
+        """Append a raw webhook body to the journal
+
+        Parameters:
+            body: the body as it was received (bytes)
+        """
+        header = "{:.6f} {:d}\n".format(time.time(), len(body))
+        with self._lock:
+            self._roll()
+            self._file.write(header.encode("ascii"))
+            self._file.write(body)
+            self._file.write(b"\n")
+            self._file.flush()
+            self._written += len(body)
+        self.records.inc()
+        self.bytes.inc(len(body))
+
+    def close(self):
+        """Close the current segment"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _roll(self):
+        if (self._file is not None and
+                self._pid == os.getpid() and
+                self._written < self.segment_bytes and
+                time.monotonic() - self._opened < self.segment_seconds):
+            return
+        if self._file is not None and self._pid == os.getpid():
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        name = "journal-{}-{}.gz".format(
+                    datetime.utcnow().strftime("%Y%m%dT%H%M%S%f"),
+                    os.getpid())
+        self._file = gzip.open(os.path.join(self.directory, name), "ab")
+        self._pid = os.getpid()
+        self._opened = time.monotonic()
+        self._written = 0
+        self.segments.inc()
+
+
+def read_segment(path):
+    """Reads the records of a journal segment
+
+    A segment cut short by a crash is read up to its last whole record.
+
+    Parameters:
+        path: the path to the segment (string)
+    Returns:
+        a generator of (timestamp, body) tuples (float, bytes)
+    """
+    with gzip.open(path, "rb") as segment:
+        while True:
+            try:
+                header = segment.readline()
+                if header == b"":
+                    return
+                (timestamp, length) = header.split()
+                body = segment.read(int(length) + 1)
+            except (EOFError, ValueError, zlib.error, OSError):
+                return
+            if len(body) != int(length) + 1:
+                return
+            yield (float(timestamp), body[:-1])
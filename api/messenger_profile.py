@@ -0,0 +1,88 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: The persistent menu and get started button of the page
+'''
+import requests
+from api.helper import log
+from api.variables import GRAPH_URL, PAGE_ACCESS_TOKEN, UPCOMING_TITLE,\
+    LEAGUE_LEADERS_TITLE, EVENTS_TITLE, FUN_TITLE, SUBMIT_SCORE_TITLE,\
+    MORE_TITLE, UPCOMING, LEADERS, EVENTS, FUN, GAMES, GET_STARTED
+
+# the payloads the persistent menu can send in any state
+MENU_PAYLOADS = (UPCOMING, LEADERS, EVENTS, FUN, GAMES)
+FIELDS = ["persistent_menu", "get_started"]
+
+
+def postback(title, payload):
+    return {"type": "postback", "title": title, "payload": payload}
+
+
+def messenger_profile():
+    """Returns the messenger profile of the page
+
+    The menu only allows three items at the top so the ones used less
+    often are under More. Every item sends the same payload as the base
+    options so update_payload handles them.
+
+    Returns:
+        profile: the messenger profile (dict)
+    """
+    more = {"type": "nested",
+            "title": MORE_TITLE,
+            "call_to_actions": [postback(LEAGUE_LEADERS_TITLE, LEADERS),
+                                postback(EVENTS_TITLE, EVENTS),
+                                postback(FUN_TITLE, FUN)]}
+    return {"get_started": {"payload": GET_STARTED},
+            "persistent_menu": [{"locale": "default",
+                                 "composer_input_disabled": False,
+                                 "call_to_actions": [
+                                     postback(UPCOMING_TITLE, UPCOMING),
+                                     postback(SUBMIT_SCORE_TITLE, GAMES),
+                                     more]}]}
+
+
+def set_messenger_profile(url=GRAPH_URL, access_token=PAGE_ACCESS_TOKEN,
+                          timeout=10):
+    """Register the persistent menu and get started button
+
+    Parameters:
+        url: the graph url (string)
+        access_token: the page access token (string)
+        timeout: the seconds to wait for facebook (float)
+    Returns:
+        registered: whether facebook accepted the profile (boolean)
+    """
+    return _request("POST", url, access_token, messenger_profile(), timeout)
+
+
+def delete_messenger_profile(url=GRAPH_URL, access_token=PAGE_ACCESS_TOKEN,
+                             timeout=10):
+    """Remove the persistent menu and get started button
+
+    Parameters:
+        url: the graph url (string)
+        access_token: the page access token (string)
+        timeout: the seconds to wait for facebook (float)
+    Returns:
+        deleted: whether facebook removed the profile (boolean)
+    """
+    return _request("DELETE", url, access_token, {"fields": FIELDS}, timeout)
+
+
+def _request(method, url, access_token, body, timeout):
+    try:
+        r = requests.request(method,
+                             url + "me/messenger_profile",
+                             params={"access_token": access_token},
+                             json=body,
+                             timeout=timeout)
+    except requests.RequestException as e:
+        log(str(e))
+        return False
+    if r.status_code != 200:
+        log(r.status_code)
+        log(r.text)
+        return False
+    return True
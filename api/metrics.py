@@ -0,0 +1,152 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Simple in-process counters, gauges and histograms for the bot
+'''
+import threading
+import time
+
+
+class Counter():
+    """A thread safe counter that only goes up"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def value(self):
+        return self._value
+
+
+class Gauge():
+    """A value that goes up and down or is read from a function"""
+    def __init__(self, function=None):
+        self._lock = threading.Lock()
+        self._value = 0
+        self._function = function
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    def value(self):
+        if self._function is not None:
+            return self._function()
+        return self._value
+
+
+class Histogram():
+    """Keeps count, sum, max and bucket counts of observations
+
+    Parameters:
+        buckets: the upper bounds of the buckets (list of floats)
+    """
+    def __init__(self, buckets=(0.005, 0.01, 0.025, 0.05, 0.1,
+                                0.25, 0.5, 1, 2.5, 5, 10)):
+        self._lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    def observe(self, value):
+        with self._lock:
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+            else:
+                self._counts[-1] += 1
+
+    def time(self):
+        """Returns a context manager that observes the elapsed seconds"""
+        return _Timer(self)
+
+    def value(self):
+        with self._lock:
+            buckets = {}
+            total = 0
+            for bound, count in zip(self.buckets, self._counts):
+                total += count
+                buckets[str(bound)] = total
+            buckets["+Inf"] = self._count
+            mean = self._sum / self._count if self._count > 0 else 0.0
+            return {"count": self._count,
+                    "sum": self._sum,
+                    "mean": mean,
+                    "max": self._max,
+                    "buckets": buckets}
+
+
+class _Timer():
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.observe(time.monotonic() - self.start)
+        return False
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _register(name, factory):
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = factory()
+        return _registry[name]
+
+
+def counter(name):
+    """Returns the counter registered under the name (creating it if needed)
+    """
+    return _register(name, Counter)
+
+
+def gauge(name, function=None):
+    """Returns the gauge registered under the name (creating it if needed)
+
+    Parameters:
+        name: the name of the gauge (string)
+        function: a function to read the value from (function)
+    """
+    return _register(name, lambda: Gauge(function=function))
+
+
+def histogram(name, **kwargs):
+    """Returns the histogram registered under the name (creating it if needed)
+    """
+    return _register(name, lambda: Histogram(**kwargs))
+
+
+def snapshot():
+    """Returns the current value of every registered metric
+
+    Returns:
+        metrics: a dictionary of metric name to value (dict)
+    """
+    with _registry_lock:
+        metrics = list(_registry.items())
+    return {name: metric.value() for name, metric in sorted(metrics)}
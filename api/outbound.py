@@ -0,0 +1,228 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Rate limited delivery of send api messages with retries
+'''
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from api.worker import WorkerPool
+from api.helper import log
+from api import metrics
+
+
+class TokenBucket():
+    """Allows rate sends a second with bursts of up to burst sends
+
+    Parameters:
+        rate: the tokens added a second, 0 for no limit (float)
+        burst: the most tokens the bucket holds (float)
+        clock: the function returning the current time (function)
+    """
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Takes a token
+
+        Returns:
+            wait: the seconds to wait before using the token (float)
+        """
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._updated) *
+                               self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+
+def recipient(data):
+    """Returns the facebook id a send api message is for
+
+    Parameters:
+        data: the message (dict or already encoded string)
+    Returns:
+        sender_id: the id of the recipient (string)
+    """
+    if isinstance(data, str):
+        data = json.loads(data)
+    return data["recipient"]["id"]
+
+
+def retryable(response):
+    """Returns whether a send api response is worth retrying
+    """
+    return (response is None or
+            response.status_code == 429 or
+            response.status_code >= 500)
+
+
+class OutboundScheduler():
+    """Delivers send api messages within the page's and each recipient's
+    rate limits, retrying throttled and failed sends
+
+    The messages are handled on lanes keyed by recipient so a recipient's
+    messages are delivered one at a time in the order submitted, a retry
+    holding back the messages behind it. Without workers the messages are
+    delivered by the thread submitting them and never retried so that
+    thread is not held up by the backoff.
+
+    Parameters:
+        send: posts a message and returns the response or None (function)
+        workers: the number of delivery threads (int)
+        page_rate: sends a second for the whole page (float)
+        page_burst: sends the page can make at once (int)
+        recipient_rate: sends a second to one recipient (float)
+        recipient_burst: sends to one recipient at once (int)
+        retries: the most times a message is retried (int)
+        backoff: the seconds before the first retry (float)
+        max_backoff: the most seconds between retries (float)
+        size: the most recipients whose rate is remembered (int)
+        sleep: the function used to wait (function)
+        blocked: returns whether sends fail straight away so a message
+                 that could not be sent is not retried, e.g. while the
+                 breaker is open (function)
+    """
+    def __init__(self, send, workers=0, page_rate=0, page_burst=1,
+                 recipient_rate=0, recipient_burst=1, retries=3, backoff=0.5,
+                 max_backoff=8, size=10000, sleep=time.sleep,
+                 blocked=lambda: False):
+        self.send = send
+        self.blocked = blocked
+        self.page = TokenBucket(page_rate, page_burst)
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.size = size
+        self.sleep = sleep
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        if workers > 0:
+            self.pool = WorkerPool("outbound", workers, self._handle,
+                                   key=lambda item: item[2])
+        else:
+            self.pool = None
+        self.delivered = metrics.counter("outbound.delivered")
+        self.retried = metrics.counter("outbound.retries")
+        self.dropped = metrics.counter("outbound.dropped")
+        self.throttled = metrics.histogram("outbound.throttle_seconds")
+
+    def submit(self, data, done=None, sender_id=None, sending=None):
+        """Queue a message for delivery
+
+        Parameters:
+            data: the send api message (dict or already encoded string)
+            done: called with whether it was delivered or dropped (function)
+            sender_id: the recipient, read from the message if not given
+                       (string)
+            sending: called right before the message's last attempt is
+                     sent (function)
+        """
+        if sender_id is None:
+            sender_id = recipient(data)
+        if self.pool is None:
+            delivered = self.deliver(data,
+                                     sender_id=sender_id,
+                                     retries=0,
+                                     sending=sending)
+            if done is not None:
+                done(delivered)
+        else:
+            self.pool.submit((data, done, sender_id, sending))
+
+    def depth(self):
+        """Returns the number of messages waiting to be delivered"""
+        return 0 if self.pool is None else self.pool.depth()
+
+    def join(self):
+        """Block until every submitted message has been handled"""
+        if self.pool is not None:
+            self.pool.join()
+
+    def _handle(self, item):
+        (data, done, sender_id, sending) = item
+        delivered = self.deliver(data, sender_id=sender_id, sending=sending)
+        if done is not None:
+            done(delivered)
+
+    def deliver(self, data, sender_id=None, retries=None, sending=None):
+        """Send a message once the rate limits allow it, retrying it
+
+        Parameters:
+            data: the send api message (dict or already encoded string)
+            sender_id: the recipient, read from the message if not given
+                       (string)
+            retries: the most times to retry it, defaults to the
+                     scheduler's (int)
+            sending: called right before the last attempt is sent, the
+                     one not followed by a retry (function)
+        Returns:
+            delivered: whether the message was accepted (boolean)
+        """
+        if sender_id is None:
+            sender_id = recipient(data)
+        if retries is None:
+            retries = self.retries
+        bucket = self._bucket(sender_id)
+        attempt = 0
+        while True:
+            wait = max(self.page.reserve(), bucket.reserve())
+            if wait > 0:
+                self.throttled.observe(wait)
+                self.sleep(wait)
+            if sending is not None and attempt == retries:
+                sending()
+            response = self.send(data)
+            if response is not None and response.status_code == 200:
+                self.delivered.inc()
+                return True
+            if (not retryable(response) or
+                    attempt >= retries or
+                    (response is None and self.blocked())):
+                self.dropped.inc()
+                log("Dropped message: {}".format(data))
+                return False
+            self.retried.inc()
+            self.sleep(self._delay(response, attempt))
+            attempt += 1
+
+    def _delay(self, response, attempt):
+        # full jitter so throttled workers do not retry together
+        delay = random.uniform(0, min(self.max_backoff,
+                                      self.backoff * 2 ** attempt))
+        if response is not None:
+            try:
+                delay = max(delay, float(response.headers["Retry-After"]))
+            except (KeyError, TypeError, ValueError):
+                pass
+        return min(delay, self.max_backoff)
+
+    def _bucket(self, sender_id):
+        with self._lock:
+            bucket = self._buckets.get(sender_id)
+            if bucket is None:
+                # a forgotten recipient's bucket would have been full anyway
+                bucket = TokenBucket(self.recipient_rate,
+                                     self.recipient_burst)
+                self._buckets[sender_id] = bucket
+                while len(self._buckets) > self.size:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(sender_id)
+            return bucket
@@ -0,0 +1,176 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Pooled client for the league platform with a timeout per endpoint
+'''
+import json
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from api.helper import log
+from api.errors import PlatformException, PLATFORMMESSAGE
+from api import metrics
+
+
+def parse_timeouts(text):
+    """Returns the seconds given for each endpoint
+
+    Parameters:
+        text: comma separated endpoint=seconds (string)
+    Returns:
+        timeouts: the seconds for each endpoint (dict)
+    """
+    timeouts = {}
+    for pair in text.split(","):
+        if "=" in pair:
+            (endpoint, seconds) = pair.split("=", 1)
+            timeouts[endpoint.strip().strip("/")] = float(seconds)
+    return timeouts
+
+
+def server_error(response):
+    """Returns whether a response means the server is failing
+    """
+    return response.status_code >= 500
+
+
+class PlatformClient():
+    """Makes the requests to the platform over a pool of kept alive
+    connections
+
+    Every request has a connect and read timeout so a hung platform can
+    not hold a worker forever. The read timeout can be set per endpoint
+    for the ones known to be slow, and the seconds each endpoint takes are
+    kept in a platform.ENDPOINT.seconds histogram. The session is created
+    lazily in every process like the SendClient's.
+
+    Parameters:
+        url: the platform url (string)
+        pool_size: the most connections kept alive (int)
+        connect_timeout: the seconds to wait for a connection (float)
+        read_timeout: the seconds to wait for a response (float)
+        timeouts: the read timeout of endpoints that differ (dict)
+        breaker: stops calling while the platform keeps failing
+                 (CircuitBreaker)
+        bulkhead: limits the calls to the platform at once (Bulkhead)
+        single_flight: shares the shared requests made at once
+                       (SingleFlight)
+    """
+    def __init__(self, url, pool_size=10, connect_timeout=3.05,
+                 read_timeout=10, timeouts={}, breaker=None, bulkhead=None,
+                 single_flight=None):
+        self.url = url
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.timeouts = timeouts
+        self.breaker = breaker
+        self.bulkhead = bulkhead
+        self.single_flight = single_flight
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+        self.errors = metrics.counter("platform.errors")
+
+    @property
+    def session(self):
+        """The session of this process"""
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=self.pool_size,
+                                      pool_block=False)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+                self._pid = os.getpid()
+            return self._session
+
+    def timeout(self, endpoint):
+        """Returns the (connect, read) timeout of an endpoint"""
+        return (self.connect_timeout,
+                self.timeouts.get(endpoint, self.read_timeout))
+
+    def latency(self, endpoint):
+        """Returns the seconds after which a call to an endpoint is slow
+
+        The breaker's latency is for the default read timeout so endpoints
+        with a longer or shorter read timeout get a latency scaled by as
+        much, keeping their normal calls from opening the breaker.
+        """
+        if self.breaker is None or self.breaker.latency <= 0:
+            return 0
+        return (self.breaker.latency * self.timeout(endpoint)[1] /
+                self.read_timeout)
+
+    def request(self, method, path, endpoint=None, shared=False, **kwargs):
+        """Make a request to the platform
+
+        Parameters:
+            method: the http method (string)
+            path: the path relative to the platform url (string)
+            endpoint: the path without ids for the timeouts and metrics,
+                      defaults to the path (string)
+            shared: the request only reads so the same request already in
+                    flight can share its response (boolean)
+            kwargs: passed on to requests
+        Raises:
+            PlatformException: if the platform is down or can not be reached
+        Returns:
+            r: the response
+        """
+        if shared and self.single_flight is not None:
+            key = (method,
+                   path,
+                   json.dumps(kwargs, sort_keys=True, default=str))
+            return self.single_flight.do(
+                        key,
+                        lambda: self._request(method, path, endpoint, kwargs))
+        return self._request(method, path, endpoint, kwargs)
+
+    def _request(self, method, path, endpoint, kwargs):
+        endpoint = (endpoint or path).strip("/")
+        timeout = self.timeout(endpoint)
+        latency = metrics.histogram("platform." + endpoint + ".seconds")
+
+        def call():
+            started = time.monotonic()
+            try:
+                return self.session.request(method,
+                                            self.url + path,
+                                            timeout=timeout,
+                                            **kwargs)
+            finally:
+                latency.observe(time.monotonic() - started)
+
+        def guarded():
+            if self.breaker is None:
+                return call()
+            return self.breaker.call(call,
+                                     failed=server_error,
+                                     latency=self.latency(endpoint))
+        try:
+            if self.bulkhead is None:
+                return guarded()
+            return self.bulkhead.call(guarded)
+        except requests.RequestException as e:
+            self.errors.inc()
+            log(str(e))
+            raise PlatformException(PLATFORMMESSAGE)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def close(self):
+        """Close the connections of this process"""
+        with self._lock:
+            if self._session is not None and self._pid == os.getpid():
+                self._session.close()
+            self._session = None
@@ -0,0 +1,144 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Releases each sender's events in the order facebook stamped them
+'''
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from api import metrics
+
+
+class ReorderBuffer():
+    """Holds each sender's events for a short window and then releases them
+    sorted by their facebook timestamp
+
+    A sender's events are released together once their oldest held event
+    has been held for the window. When the buffer holds too many events the
+    sender holding the oldest event is released early.
+
+    Parameters:
+        hold: the seconds an event is held for (float)
+        size: the most events held at once (int)
+        release: called with the sender id and their sorted events (function)
+        clock: the function returning the current time (function)
+        background: release from a background thread, otherwise only when
+                    flush is called (boolean)
+    """
+    def __init__(self, hold, size, release, clock=time.monotonic,
+                 background=True):
+        self.hold = hold
+        self.background = background
+        self.size = size
+        self.release = release
+        self.clock = clock
+        self._condition = threading.Condition()
+        # taking and releasing together keeps a sender's releases in order
+        self._releasing = threading.Lock()
+        self._held = OrderedDict()
+        self._count = 0
+        self._sequence = itertools.count()
+        self._released = OrderedDict()
+        self._pid = None
+        self.reordered = metrics.counter("reorder.reordered")
+        self.late = metrics.counter("reorder.late")
+        self.forced = metrics.counter("reorder.forced")
+        metrics.gauge("reorder.held", lambda: self._count)
+
+    def add(self, sender_id, events):
+        """Hold a sender's events
+
+        Parameters:
+            sender_id: the facebook id of the sender (string)
+            events: the sender's messaging events in arrival order (list)
+        """
+        self.start()
+        with self._releasing:
+            forced = []
+            with self._condition:
+                now = self.clock()
+                if sender_id not in self._held:
+                    self._held[sender_id] = (now + self.hold, [])
+                (__, heap) = self._held[sender_id]
+                for event in events:
+                    timestamp = event.get("timestamp")
+                    if timestamp is None:
+                        timestamp = int(time.time() * 1000)
+                    heapq.heappush(heap,
+                                   (timestamp, next(self._sequence), event))
+                    self._count += 1
+                while self._count > self.size and len(self._held) > 0:
+                    # the first sender held is the one with the oldest event
+                    oldest = next(iter(self._held))
+                    forced.append((oldest, self._take(oldest)))
+                    self.forced.inc()
+                self._condition.notify()
+            for (sender, sorted_events) in forced:
+                self.release(sender, sorted_events)
+
+    def flush(self, everything=False):
+        """Release the senders whose window has passed
+
+        Parameters:
+            everything: release every sender no matter their window (boolean)
+        Returns:
+            released: the number of senders released (int)
+        """
+        with self._releasing:
+            due = []
+            with self._condition:
+                now = self.clock()
+                for (sender_id, (expires, __)) in list(self._held.items()):
+                    if not everything and expires > now:
+                        # held in arrival order so the rest are not due
+                        break
+                    due.append((sender_id, self._take(sender_id)))
+            for (sender_id, events) in due:
+                self.release(sender_id, events)
+            return len(due)
+
+    def start(self):
+        """Start the thread that releases the held events in this process"""
+        with self._condition:
+            if not self.background or self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run,
+                         name="reorder",
+                         daemon=True).start()
+
+    def _take(self, sender_id):
+        (__, heap) = self._held.pop(sender_id)
+        self._count -= len(heap)
+        held = sorted(heap)
+        events = [event for (__, __, event) in held]
+        arrival = [sequence for (__, sequence, __) in held]
+        if arrival != sorted(arrival):
+            self.reordered.inc()
+        last = self._released.get(sender_id)
+        if last is not None and len(held) > 0 and held[0][0] < last:
+            # came after a later event was already released
+            self.late.inc()
+        if len(held) > 0:
+            self._released[sender_id] = held[-1][0]
+            self._released.move_to_end(sender_id)
+            while len(self._released) > self.size:
+                self._released.popitem(last=False)
+        return events
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if len(self._held) == 0:
+                    self._condition.wait()
+                    continue
+                (expires, __) = next(iter(self._held.values()))
+                wait = expires - self.clock()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+            self.flush()
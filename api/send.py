@@ -0,0 +1,222 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Pooled keep-alive client for the Graph Send API
+'''
+import json
+import os
+import threading
+import time
+import requests
+from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
+from api.helper import log
+from api.breaker import CircuitOpenException
+from api.bulkhead import BulkheadFullException
+from api import metrics
+
+# the most requests graph accepts in one batch
+BATCH_LIMIT = 50
+
+
+def encode(value):
+    """Returns a send api field as a form value
+
+    Parameters:
+        value: the value of the field (dict, list or string)
+    Returns:
+        value: objects as json and anything else as is (string)
+    """
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+class SendClient():
+    """Posts to the Send API over a pool of kept alive connections
+
+    The session is created lazily in every process so a client created
+    before gunicorn forks never shares its sockets with another process.
+    The session's connection pool is safe to share between threads.
+
+    Parameters:
+        url: the Send API url (string)
+        access_token: the page access token (string)
+        pool_size: the most connections kept alive (int)
+        connect_timeout: the seconds to wait for a connection (float)
+        read_timeout: the seconds to wait for a response (float)
+        verify: verify the certificate or the CA bundle to use (bool/string)
+        batch_url: the graph url batch requests are posted to (string)
+        relative_url: the Send API relative to the batch url (string)
+        breaker: stops posting while graph keeps failing (CircuitBreaker)
+        bulkhead: limits the posts to graph at once (Bulkhead)
+    """
+    def __init__(self, url, access_token, pool_size=10,
+                 connect_timeout=3.05, read_timeout=10, verify=True,
+                 batch_url=None, relative_url="me/messages", breaker=None,
+                 bulkhead=None):
+        self.url = url
+        self.batch_url = batch_url
+        self.relative_url = relative_url
+        self.access_token = access_token
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.verify = verify
+        self.breaker = breaker
+        self.bulkhead = bulkhead
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+        self.sent = metrics.counter("send.sent")
+        self.errors = metrics.counter("send.errors")
+        self.latency = metrics.histogram("send.seconds")
+        self.batches = metrics.counter("send.batches")
+        self.batch_items = metrics.counter("send.batch_items")
+        self.batch_errors = metrics.counter("send.batch_item_errors")
+
+    @property
+    def session(self):
+        """The session of this process"""
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=self.pool_size,
+                                      pool_block=False)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Content-Type": "application/json"})
+                session.params = {"access_token": self.access_token}
+                self._session = session
+                self._pid = os.getpid()
+            return self._session
+
+    def post(self, data):
+        """Post a message or sender action
+
+        Failures are logged rather than raised so a lost typing indicator or
+        message does not abort the rest of the user's step.
+
+        Parameters:
+            data: the payload (dict or already encoded string)
+        Returns:
+            response: the response or None if it could not be sent
+        """
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        started = time.monotonic()
+        try:
+            r = self._call(lambda: self.session.post(self.url,
+                                                     data=data,
+                                                     timeout=self.timeout,
+                                                     verify=self.verify))
+        except (requests.RequestException, CircuitOpenException,
+                BulkheadFullException) as e:
+            self.errors.inc()
+            log(str(e))
+            return None
+        finally:
+            self.latency.observe(time.monotonic() - started)
+        self.sent.inc()
+        if r.status_code != 200:
+            self.errors.inc()
+            log(r.status_code)
+            log(r.text)
+        return r
+
+    def _call(self, request):
+        if self.breaker is not None:
+            request = self._guard(self.breaker, request)
+        if self.bulkhead is not None:
+            return self.bulkhead.call(request)
+        return request()
+
+    def _guard(self, breaker, request):
+        return lambda: breaker.call(request,
+                                    failed=lambda r: r.status_code >= 500)
+
+    def post_batch(self, messages):
+        """Post messages in as few graph batch requests as possible
+
+        Graph runs the requests of a batch in parallel so each message
+        depends on the one before it to the same recipient, keeping their
+        order. A failed message is logged along with the message.
+
+        Parameters:
+            messages: the payloads in the order to send (list of dict/string)
+        Returns:
+            results: the (status code, body) of each message, None for a
+                     message that was not run (list)
+        """
+        results = []
+        for start in range(0, len(messages), BATCH_LIMIT):
+            results.extend(self._post_batch(
+                                messages[start:start + BATCH_LIMIT]))
+        return results
+
+    def _post_batch(self, messages):
+        batch = []
+        last = {}
+        for (i, data) in enumerate(messages):
+            if isinstance(data, str):
+                data = json.loads(data)
+            name = "m{}".format(i)
+            request = {"method": "POST",
+                       "relative_url": self.relative_url,
+                       "name": name,
+                       "omit_response_on_success": False,
+                       "body": urlencode({key: encode(value)
+                                          for (key, value) in data.items()})}
+            recipient = json.dumps(data.get("recipient"), sort_keys=True)
+            if recipient in last:
+                request["depends_on"] = last[recipient]
+            last[recipient] = name
+            batch.append(request)
+        self.batches.inc()
+        self.batch_items.inc(len(messages))
+        started = time.monotonic()
+        try:
+            r = self._call(lambda: self.session.post(
+                    self.batch_url,
+                    data={"batch": json.dumps(batch),
+                          "include_headers": "false"},
+                    headers={"Content-Type":
+                             "application/x-www-form-urlencoded"},
+                    timeout=self.timeout,
+                    verify=self.verify))
+            responses = r.json() if r.status_code == 200 else None
+        except (requests.RequestException, CircuitOpenException,
+                BulkheadFullException, ValueError) as e:
+            log(str(e))
+            r = None
+            responses = None
+        finally:
+            self.latency.observe(time.monotonic() - started)
+        if not isinstance(responses, list):
+            self.errors.inc()
+            self.batch_errors.inc(len(messages))
+            if r is not None:
+                log(r.status_code)
+                log(r.text)
+            return [None] * len(messages)
+        self.sent.inc()
+        results = []
+        for (i, data) in enumerate(messages):
+            response = responses[i] if i < len(responses) else None
+            if response is None:
+                results.append(None)
+            else:
+                results.append((response.get("code"), response.get("body")))
+            if response is None or response.get("code") != 200:
+                self.batch_errors.inc()
+                log("Batched message failed: {}".format(data))
+                log(response)
+        return results
+
+    def close(self):
+        """Close the connections of this process"""
+        with self._lock:
+            if self._session is not None and self._pid == os.getpid():
+                self._session.close()
+            self._session = None
@@ -0,0 +1,183 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Decides what work to shed when too many events are waiting
+'''
+import json
+import threading
+import time
+from collections import OrderedDict
+from api import metrics
+from api.variables import UPCOMING, LEADERS, EVENTS, FUN, UPCOMING_TITLE,\
+    LEAGUE_LEADERS_TITLE, EVENTS_TITLE, FUN_TITLE, BUSY_COMMENT, GAMES,\
+    SCORE, HR_BAT, HR_NUM, SS_BAT, SS_NUM, REVIEW
+
+# the classes of events
+INFORMATIONAL = "informational"
+SCORE_FLOW = "score flow"
+# what to do with the events
+PROCESS = "process"
+QUIET = "quiet"
+BUSY = "busy"
+# the requests that are cheap to retry
+INFORMATIONAL_REQUESTS = [option.lower() for option in (UPCOMING,
+                                                        LEADERS,
+                                                        EVENTS,
+                                                        FUN,
+                                                        UPCOMING_TITLE,
+                                                        LEAGUE_LEADERS_TITLE,
+                                                        EVENTS_TITLE,
+                                                        FUN_TITLE)]
+# the states of a user in the middle of submitting a score
+SCORE_FLOW_STATES = [GAMES, SCORE, HR_BAT, HR_NUM, SS_BAT, SS_NUM, REVIEW]
+# the busy reply is encoded once and only the recipient is filled in
+_BUSY_MESSAGE = json.dumps({"text": BUSY_COMMENT})
+
+
+def classify(messaging_event):
+    """Returns the class of a messaging event
+
+    Only menu requests are informational, anything else could be part of
+    submitting a score.
+
+    Parameters:
+        messaging_event: the facebook messaging event (dict)
+    Returns:
+        the class of the event (INFORMATIONAL or SCORE_FLOW)
+    """
+    requests = []
+    if messaging_event.get("postback"):
+        requests.append(messaging_event["postback"].get("payload"))
+    message = messaging_event.get("message")
+    if isinstance(message, dict):
+        requests.append(message.get("text"))
+        quick_reply = message.get("quick_reply")
+        if isinstance(quick_reply, dict):
+            requests.append(quick_reply.get("payload"))
+    requests = [str(request).lower() for request in requests
+                if request is not None]
+    if len(requests) > 0 and all(request in INFORMATIONAL_REQUESTS
+                                 for request in requests):
+        return INFORMATIONAL
+    return SCORE_FLOW
+
+
+def classify_events(events):
+    """Returns the class of a sender's events
+
+    Parameters:
+        events: the sender's messaging events (list)
+    Returns:
+        INFORMATIONAL if every event is informational, SCORE_FLOW otherwise
+    """
+    if all(classify(event) == INFORMATIONAL for event in events):
+        return INFORMATIONAL
+    return SCORE_FLOW
+
+
+class SenderStates():
+    """Remembers the last stored state of the most recent senders
+
+    Parameters:
+        size: the most senders remembered (int)
+        clock: the function returning the current time (function)
+    """
+    def __init__(self, size, clock=time.monotonic):
+        self.size = size
+        self.clock = clock
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def remember(self, sender_id, state):
+        with self._lock:
+            self._states[sender_id] = (state, self.clock())
+            self._states.move_to_end(sender_id)
+            while len(self._states) > self.size:
+                self._states.popitem(last=False)
+
+    def get(self, sender_id, max_age=None):
+        """Returns the sender's last stored state, None if not known
+
+        Parameters:
+            sender_id: the facebook id (?)
+            max_age: the most seconds since the state was stored,
+                     None for any age (float)
+        """
+        with self._lock:
+            (state, stored) = self._states.get(sender_id, (None, None))
+        if (state is not None and max_age is not None and
+                self.clock() - stored > max_age):
+            return None
+        return state
+
+
+def classify_sender(sender_id, events, states):
+    """Returns the class of a sender's events given their stored state
+
+    Parameters:
+        sender_id: the facebook id (?)
+        events: the sender's messaging events (list)
+        states: the remembered states of the senders (SenderStates)
+    Returns:
+        SCORE_FLOW if they are submitting a score, otherwise the class of
+        their events
+    """
+    if states.get(sender_id) in SCORE_FLOW_STATES:
+        return SCORE_FLOW
+    return classify_events(events)
+
+
+def busy_message(sender_id):
+    """Returns the encoded busy reply for the sender
+
+    Parameters:
+        sender_id: the facebook id (?)
+    Returns:
+        data: the encoded send api message (string)
+    """
+    return '{{"recipient": {{"id": {}}}, "message": {}}}'.format(
+        json.dumps(sender_id), _BUSY_MESSAGE)
+
+
+class LoadShedder():
+    """Decides what to do with events given how many are already waiting
+
+    Typing indicators are skipped first, then informational requests are
+    answered with a busy reply. Score flow events are never shed.
+
+    Parameters:
+        capacity: waiting events before shedding informational requests,
+                  0 to never shed them (int)
+        typing_depth: waiting events before skipping typing indicators,
+                      0 to never skip them (int)
+    """
+    def __init__(self, capacity, typing_depth):
+        self.capacity = capacity
+        self.typing_depth = typing_depth
+        self.shed_typing = metrics.counter("shed.typing")
+        self.shed_informational = metrics.counter("shed.informational")
+        self.over_capacity = metrics.counter("shed.score_flow_over_capacity")
+
+    def decide(self, events, depth, event_class=None):
+        """Decide what to do with a sender's events
+
+        Parameters:
+            events: the sender's messaging events (list)
+            depth: the number of events already waiting (int)
+            event_class: the class of the events if already known
+        Returns:
+            PROCESS, QUIET (process without typing indicators) or BUSY
+        """
+        if event_class is None:
+            event_class = classify_events(events)
+        full = self.capacity > 0 and depth >= self.capacity
+        if full:
+            if event_class == INFORMATIONAL:
+                self.shed_informational.inc(len(events))
+                return BUSY
+            self.over_capacity.inc(len(events))
+        if self.typing_depth > 0 and depth >= self.typing_depth:
+            self.shed_typing.inc(len(events))
+            return QUIET
+        return PROCESS
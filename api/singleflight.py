@@ -0,0 +1,68 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Shares one call between the threads making the same call at once
+'''
+import threading
+from api import metrics
+
+
+class _Call():
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight():
+    """Collapses concurrent calls with the same key into one
+
+    The first thread with a key makes the call and the threads that ask for
+    the same key while it is in flight wait for it and get its result, or
+    have its exception raised. Nothing is kept once the call finishes.
+
+    Parameters:
+        name: the name used for the metrics (string)
+    """
+    def __init__(self, name):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = metrics.counter(name + ".calls")
+        self.collapsed = metrics.counter(name + ".collapsed")
+
+    def do(self, key, function):
+        """Returns the result of the call in flight for the key or of
+        function
+
+        Parameters:
+            key: identifies calls that are the same (hashable)
+            function: makes the call (function)
+        Raises:
+            whatever the shared call raised
+        Returns:
+            the result of the shared call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+        if not leader:
+            self.collapsed.inc()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        self.calls.inc()
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,346 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Append-only spool of outbound messages that survives restarts
+'''
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from api.helper import log
+from api import metrics
+
+
+class _Segment():
+    """A spool file along with its file of delivered offsets"""
+    def __init__(self, path, locked=None):
+        self.path = path
+        self.acks = path + ".acks"
+        self.outstanding = 0
+        self.finished = False
+        # the open file holding the lock until the segment is removed
+        self.locked = locked
+        self._ack_file = None
+
+    def ack(self, offset):
+        self._write("{:d}\n".format(offset))
+
+    def sending(self, offset):
+        # marked before its last attempt so a replay knows it may have been
+        # sent, while one that died between retries is sent again
+        self._write("~{:d}\n".format(offset))
+
+    def _write(self, line):
+        if self._ack_file is None:
+            self._ack_file = open(self.acks, "a")
+        self._ack_file.write(line)
+        self._ack_file.flush()
+
+    def acked(self):
+        """Returns the offsets acknowledged and the offsets maybe sent"""
+        acked = set()
+        sending = set()
+        try:
+            with open(self.acks) as acks:
+                for line in acks:
+                    line = line.strip()
+                    if line.startswith("~"):
+                        sending.add(int(line[1:]))
+                    elif line:
+                        acked.add(int(line))
+        except (OSError, ValueError):
+            pass
+        return (acked, sending)
+
+    def close(self):
+        if self._ack_file is not None:
+            self._ack_file.close()
+            self._ack_file = None
+        if self.locked is not None:
+            self.locked.close()
+            self.locked = None
+
+    def remove(self):
+        for path in (self.path, self.acks):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.close()
+
+
+def read_records(source, offset=0):
+    """Reads the whole records of a spool file from an offset
+
+    Parameters:
+        source: the spool file opened for binary reading (file)
+        offset: where to start reading (int)
+    Returns:
+        a generator of (offset, body) tuples (int, bytes)
+    """
+    while True:
+        source.seek(offset)
+        header = source.readline()
+        if not header.endswith(b"\n"):
+            return
+        try:
+            length = int(header)
+        except ValueError:
+            return
+        body = source.read(length + 1)
+        if len(body) != length + 1:
+            return
+        yield (offset, body[:-1])
+        offset += len(header) + length + 1
+
+
+class Spool():
+    """Writes outbound messages to disk before they are delivered
+
+    Every process appends to its own segment, holding a lock on it, and a
+    background thread hands the messages to the outbound scheduler in the
+    order written. A message is known by its segment and offset, which is
+    marked in the segment's acks file right before its last attempt is sent
+    and appended once delivered (or dropped). A finished segment is removed
+    once all its messages are acknowledged.
+
+    On start the segments no process holds a lock on were left by a process
+    that died and their unacknowledged messages are delivered first. The
+    ones marked died during their last attempt and may have reached the
+    user already so they are skipped rather than sent twice. The ones that
+    died before it, between retries, are sent again. Only the records being
+    delivered are held in memory.
+
+    Parameters:
+        directory: where the segments are written (string)
+        submit: queues a message, calling sending before its last attempt
+                is sent and done once handled (function)
+        depth: returns the number of messages queued for delivery (function)
+        segment_bytes: the bytes before rolling over (int)
+        in_flight: the most messages queued for delivery at once (int)
+    """
+    def __init__(self, directory, submit, depth=lambda: 0,
+                 segment_bytes=16 * 1024 * 1024, in_flight=1000):
+        self.directory = directory
+        self.submit = submit
+        self.depth = depth
+        self.segment_bytes = segment_bytes
+        self.in_flight = in_flight
+        self._condition = threading.Condition()
+        self._pid = None
+        self._thread = None
+        self._closed = False
+        self._file = None
+        self._current = None
+        self._written = 0
+        self._segments = []
+        self._unread = deque()
+        self.spooled = metrics.counter("spool.spooled")
+        self.acked = metrics.counter("spool.acked")
+        self.replayed = metrics.counter("spool.replayed")
+        self.skipped = metrics.counter("spool.skipped")
+        metrics.gauge("spool.outstanding",
+                      lambda: sum(segment.outstanding
+                                  for segment in self._segments))
+
+    def append(self, data):
+        """Spool a message for delivery
+
+        Parameters:
+            data: the send api message (dict or already encoded string)
+        """
+        self.start()
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        body = data.encode("utf-8")
+        with self._condition:
+            self._roll()
+            self._file.write("{:d}\n".format(len(body)).encode("ascii"))
+            self._file.write(body)
+            self._file.write(b"\n")
+            self._file.flush()
+            self._written += len(body)
+            self._current.outstanding += 1
+            self._condition.notify()
+        self.spooled.inc()
+
+    def start(self):
+        """Start delivering this process's spool, orphans first"""
+        with self._condition:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._file = None
+            self._current = None
+            self._segments = []
+            self._unread = deque()
+            self._closed = False
+            self._thread = threading.Thread(target=self._run,
+                                            name="spool",
+                                            daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop delivering, leaving what is not delivered for the next start
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread if self._pid == os.getpid() else None
+        if thread is not None:
+            thread.join(5)
+        with self._condition:
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
+            self._unread = deque()
+            self._file = None
+            self._current = None
+            self._pid = None
+
+    def _roll(self):
+        if self._file is not None and self._written < self.segment_bytes:
+            return
+        if self._current is not None:
+            # kept open so the lock is held until it is all delivered
+            self._file.flush()
+            self._current.finished = True
+        os.makedirs(self.directory, exist_ok=True)
+        name = os.path.join(self.directory, "spool-{}-{}".format(
+                    datetime.utcnow().strftime("%Y%m%dT%H%M%S%f"),
+                    os.getpid()))
+        # locked before it can be seen so it is never taken for an orphan
+        spool_file = open(name + ".tmp", "ab")
+        fcntl.flock(spool_file, fcntl.LOCK_EX)
+        os.rename(name + ".tmp", name + ".log")
+        self._file = spool_file
+        self._current = _Segment(name + ".log", locked=spool_file)
+        self._segments.append(self._current)
+        self._unread.append(self._current)
+        self._written = 0
+
+    def _run(self):
+        try:
+            self.replay()
+        except Exception as e:
+            log(str(e))
+        offset = 0
+        reader = None
+        while True:
+            with self._condition:
+                while len(self._unread) == 0 and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    break
+                segment = self._unread[0]
+                # nothing is written to a segment once it is finished
+                finished = segment.finished
+            if reader is None:
+                reader = open(segment.path, "rb")
+            read = False
+            for (offset, body) in read_records(reader, offset):
+                if self._closed:
+                    break
+                read = True
+                self._deliver(segment, offset, body)
+                offset += len(str(len(body))) + len(body) + 2
+            if read:
+                continue
+            with self._condition:
+                if finished:
+                    reader.close()
+                    reader = None
+                    offset = 0
+                    self._unread.popleft()
+                    self._cleanup()
+                elif not segment.finished and not self._closed:
+                    self._condition.wait(1)
+        if reader is not None:
+            reader.close()
+
+    def _deliver(self, segment, offset, body):
+        while self.depth() >= self.in_flight:
+            time.sleep(0.01)
+
+        def done(delivered):
+            with self._condition:
+                segment.ack(offset)
+                segment.outstanding -= 1
+                self._cleanup()
+            self.acked.inc()
+
+        def sending():
+            with self._condition:
+                segment.sending(offset)
+        self.submit(body.decode("utf-8"), done, sending=sending)
+
+    def _cleanup(self):
+        for segment in list(self._segments):
+            if segment.finished and segment.outstanding == 0:
+                segment.remove()
+                self._segments.remove(segment)
+
+    def replay(self):
+        """Deliver the unacknowledged messages left by dead processes
+
+        Returns:
+            replayed: the number of messages replayed (int)
+        """
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(self.directory,
+                                                  "spool-*.log"))):
+            try:
+                orphan = open(path, "rb")
+            except OSError:
+                continue
+            try:
+                fcntl.flock(orphan, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # a live process is still writing it
+                orphan.close()
+                continue
+            segment = _Segment(path, locked=orphan)
+            (acked, marked) = segment.acked()
+            finished = threading.Event()
+            pending = [1]
+            lock = threading.Lock()
+
+            def done(delivered, offset=None):
+                with lock:
+                    if offset is not None:
+                        segment.ack(offset)
+                    pending[0] -= 1
+                    if pending[0] == 0:
+                        finished.set()
+
+            def sending(offset):
+                with lock:
+                    segment.sending(offset)
+            for (offset, body) in read_records(orphan):
+                if offset in acked:
+                    continue
+                if offset in marked:
+                    # never sent twice
+                    self.skipped.inc()
+                    log("Skipping message that may have been sent: {}"
+                        .format(body))
+                    continue
+                while self.depth() >= self.in_flight:
+                    time.sleep(0.01)
+                with lock:
+                    pending[0] += 1
+                replayed += 1
+                self.replayed.inc()
+                self.submit(body.decode("utf-8"),
+                            lambda delivered, offset=offset: done(delivered,
+                                                                  offset),
+                            sending=lambda offset=offset: sending(offset))
+            done(True)
+            finished.wait()
+            segment.remove()
+        return replayed
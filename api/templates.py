@@ -0,0 +1,69 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Send api messages for the static menus encoded once
+'''
+import json
+import re
+
+# stand-ins for what changes between sends of the same menu
+SENDER_ID = "@@sender_id@@"
+MESSAGE_TEXT = "@@message_text@@"
+_TOKENS = re.compile("({}|{})".format(SENDER_ID, MESSAGE_TEXT))
+
+
+class Template():
+    """Send api messages encoded once that only need the sender id and
+    the text spliced in
+
+    Parameters:
+        messages: the messages built with SENDER_ID and MESSAGE_TEXT (list)
+    """
+    def __init__(self, messages):
+        self.parts = [_TOKENS.split(json.dumps(data)) for data in messages]
+
+    def render(self, message_text, sender_id):
+        """Returns the encoded messages for a sender
+
+        Parameters:
+            message_text: the text for the message (string)
+            sender_id: the facebook id (string)
+        Returns:
+            messages: the encoded send api messages (list of strings)
+        """
+        # the tokens are always inside a json string
+        values = {SENDER_ID: json.dumps(sender_id)[1:-1],
+                  MESSAGE_TEXT: json.dumps(message_text)[1:-1]}
+        return ["".join(values.get(part, part) for part in parts)
+                for parts in self.parts]
+
+
+class Menu(list):
+    """Buttons or quick replies that never change, so the messages sending
+    them are only encoded once
+
+    Parameters:
+        items: the buttons or quick replies (list)
+        kind: either "buttons" or "quick_replies" (string)
+    """
+    def __init__(self, items, kind):
+        super().__init__(items)
+        self.kind = kind
+        self._template = None
+
+    def messages(self, message_text, sender_id, build):
+        """Returns the encoded messages sending the menu
+
+        Parameters:
+            message_text: the text for the message (string)
+            sender_id: the facebook id (string)
+            build: build_messages used the first time (function)
+        Returns:
+            messages: the encoded send api messages (list of strings)
+        """
+        if self._template is None:
+            self._template = Template(build(MESSAGE_TEXT,
+                                            SENDER_ID,
+                                            **{self.kind: list(self)}))
+        return self._template.render(message_text, sender_id)
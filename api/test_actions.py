@@ -0,0 +1,94 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests sending the sender actions in the background
+'''
+import unittest
+import time
+import threading
+from api.actions import SenderActions
+
+
+class TestSenderActions(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.event = threading.Event()
+
+    def send(self, data):
+        self.sent.append((data["recipient"]["id"], data["sender_action"]))
+        self.event.set()
+
+    def testInline(self):
+        actions = SenderActions(self.send, workers=0)
+        actions.typing_on("1")
+        # already showing
+        actions.typing_on("1")
+        actions.mark_seen("2")
+        self.assertEqual(self.sent, [("1", "typing_on"), ("2", "mark_seen")])
+        self.assertTrue(actions.finished("1"))
+        self.assertFalse(actions.finished("1"))
+
+    def testBackground(self):
+        release = threading.Event()
+
+        def slow(data):
+            release.wait()
+            self.send(data)
+        actions = SenderActions(slow, workers=1)
+        actions.typing_on("1")
+        # does not wait on the send api
+        self.assertEqual(self.sent, [])
+        release.set()
+        actions.pool.join()
+        self.assertEqual(self.sent, [("1", "typing_on")])
+
+    def testFinishedWhilePosting(self):
+        actions = SenderActions(None, workers=0)
+        cleared = actions.cleared.value()
+
+        def send(data):
+            if data["sender_action"] == "typing_on":
+                # the replies are sent while typing on is being posted
+                self.assertTrue(actions.finished("1"))
+            self.send(data)
+        actions.send = send
+        actions.typing_on("1")
+        self.assertEqual(self.sent, [("1", "typing_on"), ("1", "typing_off")])
+        self.assertEqual(actions.cleared.value(), cleared + 1)
+        # not when it was already posted
+        actions.send = self.send
+        actions.typing_on("2")
+        self.assertTrue(actions.finished("2"))
+        self.assertEqual(self.sent[-1], ("2", "typing_on"))
+
+    def testThreshold(self):
+        actions = SenderActions(self.send, workers=0, threshold=0.05)
+        skipped = actions.skipped.value()
+        actions.typing_on("1")
+        self.assertFalse(actions.finished("1"))
+        self.assertEqual(actions.skipped.value(), skipped + 1)
+        actions.typing_on("2")
+        self.assertTrue(self.event.wait(1))
+        self.assertTrue(actions.finished("2"))
+        time.sleep(0.1)
+        self.assertEqual(self.sent, [("2", "typing_on")])
+
+    def testDropsWhenFull(self):
+        release = threading.Event()
+
+        def blocked(data):
+            release.wait()
+        actions = SenderActions(blocked, workers=1, size=1)
+        dropped = actions.dropped.value()
+        for sender_id in ("1", "2", "3"):
+            actions.mark_seen(sender_id)
+        release.set()
+        actions.pool.join()
+        self.assertGreaterEqual(actions.dropped.value(), dropped + 1)
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
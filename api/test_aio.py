@@ -0,0 +1,156 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests the asyncio version of the webhook
+'''
+import unittest
+import asyncio
+import json
+from unittest import mock
+import api
+from api.dedup import TTLSet
+from api.variables import BASE, VERIFY_TOKEN, UPCOMING_TITLE
+from api.fakes import AsyncMemoryUsers
+try:
+    import aiohttp
+    from api.aio import AsyncBot
+except ImportError:
+    AsyncBot = None
+
+
+def decode(data):
+    # the menus are sent already encoded
+    return json.loads(data) if isinstance(data, str) else data
+
+
+def run_until_complete(coroutine):
+    # asyncio.run needs python 3.7
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def call(bot, method, body=b"", query_string=b""):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        scope = {"type": "http", "method": method, "path": "/",
+                 "query_string": query_string}
+        await bot(scope, receive, send)
+        await bot.drain()
+    run_until_complete(run())
+    return (sent[0]["status"], sent[1]["body"].decode("utf-8"))
+
+
+@unittest.skipIf(AsyncBot is None, "needs requirements-async.txt")
+class TestAsyncBot(unittest.TestCase):
+
+    def setUp(self):
+        self.user = {"_id": 1,
+                     "fid": "1",
+                     "pid": 2,
+                     "name": "Dallas Fraser",
+                     "state": BASE,
+                     "captain": -1,
+                     "game": {},
+                     "teamroster": {},
+                     "batter": -1}
+        self.users = AsyncMemoryUsers([self.user])
+        self.posted = []
+        self.seen = api.seen_events
+        api.seen_events = TTLSet("test.aio.seen", 100, 60)
+        self.bot = AsyncBot(users=self.users, threads=2)
+
+        async def post(data):
+            self.posted.append(decode(data))
+        self.bot.post = post
+
+    def tearDown(self):
+        api.seen_events = self.seen
+
+    def testVerify(self):
+        query = "hub.mode=subscribe&hub.challenge=x&hub.verify_token={}"
+        result = call(self.bot, "GET",
+                      query_string=query.format(VERIFY_TOKEN).encode())
+        self.assertEqual(result, (200, "x"))
+        result = call(self.bot, "GET",
+                      query_string=query.format("wrong").encode())
+        self.assertEqual(result[0], 403)
+
+    def testWebhook(self):
+        event = {"sender": {"id": "1"},
+                 "recipient": {"id": "2"},
+                 "message": {"mid": "m.1", "text": "hello"}}
+        body = json.dumps({"object": "page",
+                           "entry": [{"messaging": [event]}]})
+        result = call(self.bot, "POST", body=body.encode())
+        self.assertEqual(result, (200, "ok"))
+        # typing on and the base options which clear the typing indicator
+        self.assertEqual(self.posted[0]["sender_action"], "typing_on")
+        buttons = (self.posted[1]["message"]["attachment"]["payload"]
+                   ["elements"][0]["buttons"])
+        self.assertEqual(buttons[0]["title"], UPCOMING_TITLE)
+        self.assertEqual(len(self.posted), 2)
+
+    def testTypingFails(self):
+        async def post(data):
+            data = decode(data)
+            if data.get("sender_action") == "typing_on":
+                raise aiohttp.ClientError("down")
+            self.posted.append(data)
+        self.bot.post = post
+        event = {"sender": {"id": "1"},
+                 "recipient": {"id": "2"},
+                 "message": {"mid": "m.1", "text": "hello"}}
+        body = json.dumps({"object": "page",
+                           "entry": [{"messaging": [event]}]})
+        self.assertEqual(call(self.bot, "POST", body=body.encode()),
+                         (200, "ok"))
+        self.assertEqual(len(self.posted), 1)
+        self.assertIn("attachment", self.posted[0]["message"])
+
+    def testPostFails(self):
+        bot = AsyncBot(users=self.users, threads=1)
+        errors = bot.send_errors.value()
+
+        async def run():
+            with mock.patch("api.aio.GRAPH_URL", "http://127.0.0.1:1/"):
+                await bot.post({"recipient": {"id": "1"},
+                                "message": {"text": "a"}})
+            await bot.session.close()
+        run_until_complete(run())
+        self.assertEqual(bot.send_errors.value(), errors + 1)
+
+    def testSenderOrder(self):
+        async def slow_post(data):
+            await asyncio.sleep(0.01)
+            self.posted.append(decode(data))
+        self.bot.post = slow_post
+
+        async def run():
+            for i in range(0, 3):
+                event = {"sender": {"id": "1"},
+                         "recipient": {"id": "2"},
+                         "message": {"mid": "m.{}".format(i),
+                                     "text": "text {}".format(i)}}
+                self.bot.schedule("1", [event])
+            await self.bot.drain()
+        run_until_complete(run())
+        actions = [data.get("sender_action") for data in self.posted]
+        # the slow typing on was still in flight when the reply was sent
+        self.assertEqual(actions, ["typing_on", None, "typing_off"] * 3)
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
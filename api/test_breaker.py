@@ -0,0 +1,153 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests the circuit breakers
+'''
+import unittest
+from unittest import mock
+from api.breaker import CircuitBreaker, CircuitOpenException, CLOSED,\
+    HALF_OPEN, OPEN
+from api.errors import PlatformException
+from api.send import SendClient
+from api.platform_client import PlatformClient, server_error
+from api import db
+from api.fakes import response
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [0]
+        self.breaker = CircuitBreaker("test",
+                                      failures=2,
+                                      reset=10,
+                                      clock=lambda: self.now[0])
+
+    def fail(self):
+        raise ValueError("down")
+
+    def testOpensAfterFailures(self):
+        opened = self.breaker.opened.value()
+        self.assertRaises(ValueError, self.breaker.call, self.fail)
+        self.assertEqual(self.breaker.state(), CLOSED)
+        self.assertEqual(self.breaker.call(lambda: response(500),
+                                           failed=server_error).status_code,
+                         500)
+        self.assertEqual(self.breaker.state(), OPEN)
+        self.assertEqual(self.breaker.opened.value(), opened + 1)
+        called = []
+        rejected = self.breaker.rejected.value()
+        self.assertRaises(CircuitOpenException,
+                          self.breaker.call,
+                          lambda: called.append(1))
+        self.assertEqual(called, [])
+        self.assertEqual(self.breaker.rejected.value(), rejected + 1)
+
+    def testSuccessResetsFailures(self):
+        self.assertRaises(ValueError, self.breaker.call, self.fail)
+        self.assertEqual(self.breaker.call(lambda: 1), 1)
+        self.assertRaises(ValueError, self.breaker.call, self.fail)
+        self.assertEqual(self.breaker.state(), CLOSED)
+
+    def testProbeWhenHalfOpen(self):
+        for __ in range(0, 2):
+            self.assertRaises(ValueError, self.breaker.call, self.fail)
+        self.now[0] = 10
+        self.assertEqual(self.breaker.state(), HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        # only one probe at a time
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state(), OPEN)
+        self.now[0] = 20
+        self.assertEqual(self.breaker.call(lambda: 1), 1)
+        self.assertEqual(self.breaker.state(), CLOSED)
+
+    def testSlowCallFails(self):
+        breaker = CircuitBreaker("test",
+                                 failures=1,
+                                 latency=1,
+                                 clock=lambda: self.now[0])
+
+        def slow():
+            self.now[0] += 2
+            return 1
+        slowed = breaker.slow.value()
+        self.assertEqual(breaker.call(slow), 1)
+        self.assertEqual(breaker.slow.value(), slowed + 1)
+        self.assertEqual(breaker.state(), OPEN)
+
+    def testSlowPerCall(self):
+        breaker = CircuitBreaker("test",
+                                 failures=1,
+                                 latency=1,
+                                 clock=lambda: self.now[0])
+
+        def slow():
+            self.now[0] += 2
+            return 1
+        self.assertEqual(breaker.call(slow, latency=4), 1)
+        self.assertEqual(breaker.state(), CLOSED)
+
+    def testLateSuccessIgnored(self):
+        def late():
+            # the breaker opens while this call is in flight
+            for __ in range(0, 2):
+                self.assertRaises(ValueError, self.breaker.call, self.fail)
+            return 1
+        self.assertEqual(self.breaker.call(late), 1)
+        self.assertEqual(self.breaker.state(), OPEN)
+
+    def testLateResultKeepsProbe(self):
+        def late():
+            for __ in range(0, 2):
+                self.assertRaises(ValueError, self.breaker.call, self.fail)
+            self.now[0] = 10
+            self.assertTrue(self.breaker.allow())
+            return 1
+        self.breaker.call(late)
+        # the probe is still the only call let through
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record(True)
+        self.assertEqual(self.breaker.state(), CLOSED)
+
+    def testError(self):
+        breaker = CircuitBreaker("test", failures=1)
+        self.assertRaises(ValueError, breaker.call, self.fail)
+        self.assertRaises(PlatformException,
+                          breaker.call,
+                          lambda: 1,
+                          error=lambda: PlatformException("down"))
+
+
+class TestPlatformClient(unittest.TestCase):
+
+    def testFailsFast(self):
+        breaker = CircuitBreaker("test",
+                                 failures=1,
+                                 error=db.platform_breaker.error)
+        client = PlatformClient("http://127.0.0.1:1/",
+                                connect_timeout=0.5,
+                                breaker=breaker)
+        rejected = breaker.rejected.value()
+        with mock.patch("api.db.platform", client):
+            self.assertRaises(PlatformException, db.fun_meter)
+            self.assertRaises(PlatformException, db.fun_meter)
+        self.assertEqual(breaker.rejected.value(), rejected + 1)
+
+
+class TestSendClient(unittest.TestCase):
+
+    def testBreakerOpen(self):
+        breaker = CircuitBreaker("test", failures=1)
+        breaker.record(False)
+        client = SendClient("http://127.0.0.1:1/", "token", breaker=breaker)
+        errors = client.errors.value()
+        self.assertEqual(client.post({"recipient": {"id": "1"}}), None)
+        self.assertEqual(client.errors.value(), errors + 1)
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
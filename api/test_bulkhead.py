@@ -0,0 +1,101 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests the bulkheads
+'''
+import unittest
+import threading
+from unittest import mock
+from api.bulkhead import Bulkhead, BulkheadFullException
+from api.errors import PlatformException, DatabaseException,\
+    DATABASEMESSAGE
+from api.platform_client import PlatformClient
+from api import db
+import api
+
+
+class TestBulkhead(unittest.TestCase):
+
+    def hold(self, bulkhead):
+        """Returns a thread holding one of the bulkhead's slots"""
+        entered = threading.Event()
+        self.release = threading.Event()
+
+        def work():
+            entered.set()
+            self.release.wait(5)
+        thread = threading.Thread(target=bulkhead.call, args=(work,))
+        thread.start()
+        entered.wait(5)
+        return thread
+
+    def testFull(self):
+        bulkhead = Bulkhead("test", size=1, timeout=0.05)
+        rejected = bulkhead.rejected.value()
+        thread = self.hold(bulkhead)
+        self.assertEqual(bulkhead.in_use.value(), 1)
+        self.assertRaises(BulkheadFullException, bulkhead.call, lambda: 1)
+        self.assertEqual(bulkhead.rejected.value(), rejected + 1)
+        self.release.set()
+        thread.join()
+        self.assertEqual(bulkhead.in_use.value(), 0)
+        self.assertEqual(bulkhead.call(lambda: 1), 1)
+
+    def testWaitsForSlot(self):
+        bulkhead = Bulkhead("test", size=1, timeout=5)
+        thread = self.hold(bulkhead)
+        threading.Timer(0.05, self.release.set).start()
+        self.assertEqual(bulkhead.call(lambda: 1), 1)
+        thread.join()
+
+    def testReleasedOnError(self):
+        bulkhead = Bulkhead("test", size=1, timeout=0)
+
+        def fail():
+            raise ValueError("down")
+        self.assertRaises(ValueError, bulkhead.call, fail)
+        self.assertEqual(bulkhead.call(lambda: 1), 1)
+
+    def testUnlimited(self):
+        bulkhead = Bulkhead("test", size=0)
+        self.assertEqual(bulkhead.call(lambda: 1), 1)
+
+    def testIsolated(self):
+        # a full platform bulkhead does not hold up mongo
+        bulkhead = Bulkhead("test",
+                            size=1,
+                            timeout=0.05,
+                            error=db.platform_bulkhead.error)
+        thread = self.hold(bulkhead)
+        platform = PlatformClient("http://127.0.0.1:1/", bulkhead=bulkhead)
+        with mock.patch("api.db.platform", platform):
+            self.assertRaises(PlatformException, db.get_events)
+            self.assertEqual(db.mongo_call(lambda fid: fid, "1"), "1")
+        self.release.set()
+        thread.join()
+
+    def testMongoFull(self):
+        # the sender is still told when the user could not be loaded
+        bulkhead = Bulkhead("test",
+                            size=1,
+                            timeout=0.05,
+                            error=db.mongo_bulkhead.error)
+        thread = self.hold(bulkhead)
+        sent = []
+        event = {"sender": {"id": "1"},
+                 "recipient": {"id": "2"},
+                 "message": {"text": "hi"}}
+        with mock.patch("api.db.mongo_bulkhead", bulkhead):
+            self.assertRaises(DatabaseException, db.mongo_call, lambda: 1)
+            api.handle_event(event,
+                             callback=lambda *args: sent.append(args),
+                             typing=lambda *args: None)
+        self.assertEqual(sent, [(DATABASEMESSAGE, "1")])
+        self.release.set()
+        thread.join()
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,186 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests caching the season wide platform data
+'''
+import unittest
+import threading
+import time
+from unittest import mock
+from api.cache import TTLCache, Refresher, MISSING
+from api.errors import PlatformException
+from api import db
+from api.fakes import response
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [0]
+        self.cache = TTLCache("test", 2, clock=lambda: self.now[0])
+
+    def testExpire(self):
+        hits = self.cache.hits.value()
+        misses = self.cache.misses.value()
+        self.assertIs(self.cache.get("a"), MISSING)
+        self.cache.put("a", 1, 10)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.now[0] = 10
+        self.assertIs(self.cache.get("a"), MISSING)
+        self.assertEqual(self.cache.hits.value(), hits + 1)
+        self.assertEqual(self.cache.misses.value(), misses + 2)
+
+    def testEvictLeastRecentlyUsed(self):
+        evictions = self.cache.evictions.value()
+        self.cache.put("a", 1, 10)
+        self.cache.put("b", 2, 10)
+        self.cache.get("a")
+        self.cache.put("c", 3, 10)
+        self.assertEqual(len(self.cache), 2)
+        self.assertIs(self.cache.get("b"), MISSING)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertEqual(self.cache.evictions.value(), evictions + 1)
+
+    def testLoad(self):
+        loads = []
+        self.assertEqual(self.cache.load("a", 10, lambda: loads.append(1)),
+                         None)
+        self.assertEqual(self.cache.load("a", 10, lambda: loads.append(1)),
+                         None)
+        self.assertEqual(loads, [1])
+
+        def fail():
+            raise PlatformException("down")
+        self.assertRaises(PlatformException, self.cache.load, "b", 10, fail)
+        self.assertIs(self.cache.get("b"), MISSING)
+
+
+class TestRefresher(unittest.TestCase):
+
+    def testServeStale(self):
+        cache = TTLCache("test", 10)
+        refresher = Refresher(cache, lambda endpoint: 0.05, idle=0.5)
+        loads = []
+        loaded = threading.Event()
+        release = threading.Event()
+
+        def load():
+            loads.append(1)
+            if len(loads) > 1:
+                loaded.set()
+                release.wait(5)
+            return len(loads)
+        self.assertEqual(refresher.load("a", "key", load), 1)
+        self.assertTrue(loaded.wait(5))
+        # refreshing in the background so the last value is served
+        started = time.monotonic()
+        self.assertEqual(refresher.load("a", "key", load), 1)
+        self.assertLess(time.monotonic() - started, 0.5)
+        release.set()
+        for __ in range(0, 100):
+            if cache.get("key") is not MISSING:
+                break
+            time.sleep(0.01)
+        self.assertEqual(refresher.load("a", "key", load), 2)
+
+    def testFailedRefreshKeepsValue(self):
+        cache = TTLCache("test", 10)
+        refresher = Refresher(cache,
+                              lambda endpoint: 0.01,
+                              idle=0.5,
+                              retry=0.01)
+        failed = refresher.failed.value()
+        calls = []
+
+        def load():
+            calls.append(1)
+            if len(calls) > 1:
+                raise PlatformException("down")
+            return "value"
+        self.assertEqual(refresher.load("a", "key", load), "value")
+        for __ in range(0, 100):
+            if refresher.failed.value() > failed:
+                break
+            time.sleep(0.01)
+        self.assertGreater(refresher.failed.value(), failed)
+        self.assertEqual(refresher.load("a", "key", load), "value")
+
+    def testStopsWhenIdle(self):
+        cache = TTLCache("test", 10)
+        refresher = Refresher(cache, lambda endpoint: 0.01, idle=0)
+        calls = []
+        refresher.load("a", "key", lambda: calls.append(1))
+        time.sleep(0.1)
+        self.assertEqual(calls, [1])
+        self.assertEqual(len(refresher._keys), 0)
+
+
+class TestCacheTTL(unittest.TestCase):
+
+    def testGameDays(self):
+        ttls = {"api/view/fun": 1}
+        quiet = {"api/view/fun": 2}
+        with mock.patch("api.db.CACHE_TTLS", ttls),\
+                mock.patch("api.db.QUIET_CACHE_TTLS", quiet):
+            today = db.date.today().weekday()
+            with mock.patch("api.db.GAME_DAYS", [today]):
+                self.assertEqual(db.cache_ttl("api/view/fun"), 1)
+            with mock.patch("api.db.GAME_DAYS", []):
+                self.assertEqual(db.cache_ttl("api/view/fun"), 2)
+                self.assertEqual(db.cache_ttl("api/other"), 0)
+
+
+class TestSeasonData(unittest.TestCase):
+
+    def setUp(self):
+        self.platform = mock.Mock()
+        self.platform.post.return_value = response(200, [{"name": "a"}])
+        self.platform.get.return_value = response(200, {"event": "date"})
+        refresher = Refresher(TTLCache("test", 10), lambda endpoint: 60)
+        self.patches = [mock.patch("api.db.platform", self.platform),
+                        mock.patch("api.db.refresher", refresher)]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def testLeagueLeaders(self):
+        for __ in range(0, 3):
+            self.assertEqual(db.league_leaders("hr"), [{"name": "a"}])
+            self.assertEqual(db.league_leaders("ss"), [{"name": "a"}])
+        self.assertEqual(self.platform.post.call_count, 2)
+
+    def testFunAndEvents(self):
+        for __ in range(0, 3):
+            db.fun_meter()
+            self.assertEqual(db.get_events(), {"event": "date"})
+        self.assertEqual(self.platform.post.call_count, 1)
+        self.assertEqual(self.platform.get.call_count, 1)
+
+    def testWarm(self):
+        db.warm_cache()
+        self.platform.post.reset_mock()
+        self.platform.get.reset_mock()
+        db.league_leaders("hr")
+        db.league_leaders("ss")
+        db.fun_meter()
+        db.get_events()
+        self.assertEqual(self.platform.post.call_count, 0)
+        self.assertEqual(self.platform.get.call_count, 0)
+
+    def testNotCached(self):
+        self.platform.post.return_value = response(500, None)
+        self.assertRaises(PlatformException, db.fun_meter)
+        self.platform.post.return_value = response(200, 5)
+        self.assertEqual(db.fun_meter(), 5)
+        with mock.patch("api.db.cache_ttl", lambda endpoint: 0):
+            db.fun_meter()
+        self.assertEqual(self.platform.post.call_count, 3)
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
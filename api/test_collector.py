@@ -0,0 +1,157 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests collecting the replies to a sender's events
+'''
+import unittest
+import json
+from unittest import mock
+import api
+from api.collector import ResponseCollector
+from api.variables import BASE, UPCOMING_TITLE
+from api.fakes import MemoryUsers
+
+
+def build(message_text, sender_id, quick_replies=[], buttons=[]):
+    messages = [{"recipient": {"id": sender_id},
+                 "message": {"text": message_text}}]
+    if len(buttons) > 0:
+        messages.append({"recipient": {"id": sender_id},
+                         "message": {"buttons": buttons}})
+    return messages
+
+
+class TestResponseCollector(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.collector = ResponseCollector(build, self.typing)
+
+    def typing(self, sender_id):
+        self.calls.append(("typing_on", sender_id))
+
+    def send(self, data):
+        self.calls.append(("send", data["message"]))
+
+    def typing_off(self, sender_id):
+        self.calls.append(("typing_off", sender_id))
+
+    def testMergesSenderActions(self):
+        merged = self.collector.merged.value()
+        self.collector.event()
+        self.collector.typing("1")
+        self.collector.callback("a", "1")
+        self.collector.event()
+        self.collector.typing("1")
+        self.collector.callback("b", "1", buttons=["x"])
+        self.assertEqual(self.calls, [("typing_on", "1")])
+        calls = self.collector.flush(self.send, self.typing_off)
+        self.assertEqual(calls, 4)
+        self.assertEqual(self.calls, [("typing_on", "1"),
+                                      ("send", {"text": "a"}),
+                                      ("send", {"text": "b"}),
+                                      ("send", {"buttons": ["x"]}),
+                                      ("typing_off", "1")])
+        self.assertEqual(self.collector.merged.value(), merged + 2)
+
+    def testFlushBatch(self):
+        batches = []
+        self.collector.typing("1")
+        self.collector.callback("a", "1", buttons=["x"])
+        calls = self.collector.flush_batch(batches.append, limit=2)
+        self.assertEqual(calls, 2)
+        self.assertEqual(len(batches), 1)
+        self.assertEqual([data.get("sender_action") for data in batches[0]],
+                         [None, None, "typing_off"])
+
+    def testReplyClearsTyping(self):
+        collector = ResponseCollector(build,
+                                      self.typing,
+                                      typing_off_after_reply=False)
+        collector.typing("1")
+        collector.typing("2")
+        collector.callback("a", "1")
+        calls = collector.flush(self.send, self.typing_off)
+        self.assertEqual(calls, 2)
+        self.assertEqual(self.calls[2:], [("send", {"text": "a"}),
+                                          ("typing_off", "2")])
+        # no typing off when the indicator never got shown
+        collector.typing("2")
+        self.assertEqual(collector.flush(self.send,
+                                         self.typing_off,
+                                         shown=[]), 0)
+
+    def testNothingToSend(self):
+        self.collector.event()
+        self.assertEqual(self.collector.flush(self.send, self.typing_off), 0)
+        self.assertEqual(self.calls, [])
+
+
+class TestHandleEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.mongo = MemoryUsers([{"fid": "1",
+                                   "pid": 2,
+                                   "name": "Dallas Fraser",
+                                   "state": BASE,
+                                   "captain": -1,
+                                   "game": {},
+                                   "teamroster": {},
+                                   "batter": -1}])
+        self.calls = []
+
+        def punch_it(data):
+            # the user is saved before anything is sent
+            if isinstance(data, str):
+                # the menus are sent already encoded
+                data = json.loads(data)
+            self.calls.append(("send", self.mongo.saves, data))
+
+        def action(name):
+            return lambda sender_id: self.calls.append((name, sender_id))
+        self.patches = [mock.patch("api.mongo", self.mongo),
+                        mock.patch("api.punch_it", punch_it),
+                        mock.patch("api.typing_off", action("typing_off"))]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def testOneTypingIndicator(self):
+        events = [{"sender": {"id": "1"},
+                   "recipient": {"id": "2"},
+                   "message": {"text": "hello"}} for __ in range(0, 2)]
+        typing = []
+        api.handle_events(events, typing=typing.append)
+        self.assertEqual(typing, ["1"])
+        sends = [call for call in self.calls if call[0] == "send"]
+        self.assertEqual(len(sends), 2)
+        self.assertTrue(all(saves == self.mongo.saves
+                            for (__, saves, __) in sends))
+        buttons = (sends[0][2]["message"]["attachment"]["payload"]
+                   ["elements"][0]["buttons"])
+        self.assertEqual(buttons[0]["title"], UPCOMING_TITLE)
+        # the replies clear the typing indicator
+        self.assertEqual(len(self.calls), 2)
+
+
+class TestSendBatch(unittest.TestCase):
+
+    def testRetriesFailed(self):
+        messages = [{"recipient": {"id": str(i)}, "message": {"text": "a"}}
+                    for i in range(0, 5)]
+        results = [(200, "{}"), (400, "{}"), (429, "{}"), (500, "{}"), None]
+        retried = []
+        with mock.patch.object(api.send_client, "post_batch",
+                               return_value=results),\
+                mock.patch.object(api.outbound, "submit", retried.append):
+            api.send_batch(messages)
+        self.assertEqual(retried, messages[2:])
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
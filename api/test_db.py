@@ -0,0 +1,69 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests the user persistence helpers
+'''
+import unittest
+from api.db import get_user, save_user, user_batch
+from api.variables import BASE, SCORE, HR_BAT
+from api.fakes import MemoryUsers
+
+
+class TestUserBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.mongo = MemoryUsers([{"fid": "1", "state": BASE, "pid": 1},
+                                  {"fid": "2", "state": BASE, "pid": 2}])
+
+    def testWithoutBatch(self):
+        (user, created) = get_user("1", self.mongo)
+        user['state'] = SCORE
+        save_user(user, self.mongo)
+        (user, created) = get_user("1", self.mongo)
+        save_user(user, self.mongo)
+        self.assertEqual(self.mongo.db.users.finds, 2)
+        self.assertEqual(self.mongo.db.users.saves, 2)
+
+    def testBatchLoadsAndSavesOnce(self):
+        with user_batch(self.mongo):
+            for state in (SCORE, HR_BAT):
+                (user, created) = get_user("1", self.mongo)
+                self.assertEqual(created, False)
+                user['state'] = state
+                save_user(user, self.mongo)
+            (user, created) = get_user("1", self.mongo)
+            self.assertEqual(user['state'], HR_BAT)
+            # not saved yet
+            self.assertEqual(self.mongo.db.users.saves, 0)
+            # untouched users are not written
+            get_user("2", self.mongo)
+        self.assertEqual(self.mongo.db.users.finds, 2)
+        self.assertEqual(self.mongo.db.users.saves, 1)
+        self.assertEqual(self.mongo.db.users.find_one({"fid": "1"})['state'],
+                         HR_BAT)
+
+    def testBatchReturnsLastSaved(self):
+        with user_batch(self.mongo):
+            (user, created) = get_user("1", self.mongo)
+            user['state'] = SCORE
+            # changed but never saved so should not be seen
+            (user, created) = get_user("1", self.mongo)
+            self.assertEqual(user['state'], BASE)
+        self.assertEqual(self.mongo.db.users.saves, 0)
+
+    def testBatchSavesOnError(self):
+        try:
+            with user_batch(self.mongo):
+                (user, created) = get_user("1", self.mongo)
+                user['state'] = SCORE
+                save_user(user, self.mongo)
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(self.mongo.db.users.saves, 1)
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
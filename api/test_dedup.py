@@ -0,0 +1,155 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests dropping redelivered messaging events
+'''
+import unittest
+import json
+from unittest import mock
+import api
+from api.dedup import TTLSet, event_key
+from api.worker import WorkerPool
+from api.shedding import SCORE_FLOW
+
+
+class Clock():
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLSet(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.seen = TTLSet("test.dedup", 3, 10, clock=self.clock)
+
+    def testAdd(self):
+        self.assertEqual(self.seen.add("a"), True)
+        self.assertEqual(self.seen.add("a"), False)
+        self.assertEqual(self.seen.add("b"), True)
+        self.assertEqual(self.seen.hits.value(), 1)
+        self.assertEqual(self.seen.misses.value(), 2)
+
+    def testExpires(self):
+        self.seen.add("a")
+        self.clock.now = 5
+        self.seen.add("b")
+        self.clock.now = 10
+        self.assertEqual(self.seen.add("a"), True)
+        self.assertEqual(self.seen.add("b"), False)
+        self.assertEqual(len(self.seen), 2)
+
+    def testBounded(self):
+        for key in ("a", "b", "c", "d"):
+            self.seen.add(key)
+        self.assertEqual(len(self.seen), 3)
+        self.assertEqual(self.seen.evictions.value(), 1)
+        # the oldest was forgotten
+        self.assertEqual(self.seen.add("a"), True)
+        self.assertEqual(self.seen.add("d"), False)
+
+    def testDiscard(self):
+        self.seen.add("a")
+        self.seen.discard("a")
+        self.seen.discard("b")
+        self.assertEqual(self.seen.add("a"), True)
+
+
+class TestEventKey(unittest.TestCase):
+
+    def testMessage(self):
+        event = {"sender": {"id": "1"}, "message": {"mid": "m.1"}}
+        self.assertEqual(event_key(event), "mid:m.1")
+
+    def testPostback(self):
+        event = {"sender": {"id": "1"},
+                 "timestamp": 123,
+                 "postback": {"payload": "x"}}
+        self.assertEqual(event_key(event), "postback:1:123")
+
+    def testOther(self):
+        event = {"sender": {"id": "1"}, "delivery": {"watermark": 1}}
+        self.assertEqual(event_key(event), None)
+
+
+class TestWebhookDedup(unittest.TestCase):
+
+    def setUp(self):
+        self.handled = []
+        self.workers = api.workers
+        self.seen = api.seen_events
+        api.workers = WorkerPool("test.webhook.dedup", 1, self.handled.append)
+        api.seen_events = TTLSet("test.webhook.seen", 10, 60)
+        self.client = api.app.test_client()
+
+    def tearDown(self):
+        api.workers = self.workers
+        api.seen_events = self.seen
+
+    def testRedelivered(self):
+        event = {"sender": {"id": "1"},
+                 "recipient": {"id": "2"},
+                 "message": {"mid": "m.1", "text": "3"}}
+        data = json.dumps({"object": "page",
+                           "entry": [{"messaging": [event, event]}]})
+        for __ in range(0, 2):
+            self.client.post("/", data=data, content_type="application/json")
+        api.workers.join()
+        self.assertEqual(self.handled, [([event], False, SCORE_FLOW)])
+        self.assertEqual(api.seen_events.hits.value(), 3)
+
+    def testOtherSendersAfterFailure(self):
+        events = [{"sender": {"id": sender_id},
+                   "recipient": {"id": "2"},
+                   "message": {"mid": "m." + sender_id, "text": "3"}}
+                  for sender_id in ("3", "4")]
+        data = json.dumps({"object": "page",
+                           "entry": [{"messaging": events}]})
+        handled = []
+
+        def handle_event(messaging_event, **kwargs):
+            sender_id = messaging_event["sender"]["id"]
+            handled.append(sender_id)
+            if handled == ["3"]:
+                raise ValueError("save failed")
+        api.workers = None
+        api.seen_events = TTLSet("test.webhook.failed", 10, 60)
+        with mock.patch("api.handle_event", handle_event):
+            r = self.client.post("/",
+                                 data=data,
+                                 content_type="application/json")
+            self.assertEqual(r.status_code, 500)
+            self.assertEqual(handled, ["3", "4"])
+            # only the failed sender is handled on the redelivery
+            r = self.client.post("/",
+                                 data=data,
+                                 content_type="application/json")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(handled, ["3", "4", "3"])
+
+    def testRedeliveredAfterFailure(self):
+        event = {"sender": {"id": "1"},
+                 "recipient": {"id": "2"},
+                 "message": {"mid": "m.2", "text": "3"}}
+        data = {"object": "page", "entry": [{"messaging": [event]}]}
+        events = api.group_events(data)["1"]
+
+        def fail(*args, **kwargs):
+            raise ValueError("down")
+        with mock.patch("api.handle_event", fail):
+            self.assertRaises(ValueError,
+                              api.handle_events,
+                              events,
+                              callback=lambda *args: None)
+        # facebook's redelivery is handled
+        self.assertEqual(api.group_events(data), {"1": [event]})
+        self.assertEqual(api.group_events(data), {})
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,84 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests making a step's independent reads at once
+'''
+import unittest
+import threading
+import time
+from unittest import mock
+import api
+from api.fanout import FanOut
+from api.errors import PlatformException
+
+
+class TestFanOut(unittest.TestCase):
+
+    def testParallel(self):
+        fan_out = FanOut(workers=4)
+        barrier = threading.Barrier(3, timeout=5)
+
+        def call(result):
+            # only passes if all three run at the same time
+            barrier.wait()
+            return result
+        self.assertEqual(fan_out.run([lambda: call(1),
+                                      lambda: call(2),
+                                      lambda: call(3)]),
+                         [1, 2, 3])
+
+    def testInTurn(self):
+        fan_out = FanOut(workers=0)
+        threads = []
+
+        def call():
+            threads.append(threading.current_thread())
+            return len(threads)
+        self.assertEqual(fan_out.run([call, call]), [1, 2])
+        self.assertEqual(threads, [threading.current_thread()] * 2)
+
+    def testDeadline(self):
+        fan_out = FanOut(workers=2,
+                         deadline=0.05,
+                         error=lambda: PlatformException("slow"))
+        timeouts = fan_out.timeouts.value()
+        for functions in ([lambda: 1, lambda: time.sleep(0.5)],
+                          [lambda: time.sleep(0.5), lambda: 1],
+                          [lambda: time.sleep(0.5)]):
+            started = time.monotonic()
+            self.assertRaises(PlatformException, fan_out.run, functions)
+            self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(fan_out.timeouts.value(), timeouts + 3)
+
+    def testError(self):
+        fan_out = FanOut(workers=2)
+
+        def fail():
+            raise PlatformException("down")
+        self.assertRaises(PlatformException, fan_out.run, [lambda: 1, fail])
+        self.assertRaises(PlatformException, fan_out.run, [fail, lambda: 1])
+
+
+class TestDisplayLeagueLeaders(unittest.TestCase):
+
+    def testBothStats(self):
+        sent = []
+        stats = []
+
+        def league_leaders(stat):
+            stats.append(stat)
+            return [{"name": stat, "team": "a", "hits": 1}]
+
+        def callback(message, sender_id):
+            sent.append(message)
+        with mock.patch("api.league_leaders", league_leaders):
+            api.display_league_leaders({}, "1", callback=callback)
+        self.assertEqual(sorted(stats), ["hr", "ss"])
+        self.assertEqual(sent, [api.HR_TITLE + "\nhr (a): 1",
+                                api.SS_TITLE + "\nss (a): 1"])
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
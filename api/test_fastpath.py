@@ -0,0 +1,108 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests filtering the webhook posts the bot does nothing with
+'''
+import unittest
+import io
+import json
+import api
+from api.fastpath import FastPath, no_op_reason
+from api.worker import WorkerPool
+from api.shedding import SCORE_FLOW
+
+
+def body(*events):
+    return json.dumps({"object": "page",
+                       "entry": [{"messaging": list(events)}]}).encode()
+
+
+DELIVERY = {"sender": {"id": "1"},
+            "recipient": {"id": "2"},
+            "delivery": {"mids": ["m.1"], "watermark": 1}}
+READ = {"sender": {"id": "1"},
+        "recipient": {"id": "2"},
+        "read": {"watermark": 1}}
+MESSAGE = {"sender": {"id": "1"},
+           "recipient": {"id": "2"},
+           "message": {"mid": "m.2", "text": "hi"}}
+
+
+class TestFastPath(unittest.TestCase):
+
+    def setUp(self):
+        self.called = []
+        self.fast_path = FastPath(lambda e, s: self.called.append(e),
+                                  ignored=lambda sender: sender == "9")
+
+    def testNoOp(self):
+        self.assertEqual(self.fast_path.no_op(body(DELIVERY, READ)), True)
+        self.assertEqual(self.fast_path.no_op(body(DELIVERY, MESSAGE)),
+                         False)
+        ignored = dict(MESSAGE, sender={"id": "9"})
+        self.assertEqual(self.fast_path.no_op(body(ignored)), True)
+        self.assertEqual(self.fast_path.no_op(body(ignored, MESSAGE)), False)
+        self.assertEqual(self.fast_path.no_op(b""), False)
+
+    def testMiddleware(self):
+        data = body(DELIVERY)
+        environ = {"REQUEST_METHOD": "POST",
+                   "PATH_INFO": "/",
+                   "CONTENT_LENGTH": str(len(data)),
+                   "wsgi.input": io.BytesIO(data)}
+        statuses = []
+        result = self.fast_path(environ, lambda s, h: statuses.append(s))
+        self.assertEqual(result, [b"ok"])
+        self.assertEqual(statuses, ["200 OK"])
+        self.assertEqual(self.called, [])
+        # passed on with the body still readable
+        data = body(MESSAGE)
+        environ["CONTENT_LENGTH"] = str(len(data))
+        environ["wsgi.input"] = io.BytesIO(data)
+        self.fast_path(environ, None)
+        self.assertEqual(self.called[0]["wsgi.input"].read(), data)
+
+
+class TestNoOpReason(unittest.TestCase):
+
+    def testReasons(self):
+        self.assertEqual(no_op_reason(DELIVERY), "delivery")
+        self.assertEqual(no_op_reason(READ), "read")
+        self.assertEqual(no_op_reason(MESSAGE), None)
+        echo = {"sender": {"id": "1"},
+                "message": {"is_echo": True, "text": "hi"}}
+        self.assertEqual(no_op_reason(echo), "echo")
+        sticker = {"sender": {"id": "1"},
+                   "message": {"attachments": [{"type": "image"}]}}
+        self.assertEqual(no_op_reason(sticker), "attachments")
+        postback = {"sender": {"id": "1"}, "postback": {"payload": "x"}}
+        self.assertEqual(no_op_reason(postback), None)
+
+
+class TestWebhookFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.handled = []
+        self.workers = api.workers
+        api.workers = WorkerPool("test.fastpath", 1, self.handled.append)
+        self.client = api.app.test_client()
+
+    def tearDown(self):
+        api.workers = self.workers
+
+    def testFiltersEvents(self):
+        echo = {"sender": {"id": "1"},
+                "message": {"is_echo": True, "text": "hi"}}
+        message = dict(MESSAGE, message={"mid": "m.fast", "text": "hi"})
+        r = self.client.post("/",
+                             data=body(DELIVERY, echo, message),
+                             content_type="application/json")
+        self.assertEqual(r.status_code, 200)
+        api.workers.join()
+        self.assertEqual(self.handled, [([message], False, SCORE_FLOW)])
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
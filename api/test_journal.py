@@ -0,0 +1,87 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests the journal of raw webhook posts
+'''
+import unittest
+import os
+import gzip
+import shutil
+import tempfile
+import api
+from api.journal import Journal, read_segment
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def segments(self):
+        return sorted(os.path.join(self.directory, name)
+                      for name in os.listdir(self.directory))
+
+    def testAppendAndRead(self):
+        journal = Journal(self.directory, 1024, 60)
+        bodies = [b'{"object": "page"}', b'{"a":\n1}', b""]
+        for body in bodies:
+            journal.append(body)
+        journal.close()
+        segments = self.segments()
+        self.assertEqual(len(segments), 1)
+        records = list(read_segment(segments[0]))
+        self.assertEqual([body for (__, body) in records], bodies)
+
+    def testRollsOver(self):
+        journal = Journal(self.directory, 10, 60)
+        for i in range(0, 3):
+            journal.append(b"0123456789")
+        journal.close()
+        segments = self.segments()
+        self.assertEqual(len(segments), 3)
+        bodies = [body for segment in segments
+                  for (__, body) in read_segment(segment)]
+        self.assertEqual(bodies, [b"0123456789"] * 3)
+
+    def testReadsTruncated(self):
+        journal = Journal(self.directory, 1024, 60)
+        journal.append(b"first")
+        journal.append(b"second")
+        journal.close()
+        path = self.segments()[0]
+        with gzip.open(path, "rb") as f:
+            data = f.read()
+        with gzip.open(path, "wb") as f:
+            f.write(data[:-3])
+        bodies = [body for (__, body) in read_segment(path)]
+        self.assertEqual(bodies, [b"first"])
+
+
+class TestWebhookJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journal = api.journal
+        api.journal = Journal(self.directory, 1024, 60)
+        self.client = api.app.test_client()
+
+    def tearDown(self):
+        api.journal = self.journal
+        shutil.rmtree(self.directory)
+
+    def testJournalsRawBody(self):
+        body = b'{"object":   "other", "entry": [], "message": {}}'
+        self.client.post("/", data=body, content_type="application/json")
+        api.journal.close()
+        name = os.listdir(self.directory)[0]
+        records = list(read_segment(os.path.join(self.directory, name)))
+        self.assertEqual(records[0][1], body)
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,111 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests the persistent menu and the payloads it sends
+'''
+import unittest
+from unittest import mock
+import requests
+import api
+from api.messenger_profile import messenger_profile, set_messenger_profile,\
+    MENU_PAYLOADS
+from api.variables import BASE, HR_BAT, PID, FUN, GET_STARTED, SCORE
+from api.fakes import response
+
+
+def payloads(items):
+    for item in items:
+        if item["type"] == "nested":
+            yield from payloads(item["call_to_actions"])
+        else:
+            yield item["payload"]
+
+
+class TestMessengerProfile(unittest.TestCase):
+
+    def testMenu(self):
+        profile = messenger_profile()
+        self.assertEqual(profile["get_started"]["payload"], GET_STARTED)
+        items = profile["persistent_menu"][0]["call_to_actions"]
+        self.assertLessEqual(len(items), 3)
+        self.assertEqual(sorted(payloads(items)), sorted(MENU_PAYLOADS))
+        # every base option is in the menu
+        for button in api.CAPTAIN_BUTTONS:
+            self.assertIn(button["payload"], MENU_PAYLOADS)
+
+    def testSet(self):
+        request = mock.Mock(return_value=response(200))
+        with mock.patch("api.messenger_profile.requests.request", request):
+            self.assertTrue(set_messenger_profile("http://graph/", "token"))
+        (method, url) = request.call_args[0]
+        self.assertEqual((method, url), ("POST",
+                                         "http://graph/me/messenger_profile"))
+        self.assertEqual(request.call_args[1]["json"], messenger_profile())
+        request = mock.Mock(side_effect=requests.ConnectionError("down"))
+        with mock.patch("api.messenger_profile.requests.request", request):
+            self.assertFalse(set_messenger_profile("http://graph/", "token"))
+
+
+class TestMenuPayloads(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.patches = [mock.patch("api.save_user", mock.Mock()),
+                        mock.patch("api.display_fun", mock.Mock())]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def callback(self, message, sender_id, quick_replies=[], buttons=[]):
+        self.sent.append((message, buttons or quick_replies))
+
+    def testMenuPartWaySubmitting(self):
+        user = {"state": HR_BAT, "game": {"score": 1}, "captain": 1}
+        api.update_payload(user, FUN, "1", callback=self.callback)
+        self.assertEqual(user["state"], BASE)
+        self.assertEqual(user["game"], {})
+        api.display_fun.assert_called_once_with(user,
+                                                "1",
+                                                callback=self.callback)
+
+    def testGetStarted(self):
+        user = {"state": PID}
+        with mock.patch("api.determine_player") as determine:
+            api.update_payload(user, GET_STARTED, "1", callback=self.callback)
+        determine.assert_called_once_with(user, "1", callback=self.callback)
+
+    def testCancelSkipsMenu(self):
+        user = {"state": SCORE, "captain": 1, "game": {}}
+        with mock.patch("api.PERSISTENT_MENU", True),\
+                mock.patch("api.save_user", mock.Mock()):
+            api.figure_out(user, "cancel", None, "1", callback=self.callback)
+        self.assertEqual(self.sent, [(api.CANCELING_COMMENT, [])])
+        self.assertEqual(user["state"], BASE)
+        # just the menu as before without the persistent menu
+        self.sent = []
+        user["state"] = SCORE
+        with mock.patch("api.PERSISTENT_MENU", False),\
+                mock.patch("api.save_user", mock.Mock()):
+            api.figure_out(user, "cancel", None, "1", callback=self.callback)
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.sent[0][1], api.CAPTAIN_BUTTONS)
+
+    def testSkipRedundantMenu(self):
+        user = {"captain": -1}
+        with mock.patch("api.PERSISTENT_MENU", True):
+            api.base_options(user, "1", callback=self.callback, optional=True)
+            self.assertEqual(self.sent, [])
+            api.base_options(user, "1", callback=self.callback)
+        self.assertEqual(self.sent[0][1], api.BASE_BUTTONS)
+        with mock.patch("api.PERSISTENT_MENU", False):
+            api.base_options(user, "1", callback=self.callback, optional=True)
+        self.assertEqual(len(self.sent), 2)
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
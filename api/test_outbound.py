@@ -0,0 +1,158 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests the rate limited outbound scheduler
+'''
+import unittest
+import threading
+from api.outbound import TokenBucket, OutboundScheduler, recipient
+from api.fakes import response
+
+
+def message(sender_id, text):
+    return {"recipient": {"id": sender_id}, "message": {"text": text}}
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def testReserve(self):
+        now = [0]
+        bucket = TokenBucket(2, 2, clock=lambda: now[0])
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0.5)
+        self.assertEqual(bucket.reserve(), 1)
+        now[0] = 1
+        self.assertEqual(bucket.reserve(), 0.5)
+
+    def testUnlimited(self):
+        bucket = TokenBucket(0, 1)
+        for __ in range(0, 100):
+            self.assertEqual(bucket.reserve(), 0)
+
+
+class TestOutboundScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.sleeps = []
+        self.responses = []
+
+    def send(self, data):
+        self.sent.append(data)
+        if len(self.responses) > 0:
+            return self.responses.pop(0)
+        return response(200)
+
+    def scheduler(self, **kwargs):
+        return OutboundScheduler(self.send,
+                                 sleep=self.sleeps.append,
+                                 **kwargs)
+
+    def testRetries(self):
+        scheduler = self.scheduler(retries=3, backoff=1)
+        retries = scheduler.retried.value()
+        self.responses = [response(500), None, response(429)]
+        self.assertTrue(scheduler.deliver(message("1", "a")))
+        self.assertEqual(len(self.sent), 4)
+        self.assertEqual(scheduler.retried.value(), retries + 3)
+        # jittered but never more than the doubling backoff
+        for (attempt, delay) in enumerate(self.sleeps):
+            self.assertLessEqual(delay, 2 ** attempt)
+
+    def testDrops(self):
+        scheduler = self.scheduler(retries=1)
+        dropped = scheduler.dropped.value()
+        self.responses = [response(500), response(503)]
+        self.assertFalse(scheduler.deliver(message("1", "a")))
+        self.assertEqual(len(self.sent), 2)
+        # client errors are not retried
+        self.responses = [response(400)]
+        self.assertFalse(scheduler.deliver(message("1", "b")))
+        self.assertEqual(len(self.sent), 3)
+        self.assertEqual(scheduler.dropped.value(), dropped + 2)
+
+    def testBlocked(self):
+        # nothing is retried while the breaker is open
+        scheduler = self.scheduler(retries=3, blocked=lambda: True)
+        self.responses = [None, None]
+        self.assertFalse(scheduler.deliver(message("1", "a")))
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.sleeps, [])
+
+    def testInlineNotRetried(self):
+        scheduler = self.scheduler(retries=3)
+        delivered = []
+        self.responses = [response(429, headers={"Retry-After": "5"})]
+        scheduler.submit(message("1", "a"), delivered.append)
+        self.assertEqual(delivered, [False])
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.sleeps, [])
+
+    def testSendingBeforeLastAttempt(self):
+        scheduler = self.scheduler(retries=2)
+        sending = []
+        self.responses = [response(500), response(500)]
+        scheduler.deliver(message("1", "a"),
+                          sending=lambda: sending.append(len(self.sent)))
+        self.assertEqual(sending, [2])
+        self.assertEqual(len(self.sent), 3)
+        # delivered without using up the retries
+        sending = []
+        scheduler.deliver(message("1", "b"),
+                          sending=lambda: sending.append(len(self.sent)))
+        self.assertEqual(sending, [])
+
+    def testRecipientGiven(self):
+        scheduler = self.scheduler(workers=1)
+        # the encoded message is not read for its recipient
+        scheduler.submit("not json", sender_id="1")
+        scheduler.join()
+        self.assertEqual(self.sent, ["not json"])
+
+    def testRetryAfter(self):
+        scheduler = self.scheduler(retries=1, backoff=0.1, max_backoff=30)
+        self.responses = [response(429, headers={"Retry-After": "5"})]
+        scheduler.deliver(message("1", "a"))
+        self.assertEqual(self.sleeps, [5])
+
+    def testRecipientRate(self):
+        scheduler = self.scheduler(recipient_rate=1, recipient_burst=1)
+        scheduler.deliver(message("1", "a"))
+        scheduler.deliver(message("2", "a"))
+        self.assertEqual(self.sleeps, [])
+        scheduler.deliver(message("1", "b"))
+        self.assertEqual(len(self.sleeps), 1)
+        self.assertGreater(self.sleeps[0], 0.9)
+
+    def testRecipientOrder(self):
+        lock = threading.Lock()
+        scheduler = self.scheduler(workers=2, retries=2, backoff=0)
+        self.responses = [response(500)]
+
+        def send(data):
+            with lock:
+                return self.send(data)
+        scheduler.send = send
+        for i in range(0, 5):
+            for sender_id in ("1", "2", "3"):
+                scheduler.submit(
+                    '{"recipient": {"id": "%s"}, "message": {"text": "%d"}}'
+                    % (sender_id, i))
+        scheduler.join()
+        self.assertEqual(len(self.sent), 16)
+        for sender_id in ("1", "2", "3"):
+            texts = [data for data in self.sent
+                     if recipient(data) == sender_id]
+            delivered = []
+            for data in texts:
+                if data not in delivered:
+                    delivered.append(data)
+            self.assertEqual([data[-4] for data in delivered],
+                             ["0", "1", "2", "3", "4"])
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,135 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests the pooled platform client
+'''
+import unittest
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from api.platform_client import PlatformClient, parse_timeouts
+from api.breaker import CircuitBreaker, CircuitOpenException
+from api.bulkhead import Bulkhead
+from api.singleflight import SingleFlight
+from api.errors import PlatformException
+from api import metrics
+from api.fakes import serve
+
+
+class TestPlatformClient(unittest.TestCase):
+    def setUp(self):
+        self.received = []
+        self.connections = set()
+        self.status = 200
+        test = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def respond(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                test.received.append((self.command, self.path))
+                test.connections.add(self.client_address)
+                if "slow" in self.path:
+                    time.sleep(0.5)
+                body = b"[]"
+                self.send_response(test.status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            do_GET = respond
+            do_POST = respond
+
+            def log_message(self, *args):
+                pass
+        self.server = serve(Handler)
+        self.url = "http://127.0.0.1:{}/".format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def testKeepAlive(self):
+        client = PlatformClient(self.url)
+        latency = metrics.histogram("platform.api/view/fun.seconds")
+        observed = latency.value()["count"]
+        for __ in range(0, 3):
+            r = client.post("api/view/fun", data={"year": 2017})
+            self.assertEqual(r.status_code, 200)
+        r = client.get("api/teamroster/1", endpoint="api/teamroster")
+        self.assertEqual(r.json(), [])
+        client.close()
+        self.assertEqual(self.received[0], ("POST", "/api/view/fun"))
+        self.assertEqual(self.received[-1], ("GET", "/api/teamroster/1"))
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(latency.value()["count"], observed + 3)
+        histogram = metrics.histogram("platform.api/teamroster.seconds")
+        self.assertGreaterEqual(histogram.value()["count"], 1)
+
+    def testEndpointTimeout(self):
+        client = PlatformClient(self.url,
+                                read_timeout=0.1,
+                                timeouts={"api/slow": 2})
+        self.assertEqual(client.timeout("api/other"), (3.05, 0.1))
+        self.assertEqual(client.post("api/slow").status_code, 200)
+        self.assertRaises(PlatformException,
+                          client.post,
+                          "api/slow/1",
+                          endpoint="api/slow/1")
+
+    def testEndpointLatency(self):
+        breaker = CircuitBreaker("test", latency=5)
+        client = PlatformClient(self.url,
+                                read_timeout=10,
+                                timeouts={"api/slow": 20},
+                                breaker=breaker)
+        self.assertEqual(client.latency("api/other"), 5)
+        self.assertEqual(client.latency("api/slow"), 10)
+        self.assertEqual(PlatformClient(self.url).latency("api/slow"), 0)
+
+    def testBreakerAndBulkhead(self):
+        self.status = 500
+        breaker = CircuitBreaker("test", failures=1)
+        bulkhead = Bulkhead("test", size=1)
+        client = PlatformClient(self.url, breaker=breaker, bulkhead=bulkhead)
+        self.assertEqual(client.get("api/teams").status_code, 500)
+        self.assertRaises(CircuitOpenException, client.get, "api/teams")
+        self.assertEqual(len(self.received), 1)
+        self.assertEqual(bulkhead.in_use.value(), 0)
+
+    def testShared(self):
+        client = PlatformClient(self.url,
+                                single_flight=SingleFlight("test"))
+
+        def read(shared):
+            client.post("api/slow", data={"stat": "hr"}, shared=shared)
+        for (shared, requests) in [(True, 1), (False, 4)]:
+            self.received = []
+            threads = [threading.Thread(target=read, args=(shared,))
+                       for __ in range(0, 4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(self.received), requests)
+
+    def testUnreachable(self):
+        client = PlatformClient("http://127.0.0.1:1/", connect_timeout=0.5)
+        errors = client.errors.value()
+        self.assertRaises(PlatformException, client.get, "api/teams")
+        self.assertEqual(client.errors.value(), errors + 1)
+
+
+class TestParseTimeouts(unittest.TestCase):
+
+    def testParse(self):
+        self.assertEqual(parse_timeouts(""), {})
+        self.assertEqual(parse_timeouts("api/a=20, /api/b/=1.5"),
+                         {"api/a": 20, "api/b": 1.5})
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
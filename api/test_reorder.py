@@ -0,0 +1,88 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests putting each sender's events back in timestamp order
+'''
+import unittest
+import time
+from api.reorder import ReorderBuffer
+
+
+class Clock():
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def event(sender, timestamp):
+    return {"sender": {"id": sender}, "timestamp": timestamp}
+
+
+class TestReorderBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.released = []
+        self.buffer = ReorderBuffer(1, 5,
+                                    lambda s, e: self.released.append((s, e)),
+                                    clock=self.clock,
+                                    background=False)
+
+    def testHoldsAndSorts(self):
+        reordered = self.buffer.reordered.value()
+        self.buffer.add("1", [event("1", 20)])
+        self.buffer.add("1", [event("1", 10), event("1", 30)])
+        self.assertEqual(self.buffer.flush(), 0)
+        self.clock.now = 1
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.released,
+                         [("1", [event("1", 10),
+                                 event("1", 20),
+                                 event("1", 30)])])
+        self.assertEqual(self.buffer.reordered.value(), reordered + 1)
+
+    def testWindowPerSender(self):
+        self.buffer.add("1", [event("1", 1)])
+        self.clock.now = 0.5
+        self.buffer.add("2", [event("2", 2)])
+        self.clock.now = 1
+        self.buffer.flush()
+        self.assertEqual([sender for (sender, __) in self.released], ["1"])
+        self.clock.now = 1.5
+        self.buffer.flush()
+        self.assertEqual([sender for (sender, __) in self.released],
+                         ["1", "2"])
+
+    def testBounded(self):
+        forced = self.buffer.forced.value()
+        self.buffer.add("1", [event("1", i) for i in range(0, 3)])
+        self.buffer.add("2", [event("2", i) for i in range(0, 3)])
+        # too many held so the oldest sender goes early
+        self.assertEqual([sender for (sender, __) in self.released], ["1"])
+        self.assertEqual(self.buffer.forced.value(), forced + 1)
+
+    def testLate(self):
+        late = self.buffer.late.value()
+        self.buffer.add("1", [event("1", 20)])
+        self.buffer.flush(everything=True)
+        self.buffer.add("1", [event("1", 10)])
+        self.buffer.flush(everything=True)
+        self.assertEqual(self.buffer.late.value(), late + 1)
+
+    def testBackground(self):
+        released = []
+        buffer = ReorderBuffer(0.01, 10, lambda s, e: released.append(s))
+        buffer.add("1", [event("1", 2), event("1", 1)])
+        for __ in range(0, 100):
+            if len(released) > 0:
+                break
+            time.sleep(0.01)
+        self.assertEqual(released, ["1"])
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,148 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests the pooled Send API client
+'''
+import unittest
+import json
+import socket
+from unittest import mock
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+from api.send import SendClient, BATCH_LIMIT
+from api.fakes import serve
+
+
+class TestSendClient(unittest.TestCase):
+    def setUp(self):
+        self.received = []
+        self.connections = set()
+        test = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                test.received.append((self.path, self.rfile.read(length)))
+                test.connections.add(self.client_address)
+                response = test.respond(test.received[-1][1])
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, *args):
+                pass
+        self.server = serve(Handler)
+        self.url = "http://127.0.0.1:{}/me/messages".format(
+                        self.server.server_port)
+
+    def respond(self, body):
+        # answers batch requests the way graph does
+        form = parse_qs(body.decode("utf-8"))
+        if "batch" not in form:
+            return b"{}"
+        responses = []
+        failed = set()
+        for request in json.loads(form["batch"][0]):
+            message = parse_qs(request["body"])
+            if request.get("depends_on") in failed:
+                failed.add(request["name"])
+                responses.append(None)
+            elif "fail" in message.get("message", [""])[0]:
+                failed.add(request["name"])
+                responses.append({"code": 400, "body": "{}"})
+            else:
+                responses.append({"code": 200, "body": "{}"})
+        return json.dumps(responses).encode("utf-8")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def testKeepAlive(self):
+        client = SendClient(self.url, "token")
+        for n in range(0, 5):
+            r = client.post({"recipient": {"id": "1"},
+                             "sender_action": "typing_on"})
+            self.assertEqual(r.status_code, 200)
+        client.post('{"recipient": {"id": "1"}}')
+        client.close()
+        self.assertEqual(len(self.received), 6)
+        self.assertEqual(len(self.connections), 1)
+        (path, body) = self.received[0]
+        self.assertEqual(path, "/me/messages?access_token=token")
+        self.assertEqual(json.loads(body.decode("utf-8"))["sender_action"],
+                         "typing_on")
+        self.assertEqual(self.received[-1][1], b'{"recipient": {"id": "1"}}')
+
+    def testBatch(self):
+        client = SendClient(self.url, "token", batch_url=self.url)
+        messages = [{"recipient": {"id": "1"}, "message": {"text": "a"}},
+                    {"recipient": {"id": "2"}, "message": {"text": "fail"}},
+                    '{"recipient": {"id": "1"}, "message": {"text": "b"}}',
+                    {"recipient": {"id": "2"}, "message": {"text": "c"}},
+                    {"recipient": {"id": "1"}, "sender_action": "typing_off"}]
+        errors = client.batch_errors.value()
+        sent = client.sent.value()
+        results = client.post_batch(messages)
+        self.assertEqual(len(self.received), 1)
+        self.assertEqual([result[0] if result is not None else None
+                          for result in results],
+                         [200, 400, 200, None, 200])
+        self.assertEqual(client.batch_errors.value(), errors + 2)
+        batch = json.loads(parse_qs(self.received[0][1].decode("utf-8"))
+                           ["batch"][0])
+        self.assertEqual([request.get("depends_on") for request in batch],
+                         [None, None, "m0", "m1", "m2"])
+        self.assertEqual(parse_qs(batch[2]["body"])["message"][0],
+                         '{"text": "b"}')
+        # only objects are encoded as json
+        self.assertEqual(parse_qs(batch[4]["body"])["sender_action"][0],
+                         "typing_off")
+        self.assertEqual(client.sent.value(), sent + 1)
+
+    def testBatchLimit(self):
+        client = SendClient(self.url, "token", batch_url=self.url)
+        messages = [{"recipient": {"id": str(i)}, "message": {"text": "a"}}
+                    for i in range(0, BATCH_LIMIT + 1)]
+        results = client.post_batch(messages)
+        self.assertEqual(len(self.received), 2)
+        self.assertEqual(len(results), BATCH_LIMIT + 1)
+
+    def testBatchUnreachable(self):
+        closed = socket.socket()
+        closed.bind(("127.0.0.1", 0))
+        url = "http://127.0.0.1:{}/".format(closed.getsockname()[1])
+        closed.close()
+        client = SendClient(url, "token", connect_timeout=0.5, batch_url=url)
+        sent = client.sent.value()
+        errors = client.errors.value()
+        self.assertEqual(client.post_batch([{"recipient": {"id": "1"}}]),
+                         [None])
+        self.assertEqual(client.sent.value(), sent)
+        self.assertEqual(client.errors.value(), errors + 1)
+
+    def testNewSessionAfterFork(self):
+        client = SendClient(self.url, "token")
+        session = client.session
+        self.assertIs(client.session, session)
+        with mock.patch("api.send.os.getpid", return_value=-1):
+            self.assertIsNot(client.session, session)
+
+    def testUnreachable(self):
+        closed = socket.socket()
+        closed.bind(("127.0.0.1", 0))
+        url = "http://127.0.0.1:{}/".format(closed.getsockname()[1])
+        closed.close()
+        client = SendClient(url, "token", connect_timeout=0.5)
+        errors = client.errors.value()
+        self.assertEqual(client.post({"recipient": {"id": "1"}}), None)
+        self.assertEqual(client.errors.value(), errors + 1)
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,158 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests shedding load when too many events are waiting
+'''
+import unittest
+import json
+import api
+from api.shedding import LoadShedder, SenderStates, classify,\
+    classify_events, classify_sender, busy_message, INFORMATIONAL,\
+    SCORE_FLOW, PROCESS, QUIET, BUSY
+from api.worker import WorkerPool
+from api.variables import UPCOMING, FUN_TITLE, GAMES, BUSY_COMMENT, BASE,\
+    HR_NUM, IGNORE, IGNORED_STATE_TTL
+
+
+def postback(payload):
+    return {"sender": {"id": "1"}, "postback": {"payload": payload}}
+
+
+def text(message, payload=None):
+    event = {"sender": {"id": "1"}, "message": {"text": message}}
+    if payload is not None:
+        event["message"]["quick_reply"] = {"payload": payload}
+    return event
+
+
+class TestClassify(unittest.TestCase):
+
+    def testInformational(self):
+        self.assertEqual(classify(postback(UPCOMING)), INFORMATIONAL)
+        self.assertEqual(classify(text(FUN_TITLE)), INFORMATIONAL)
+        self.assertEqual(classify(text(FUN_TITLE, payload=UPCOMING)),
+                         INFORMATIONAL)
+
+    def testScoreFlow(self):
+        self.assertEqual(classify(postback(GAMES)), SCORE_FLOW)
+        self.assertEqual(classify(postback("12")), SCORE_FLOW)
+        self.assertEqual(classify(text("3")), SCORE_FLOW)
+        self.assertEqual(classify({"sender": {"id": "1"}}), SCORE_FLOW)
+
+    def testClassifyEvents(self):
+        self.assertEqual(classify_events([postback(UPCOMING),
+                                          text(FUN_TITLE)]),
+                         INFORMATIONAL)
+        self.assertEqual(classify_events([postback(UPCOMING), text("3")]),
+                         SCORE_FLOW)
+
+    def testBusyMessage(self):
+        self.assertEqual(json.loads(busy_message("12")),
+                         {"recipient": {"id": "12"},
+                          "message": {"text": BUSY_COMMENT}})
+
+
+class TestSenderStates(unittest.TestCase):
+
+    def testRemember(self):
+        states = SenderStates(2)
+        states.remember("1", BASE)
+        states.remember("2", HR_NUM)
+        states.remember("1", HR_NUM)
+        states.remember("3", BASE)
+        # least recently used is forgotten
+        self.assertEqual(states.get("2"), None)
+        self.assertEqual(states.get("1"), HR_NUM)
+        self.assertEqual(states.get("3"), BASE)
+
+    def testMaxAge(self):
+        now = [0]
+        states = SenderStates(10, clock=lambda: now[0])
+        states.remember("1", IGNORE)
+        now[0] = 10
+        self.assertEqual(states.get("1", max_age=10), IGNORE)
+        self.assertEqual(states.get("1", max_age=5), None)
+        self.assertEqual(states.get("1"), IGNORE)
+
+    def testIgnoredStateExpires(self):
+        now = [0]
+        states = SenderStates(10, clock=lambda: now[0])
+        states.remember("1", IGNORE)
+        old = api.sender_states
+        api.sender_states = states
+        try:
+            self.assertEqual(api.ignored_sender("1"), True)
+            # their stored state may have changed so the app looks again
+            now[0] = IGNORED_STATE_TTL + 1
+            self.assertEqual(api.ignored_sender("1"), False)
+        finally:
+            api.sender_states = old
+
+    def testClassifySender(self):
+        states = SenderStates(10)
+        states.remember("1", HR_NUM)
+        states.remember("2", BASE)
+        events = [postback(UPCOMING)]
+        self.assertEqual(classify_sender("1", events, states), SCORE_FLOW)
+        self.assertEqual(classify_sender("2", events, states), INFORMATIONAL)
+        self.assertEqual(classify_sender("3", events, states), INFORMATIONAL)
+        self.assertEqual(classify_sender("3", [text("3")], states),
+                         SCORE_FLOW)
+
+
+class TestLoadShedder(unittest.TestCase):
+
+    def testNeverSheds(self):
+        shedder = LoadShedder(0, 0)
+        self.assertEqual(shedder.decide([postback(UPCOMING)], 10000), PROCESS)
+
+    def testSheds(self):
+        shedder = LoadShedder(10, 5)
+        before = (shedder.shed_informational.value(),
+                  shedder.over_capacity.value(),
+                  shedder.shed_typing.value())
+        informational = [postback(UPCOMING)]
+        score = [text("3")]
+        self.assertEqual(shedder.decide(informational, 4), PROCESS)
+        self.assertEqual(shedder.decide(informational, 5), QUIET)
+        self.assertEqual(shedder.decide(score, 5), QUIET)
+        self.assertEqual(shedder.decide(informational, 10), BUSY)
+        self.assertEqual(shedder.decide(score, 10), QUIET)
+        self.assertEqual(shedder.shed_informational.value(), before[0] + 1)
+        self.assertEqual(shedder.over_capacity.value(), before[1] + 1)
+        self.assertEqual(shedder.shed_typing.value(), before[2] + 3)
+
+
+class TestWebhookShedding(unittest.TestCase):
+
+    def setUp(self):
+        self.handled = []
+        self.busy = []
+        self.saved = (api.workers, api.shedder, api.busy_replies)
+        api.workers = WorkerPool("test.shed.events", 1, self.handled.append)
+        api.busy_replies = WorkerPool("test.shed.busy", 1, self.busy.append)
+        # already over capacity
+        api.workers.depth = lambda: 5
+        api.shedder = LoadShedder(2, 1)
+        self.client = api.app.test_client()
+
+    def tearDown(self):
+        (api.workers, api.shedder, api.busy_replies) = self.saved
+
+    def testWebhook(self):
+        info = {"sender": {"id": "1"}, "postback": {"payload": UPCOMING}}
+        score = {"sender": {"id": "2"}, "message": {"text": "3"}}
+        data = {"object": "page", "entry": [{"messaging": [info, score]}]}
+        self.client.post("/",
+                         data=json.dumps(data),
+                         content_type="application/json")
+        api.workers.join()
+        api.busy_replies.join()
+        self.assertEqual(self.busy, ["1"])
+        self.assertEqual(self.handled, [([score], True, SCORE_FLOW)])
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
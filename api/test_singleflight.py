@@ -0,0 +1,78 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests sharing the calls made at the same time
+'''
+import unittest
+import threading
+import time
+from api.singleflight import SingleFlight
+from api.errors import PlatformException
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight("test")
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = []
+
+    def call(self):
+        self.calls.append(1)
+        self.started.set()
+        self.release.wait(5)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+    def run_together(self, count):
+        """Returns what each of count threads got for the same key"""
+        results = [None] * count
+
+        def run(i):
+            try:
+                results[i] = self.flight.do("key", self.call)
+            except Exception as e:
+                results[i] = e
+        threads = [threading.Thread(target=run, args=(i,))
+                   for i in range(0, count)]
+        threads[0].start()
+        self.started.wait(5)
+        collapsed = self.flight.collapsed.value()
+        for thread in threads[1:]:
+            thread.start()
+        while self.flight.collapsed.value() < collapsed + count - 1:
+            time.sleep(0.01)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def testCollapse(self):
+        self.result = [1]
+        collapsed = self.flight.collapsed.value()
+        results = self.run_together(5)
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(results, [[1]] * 5)
+        self.assertEqual(self.flight.collapsed.value(), collapsed + 4)
+        # nothing is kept once finished
+        self.assertEqual(self.flight.do("key", lambda: 2), 2)
+
+    def testErrorToEveryone(self):
+        self.result = PlatformException("down")
+        results = self.run_together(3)
+        self.assertEqual(self.calls, [1])
+        for result in results:
+            self.assertIs(result, self.result)
+        self.assertEqual(self.flight.do("key", lambda: 2), 2)
+
+    def testDifferentKeys(self):
+        self.assertEqual(self.flight.do("a", lambda: 1), 1)
+        self.assertEqual(self.flight.do("b", lambda: 2), 2)
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,175 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests the outbound spool
+'''
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import time
+from api.spool import Spool, read_records
+from api.outbound import OutboundScheduler
+from api.fakes import response
+
+
+def message(sender_id, text):
+    return {"recipient": {"id": sender_id}, "message": {"text": text}}
+
+
+def write_segment(path, messages):
+    offsets = []
+    with open(path, "wb") as segment:
+        for data in messages:
+            offsets.append(segment.tell())
+            body = json.dumps(data).encode("utf-8")
+            segment.write("{:d}\n".format(len(body)).encode("ascii"))
+            segment.write(body + b"\n")
+    return offsets
+
+
+class TestSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.delivered = []
+        self.spools = []
+
+    def tearDown(self):
+        for spool in self.spools:
+            spool.close()
+        shutil.rmtree(self.directory)
+
+    def spool(self, submit=None, **kwargs):
+        spool = Spool(self.directory, submit or self.submit, **kwargs)
+        self.spools.append(spool)
+        return spool
+
+    def submit(self, data, done, sending=None):
+        sending()
+        self.delivered.append(json.loads(data)["message"]["text"])
+        done(True)
+
+    def wait_for(self, count):
+        waited = 0
+        while len(self.delivered) < count and waited < 5:
+            time.sleep(0.01)
+            waited += 0.01
+
+    def files(self):
+        return sorted(os.listdir(self.directory))
+
+    def testDeliversInOrder(self):
+        spool = self.spool(segment_bytes=100)
+        for i in range(0, 6):
+            spool.append(message("1", str(i)))
+        self.wait_for(6)
+        self.assertEqual(self.delivered, [str(i) for i in range(0, 6)])
+        # only the segment still being written is left
+        time.sleep(0.05)
+        self.assertEqual(len([name for name in self.files()
+                              if name.endswith(".log")]), 1)
+
+    def testReplaysOrphans(self):
+        path = os.path.join(self.directory, "spool-20261018T000000-1.log")
+        offsets = write_segment(path, [message("1", "a"),
+                                       message("1", "b"),
+                                       message("2", "c")])
+        with open(path + ".acks", "w") as acks:
+            acks.write("{}\n".format(offsets[0]))
+        spool = self.spool()
+        replayed = spool.replayed.value()
+        self.assertEqual(spool.replay(), 2)
+        self.assertEqual(self.delivered, ["b", "c"])
+        self.assertEqual(spool.replayed.value(), replayed + 2)
+        self.assertEqual(self.files(), [])
+
+    def testMaybeSentNotReplayed(self):
+        path = os.path.join(self.directory, "spool-20261018T000000-1.log")
+        offsets = write_segment(path, [message("1", "a"),
+                                       message("1", "b"),
+                                       message("2", "c")])
+        with open(path + ".acks", "w") as acks:
+            # the process died while sending b
+            acks.write("{}\n~{}\n~{}\n".format(offsets[0],
+                                                offsets[0],
+                                                offsets[1]))
+        spool = self.spool()
+        skipped = spool.skipped.value()
+        self.assertEqual(spool.replay(), 1)
+        self.assertEqual(self.delivered, ["c"])
+        self.assertEqual(spool.skipped.value(), skipped + 1)
+
+    def testMarkedBeforeSent(self):
+        marked = []
+
+        def submit(data, done, sending=None):
+            sending()
+            with open(self.spools[0]._current.acks) as acks:
+                marked.append(acks.read())
+            done(True)
+        spool = self.spool(submit)
+        spool.append(message("1", "a"))
+        waited = 0
+        while len(marked) == 0 and waited < 5:
+            time.sleep(0.01)
+            waited += 0.01
+        self.assertEqual(marked, ["~0\n"])
+
+    def testCrashBetweenRetries(self):
+        crashed = []
+
+        class Crash(Exception):
+            pass
+
+        def backoff(delay):
+            # the process dies waiting to retry the failed send
+            raise Crash()
+        scheduler = OutboundScheduler(lambda data: response(500),
+                                      retries=2,
+                                      sleep=backoff)
+
+        def submit(data, done, sending=None):
+            try:
+                scheduler.deliver(data, sending=sending)
+            except Crash:
+                crashed.append(data)
+        spool = self.spool(submit)
+        spool.append(message("1", "a"))
+        waited = 0
+        while len(crashed) == 0 and waited < 5:
+            time.sleep(0.01)
+            waited += 0.01
+        spool.close()
+        # it was not acknowledged nor on its last attempt so it is sent again
+        other = self.spool()
+        self.assertEqual(other.replay(), 1)
+        self.assertEqual(self.delivered, ["a"])
+
+    def testLiveSegmentsAreNotReplayed(self):
+        spool = self.spool(lambda data, done, sending=None: None)
+        spool.append(message("1", "a"))
+        other = self.spool()
+        self.assertEqual(other.replay(), 0)
+        self.assertEqual(self.delivered, [])
+        # left for the next start once closed
+        spool.close()
+        self.assertEqual(other.replay(), 1)
+        self.assertEqual(self.delivered, ["a"])
+
+    def testTruncatedRecord(self):
+        path = os.path.join(self.directory, "segment")
+        write_segment(path, [message("1", "a"), message("1", "b")])
+        with open(path, "ab") as segment:
+            segment.write(b"100\n{\"recipient\"")
+        with open(path, "rb") as segment:
+            records = list(read_records(segment))
+        self.assertEqual([json.loads(body.decode())["message"]["text"]
+                          for (__, body) in records], ["a", "b"])
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,45 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests the pre-encoded menus
+'''
+import unittest
+import json
+from api import build_messages, BASE_BUTTONS, CAPTAIN_BUTTONS,\
+    BASE_QUICK_REPLIES, SUMMARY_REPLIES
+from api.templates import Menu
+
+
+class TestMenu(unittest.TestCase):
+
+    def testSameAsEncodingEveryTime(self):
+        text = 'Say "hi"\né \\ @@sender_id@@'
+        for menu in (BASE_BUTTONS, CAPTAIN_BUTTONS,
+                     BASE_QUICK_REPLIES, SUMMARY_REPLIES):
+            encoded = build_messages(text, "123", **{menu.kind: menu})
+            expect = [json.dumps(data)
+                      for data in build_messages(text,
+                                                 "123",
+                                                 **{menu.kind: list(menu)})]
+            self.assertEqual(encoded, expect)
+            self.assertEqual(json.loads(encoded[0])["recipient"]["id"], "123")
+
+    def testSplitMenu(self):
+        buttons = [{"type": "postback",
+                    "title": str(i),
+                    "payload": str(i)} for i in range(0, 31)]
+        menu = Menu(buttons, "buttons")
+        self.assertEqual(menu, buttons)
+        encoded = build_messages("pick", "1", buttons=menu)
+        self.assertEqual(encoded, [json.dumps(data)
+                                   for data in build_messages("pick",
+                                                              "1",
+                                                              buttons=buttons)
+                                   ])
+        self.assertEqual(len(encoded), 2)
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
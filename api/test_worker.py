@@ -0,0 +1,186 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Tests the background worker pool and the metrics
+'''
+import unittest
+import threading
+import time
+import json
+import api
+from api.worker import WorkerPool, HIGH, LOW
+from api.shedding import SCORE_FLOW
+from api.variables import VERIFY_TOKEN
+from api import metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def testCounter(self):
+        c = metrics.counter("test.counter")
+        c.inc()
+        c.inc(2)
+        self.assertEqual(c.value(), 3)
+        self.assertIs(c, metrics.counter("test.counter"))
+
+    def testGauge(self):
+        g = metrics.gauge("test.gauge")
+        g.inc(5)
+        g.dec(2)
+        self.assertEqual(g.value(), 3)
+        g = metrics.gauge("test.gauge.function", function=lambda: 7)
+        self.assertEqual(g.value(), 7)
+
+    def testHistogram(self):
+        h = metrics.Histogram(buckets=(1, 2))
+        h.observe(0.5)
+        h.observe(1.5)
+        h.observe(3)
+        value = h.value()
+        self.assertEqual(value['count'], 3)
+        self.assertEqual(value['max'], 3)
+        self.assertEqual(value['buckets'], {"1": 1, "2": 2, "+Inf": 3})
+
+    def testSnapshot(self):
+        metrics.counter("test.snapshot").inc()
+        self.assertEqual(metrics.snapshot()["test.snapshot"], 1)
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def testSubmit(self):
+        handled = []
+        lock = threading.Lock()
+
+        def handler(item):
+            with lock:
+                handled.append(item)
+        pool = WorkerPool("test.pool", 3, handler)
+        for i in range(0, 20):
+            pool.submit(i)
+        pool.join()
+        self.assertEqual(sorted(handled), list(range(0, 20)))
+        self.assertEqual(pool.depth(), 0)
+        self.assertEqual(pool.processed.value(), 20)
+        self.assertEqual(pool.wait.value()['count'], 20)
+
+    def testLanesKeepOrder(self):
+        handled = {}
+        lock = threading.Lock()
+
+        def handler(item):
+            with lock:
+                handled.setdefault(item[0], []).append(item[1])
+        pool = WorkerPool("test.pool.lanes", 4, handler, key=lambda i: i[0])
+        for i in range(0, 50):
+            for sender in ("a", "b", "c", "d", "e"):
+                pool.submit((sender, i))
+        pool.join()
+        for sender in ("a", "b", "c", "d", "e"):
+            self.assertEqual(handled[sender], list(range(0, 50)))
+        self.assertEqual(pool.lane(("a", 1)), pool.lane(("a", 2)))
+
+    def blocked_pool(self, name, max_wait=0):
+        """Returns a pool whose one lane is blocked until release is set"""
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.order = []
+
+        def handler(item):
+            if item[0] == "block":
+                self.started.set()
+                self.release.wait()
+            self.order.append(item)
+        pool = WorkerPool(name, 1, handler,
+                          key=lambda item: item[0],
+                          priority=lambda item: item[1],
+                          max_wait=max_wait)
+        pool.submit(("block", HIGH))
+        self.started.wait()
+        return pool
+
+    def testPriority(self):
+        pool = self.blocked_pool("test.pool.priority")
+        pool.submit(("a", LOW))
+        pool.submit(("b", HIGH))
+        pool.submit(("c", LOW))
+        pool.submit(("d", HIGH))
+        self.release.set()
+        pool.join()
+        self.assertEqual([item[0] for item in self.order],
+                         ["block", "b", "d", "a", "c"])
+        self.assertEqual(pool.priority_wait[LOW].value()['count'], 2)
+
+    def testPriorityKeepsKeyOrder(self):
+        pool = self.blocked_pool("test.pool.priority.order")
+        pool.submit(("a", LOW))
+        # waits behind the key's earlier low priority item
+        pool.submit(("a", HIGH))
+        pool.submit(("b", HIGH))
+        self.release.set()
+        pool.join()
+        self.assertEqual(self.order[1:],
+                         [("b", HIGH), ("a", LOW), ("a", HIGH)])
+
+    def testPriorityMaxWait(self):
+        pool = self.blocked_pool("test.pool.priority.wait", max_wait=0.01)
+        pool.submit(("a", LOW))
+        pool.submit(("b", HIGH))
+        time.sleep(0.02)
+        self.release.set()
+        pool.join()
+        self.assertEqual([item[0] for item in self.order],
+                         ["block", "a", "b"])
+
+    def testHandlerFails(self):
+        def handler(item):
+            raise Exception("Fails")
+        pool = WorkerPool("test.pool.fail", 1, handler)
+        pool.submit(1)
+        pool.join()
+        self.assertEqual(pool.failed.value(), 1)
+
+
+class TestWebhook(unittest.TestCase):
+
+    def setUp(self):
+        self.handled = []
+        self.workers = api.workers
+        api.workers = WorkerPool("test.webhook", 1, self.handled.append)
+        self.client = api.app.test_client()
+
+    def tearDown(self):
+        api.workers = self.workers
+
+    def testEnqueues(self):
+        event = {"sender": {"id": "1"},
+                 "recipient": {"id": "2"},
+                 "message": {"text": "help"}}
+        other = {"sender": {"id": "3"},
+                 "recipient": {"id": "2"},
+                 "message": {"text": "help"}}
+        data = {"object": "page",
+                "entry": [{"messaging": [event,
+                                         {"recipient": {"id": "2"}},
+                                         other]},
+                          {"messaging": [event]}]}
+        r = self.client.post("/",
+                             data=json.dumps(data),
+                             content_type="application/json")
+        self.assertEqual(r.status_code, 200)
+        api.workers.join()
+        self.assertEqual(self.handled, [([event, event], False, SCORE_FLOW),
+                                        ([other], False, SCORE_FLOW)])
+
+    def testStats(self):
+        r = self.client.get("/stats?verify_token=wrong")
+        self.assertEqual(r.status_code, 403)
+        r = self.client.get("/stats?verify_token=" + VERIFY_TOKEN)
+        self.assertEqual(r.status_code, 200)
+        self.assertIn("test.webhook.depth", json.loads(r.data.decode()))
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
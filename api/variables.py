@@ -17,11 +17,139 @@ if os.environ.get("LOCAL", "TRUE") == "FALSE":
 else:
     from api.credentials import BASEURL, URL, ADMIN, PASSWORD,\
                                 PAGE_ACCESS_TOKEN, VERIFY_TOKEN
+GRAPH_URL = os.environ.get("GRAPH_URL", "https://graph.facebook.com/v2.6/")
 HEADERS = {
     'Authorization': 'Basic %s' % b64encode(bytes(ADMIN + ':' +
                                                   PASSWORD, "utf-8")
                                             ).decode("ascii")
 }
+# number of background lanes for messaging events (0 processes inline)
+# events are sharded onto the lanes by sender so they stay in order
+WORKERS = int(os.environ.get("WORKERS", "0"))
+# how many redelivered message ids to remember and for how many seconds
+DEDUP_SIZE = int(os.environ.get("DEDUP_SIZE", "10000"))
+DEDUP_TTL = float(os.environ.get("DEDUP_TTL", "600"))
+# where to journal the raw webhook posts (empty does not journal)
+JOURNAL_DIR = os.environ.get("JOURNAL_DIR", "")
+JOURNAL_SEGMENT_BYTES = int(os.environ.get("JOURNAL_SEGMENT_BYTES",
+                                           str(64 * 1024 * 1024)))
+JOURNAL_SEGMENT_SECONDS = float(os.environ.get("JOURNAL_SEGMENT_SECONDS",
+                                               "3600"))
+# events waiting before informational requests get a busy reply (0 never,
+# which leaves the queue of waiting events unbounded; score flow events are
+# queued past the capacity either way)
+QUEUE_CAPACITY = int(os.environ.get("QUEUE_CAPACITY", "0"))
+# events waiting before typing indicators are skipped (0 never)
+SHED_TYPING_DEPTH = int(os.environ.get("SHED_TYPING_DEPTH", "0"))
+# seconds an informational event waits before it goes ahead of score flow
+PRIORITY_MAX_WAIT = float(os.environ.get("PRIORITY_MAX_WAIT", "5"))
+# how many senders' states are remembered for prioritizing their events
+SENDER_STATES_SIZE = int(os.environ.get("SENDER_STATES_SIZE", "10000"))
+# seconds a remembered "not part of league" state keeps a sender's posts from
+# reaching the app, after which the stored state is loaded again
+IGNORED_STATE_TTL = float(os.environ.get("IGNORED_STATE_TTL", "300"))
+# seconds to hold a sender's events to put them in timestamp order (0 never)
+REORDER_HOLD = float(os.environ.get("REORDER_HOLD", "0"))
+REORDER_SIZE = int(os.environ.get("REORDER_SIZE", "10000"))
+# answer no-op webhook posts before the app parses them
+FAST_PATH = os.environ.get("FAST_PATH", "TRUE") == "TRUE"
+# facebook ids the bot never answers (comma separated)
+IGNORED_SENDERS = [sender for sender in
+                   os.environ.get("IGNORED_SENDERS", "").split(",")
+                   if sender != ""]
+# threads running the state machine when served by the asyncio app
+ASYNC_THREADS = int(os.environ.get("ASYNC_THREADS", "32"))
+# kept alive connections to the send api and its timeouts in seconds
+SEND_POOL_SIZE = int(os.environ.get("SEND_POOL_SIZE", "10"))
+SEND_CONNECT_TIMEOUT = float(os.environ.get("SEND_CONNECT_TIMEOUT", "3.05"))
+SEND_READ_TIMEOUT = float(os.environ.get("SEND_READ_TIMEOUT", "10"))
+# send each batch of replies as graph batch requests (not with SPOOL_DIR,
+# OUTBOUND_WORKERS or the outbound rates, so the replies graph failed to send
+# are only sent once more, on their own, and not retried after that)
+SEND_BATCH = os.environ.get("SEND_BATCH", "FALSE") == "TRUE"
+# threads delivering the replies in the background (0 sends them inline)
+OUTBOUND_WORKERS = int(os.environ.get("OUTBOUND_WORKERS", "0"))
+# sends a second and at once for the page and for each recipient (0 no limit)
+OUTBOUND_PAGE_RATE = float(os.environ.get("OUTBOUND_PAGE_RATE", "0"))
+OUTBOUND_PAGE_BURST = int(os.environ.get("OUTBOUND_PAGE_BURST", "50"))
+OUTBOUND_RECIPIENT_RATE = float(os.environ.get("OUTBOUND_RECIPIENT_RATE",
+                                               "0"))
+OUTBOUND_RECIPIENT_BURST = int(os.environ.get("OUTBOUND_RECIPIENT_BURST",
+                                              "10"))
+# retries of a throttled or failed send and the backoff between them (need
+# OUTBOUND_WORKERS > 0, with the default 0 the sends are inline and are not
+# retried, which includes SEND_BATCH's resends)
+OUTBOUND_RETRIES = int(os.environ.get("OUTBOUND_RETRIES", "3"))
+OUTBOUND_BACKOFF = float(os.environ.get("OUTBOUND_BACKOFF", "0.5"))
+OUTBOUND_MAX_BACKOFF = float(os.environ.get("OUTBOUND_MAX_BACKOFF", "8"))
+# threads sending typing indicators and read receipts (0 sends inline)
+SENDER_ACTION_WORKERS = int(os.environ.get("SENDER_ACTION_WORKERS", "1"))
+# seconds of processing before the typing indicator is shown
+TYPING_THRESHOLD = float(os.environ.get("TYPING_THRESHOLD", "0"))
+# send typing off after a reply even though the reply already clears it
+TYPING_OFF_AFTER_REPLY = os.environ.get("TYPING_OFF_AFTER_REPLY",
+                                        "FALSE") == "TRUE"
+# mark the messages as seen when they are received
+MARK_SEEN = os.environ.get("MARK_SEEN", "FALSE") == "TRUE"
+# where replies are spooled until delivered (empty does not spool, needs
+# OUTBOUND_WORKERS)
+SPOOL_DIR = os.environ.get("SPOOL_DIR", "")
+SPOOL_SEGMENT_BYTES = int(os.environ.get("SPOOL_SEGMENT_BYTES",
+                                         str(16 * 1024 * 1024)))
+# the most spooled replies queued for delivery at once
+SPOOL_IN_FLIGHT = int(os.environ.get("SPOOL_IN_FLIGHT", "1000"))
+# kept alive connections to the platform and the seconds to wait on it
+PLATFORM_POOL_SIZE = int(os.environ.get("PLATFORM_POOL_SIZE", "10"))
+PLATFORM_CONNECT_TIMEOUT = float(os.environ.get("PLATFORM_CONNECT_TIMEOUT",
+                                                "3.05"))
+PLATFORM_TIMEOUT = float(os.environ.get("PLATFORM_TIMEOUT", "10"))
+# the read timeouts of the slower endpoints (comma separated endpoint=seconds)
+PLATFORM_TIMEOUTS = os.environ.get("PLATFORM_TIMEOUTS",
+                                   "api/bot/captain/games=20,"
+                                   "api/bot/submit_score=20")
+# the seconds to cache the season wide platform data on game days and on
+# the other days (comma separated endpoint=seconds, 0 does not cache)
+PLATFORM_CACHE_TTLS = os.environ.get("PLATFORM_CACHE_TTLS",
+                                     "api/view/league_leaders=300,"
+                                     "api/view/fun=60,"
+                                     "website/event=3600")
+PLATFORM_CACHE_QUIET_TTLS = os.environ.get("PLATFORM_CACHE_QUIET_TTLS",
+                                           "api/view/league_leaders=3600,"
+                                           "api/view/fun=3600,"
+                                           "website/event=86400")
+# the days of the week games are played on (0 is monday, comma separated)
+GAME_DAYS = [int(day) for day in os.environ.get("GAME_DAYS", "6").split(",")
+             if day.strip() != ""]
+# load the season wide data on startup and stop refreshing data no one
+# has read for this many seconds
+PLATFORM_CACHE_WARMUP = os.environ.get("PLATFORM_CACHE_WARMUP",
+                                       "FALSE") == "TRUE"
+PLATFORM_CACHE_IDLE = float(os.environ.get("PLATFORM_CACHE_IDLE", "86400"))
+# the most responses cached
+PLATFORM_CACHE_SIZE = int(os.environ.get("PLATFORM_CACHE_SIZE", "256"))
+# the failures in a row before a breaker stops calling the platform or graph
+BREAKER_FAILURES = int(os.environ.get("BREAKER_FAILURES", "5"))
+# the seconds after which a call counts as failed, 0 for no limit, scaled
+# for the platform endpoints given their own timeout in PLATFORM_TIMEOUTS
+BREAKER_LATENCY = float(os.environ.get("BREAKER_LATENCY", "5"))
+# the seconds a breaker stays open before trying again
+BREAKER_RESET = float(os.environ.get("BREAKER_RESET", "30"))
+# the most calls at once to graph, the platform and mongo (0 no limit) and
+# the seconds a call waits for its turn before failing
+GRAPH_BULKHEAD = int(os.environ.get("GRAPH_BULKHEAD", "10"))
+GRAPH_BULKHEAD_TIMEOUT = float(os.environ.get("GRAPH_BULKHEAD_TIMEOUT", "5"))
+PLATFORM_BULKHEAD = int(os.environ.get("PLATFORM_BULKHEAD", "8"))
+PLATFORM_BULKHEAD_TIMEOUT = float(os.environ.get("PLATFORM_BULKHEAD_TIMEOUT",
+                                                 "2"))
+MONGO_BULKHEAD = int(os.environ.get("MONGO_BULKHEAD", "16"))
+MONGO_BULKHEAD_TIMEOUT = float(os.environ.get("MONGO_BULKHEAD_TIMEOUT", "2"))
+# threads making a step's independent reads at once (0 makes them in turn)
+# and the seconds they all have to finish in
+FANOUT_WORKERS = int(os.environ.get("FANOUT_WORKERS", "8"))
+FANOUT_DEADLINE = float(os.environ.get("FANOUT_DEADLINE", "10"))
+# register the persistent menu on startup and stop resending the base
+# options where the menu already has them
+PERSISTENT_MENU = os.environ.get("PERSISTENT_MENU", "FALSE") == "TRUE"
 # main menu title
 UPCOMING_TITLE = "Upcoming Games"
 LEAGUE_LEADERS_TITLE = "League Leaders"
@@ -29,6 +157,7 @@ EVENTS_TITLE = "Events"
 FUN_TITLE = "Fun Meter"
 SUBMIT_SCORE_TITLE = "Submit Score"
 SUBMIT_TITLE = "Submit"
+MORE_TITLE = "More"
 HR_TITLE = "HR Leaders:"
 SS_TITLE = "SS Leaders:"
 # random comments
@@ -49,6 +178,7 @@ CANCELING_COMMENT = "Canceling"
 USE_QUICK_REPLIES_COMMENT = "Need to use the quick replies"
 NEED_GAME_NUMBER_COMMENT = "Couldnt find the game number in repsonse"
 GAME_SUBMITTED_COMMENT = "Game submitted"
+BUSY_COMMENT = "Lots going on right now, try again in a minute"
 # error comments
 INVALID_GAME_COMMENT = "The game was not valid"
 INVALID_BATTER_COMMENT = "Batter was not on teamroster"
@@ -113,3 +243,4 @@ LEADERS = "League leaders"
 EVENTS = "Events"
 FUN = "Fun meter"
 CANCEL = "Cancel"
+GET_STARTED = "Get started"
@@ -0,0 +1,201 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: In-process worker pool for processing messaging events
+'''
+import os
+import threading
+import time
+import traceback
+import zlib
+from collections import deque
+from api.helper import log
+from api import metrics
+
+# the priorities an item can be submitted with
+HIGH = 0
+LOW = 1
+PRIORITY_NAMES = ["high", "low"]
+
+
+class _Lane():
+    """A queue of work with a high and a low priority
+
+    Items with the same key that are waiting are always kept at the same
+    priority so they can not overtake each other.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._queues = [deque(), deque()]
+        self._waiting = {}
+        self._unfinished = 0
+
+    def qsize(self):
+        return len(self._queues[HIGH]) + len(self._queues[LOW])
+
+    def put(self, item, priority, key=None):
+        with self._condition:
+            if key is not None:
+                if key in self._waiting:
+                    # stay behind the key's earlier items
+                    priority = self._waiting[key][0]
+                    self._waiting[key][1] += 1
+                else:
+                    self._waiting[key] = [priority, 1]
+            self._queues[priority].append((time.monotonic(), key, item))
+            self._unfinished += 1
+            self._condition.notify()
+
+    def get(self, max_wait):
+        """Returns the next item, high priority first unless a low priority
+        item has waited longer than max_wait seconds
+        """
+        with self._condition:
+            while self.qsize() == 0:
+                self._condition.wait()
+            high = self._queues[HIGH]
+            low = self._queues[LOW]
+            priority = HIGH
+            if len(high) == 0:
+                priority = LOW
+            elif (len(low) > 0 and max_wait > 0 and
+                  time.monotonic() - low[0][0] > max_wait):
+                priority = LOW
+            (queued, key, item) = self._queues[priority].popleft()
+            if key is not None:
+                self._waiting[key][1] -= 1
+                if self._waiting[key][1] == 0:
+                    del self._waiting[key]
+            return (queued, priority, item)
+
+    def task_done(self):
+        with self._condition:
+            self._unfinished -= 1
+            if self._unfinished == 0:
+                self._condition.notify_all()
+
+    def join(self):
+        with self._condition:
+            while self._unfinished > 0:
+                self._condition.wait()
+
+
+class WorkerPool():
+    """A pool of threads that drain queues of work
+
+    Without a key every thread drains one shared queue. With a key every
+    thread is a lane with its own queue and items are sharded onto the lanes
+    by their key, so items with the same key are handled one at a time and
+    in the order submitted while different keys are handled concurrently.
+
+    With a priority function the high priority items on a lane are handled
+    before the low priority ones, unless a low priority item has waited more
+    than max_wait seconds.
+
+    The threads are started on the first submit so a pool created before
+    gunicorn forks still gets its own threads in every worker process.
+
+    Parameters:
+        name: the name of the pool used for the metrics (string)
+        size: the number of worker threads (int)
+        handler: the function called with each submitted item (function)
+        key: a function returning the shard key of an item (function)
+        priority: a function returning HIGH or LOW for an item (function)
+        max_wait: seconds before a low priority item goes first (float)
+    """
+    def __init__(self, name, size, handler, key=None, priority=None,
+                 max_wait=0):
+        self.name = name
+        self.size = size
+        self.handler = handler
+        self.key = key
+        self.priority = priority
+        self.max_wait = max_wait
+        if key is None:
+            self._lanes = [_Lane()]
+        else:
+            self._lanes = [_Lane() for __ in range(0, size)]
+        self._lock = threading.Lock()
+        self._pid = None
+        self._threads = []
+        self.submitted = metrics.counter(name + ".submitted")
+        self.processed = metrics.counter(name + ".processed")
+        self.failed = metrics.counter(name + ".failed")
+        self.wait = metrics.histogram(name + ".wait_seconds")
+        self.run_time = metrics.histogram(name + ".run_seconds")
+        self.priority_wait = [metrics.histogram(name + ".wait_seconds." + p)
+                              for p in PRIORITY_NAMES]
+        metrics.gauge(name + ".depth", self.depth)
+        metrics.gauge(name + ".max_lane_depth", self.max_lane_depth)
+
+    def depth(self):
+        """Returns the number of items waiting to be processed"""
+        return sum(lane.qsize() for lane in self._lanes)
+
+    def max_lane_depth(self):
+        """Returns the number of items waiting on the busiest lane"""
+        return max(lane.qsize() for lane in self._lanes)
+
+    def lane(self, item):
+        """Returns the index of the lane the item is handled on
+
+        Parameters:
+            item: the submitted item
+        Returns:
+            index: the lane index (int)
+        """
+        if self.key is None:
+            return 0
+        key = str(self.key(item)).encode("utf-8")
+        return zlib.crc32(key) % len(self._lanes)
+
+    def start(self):
+        """Start the worker threads if not started in this process"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            for i in range(0, self.size):
+                lane = self._lanes[i % len(self._lanes)]
+                t = threading.Thread(target=self._work,
+                                     args=(lane,),
+                                     name="{}-{}".format(self.name, i),
+                                     daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, item):
+        """Queue an item to be handled by a worker
+
+        Parameters:
+            item: the item passed to the handler
+        """
+        self.start()
+        self.submitted.inc()
+        priority = HIGH if self.priority is None else self.priority(item)
+        key = None if self.key is None else self.key(item)
+        self._lanes[self.lane(item)].put(item, priority, key=key)
+
+    def join(self):
+        """Block until every submitted item has been handled"""
+        for lane in self._lanes:
+            lane.join()
+
+    def _work(self, lane):
+        while True:
+            (queued, priority, item) = lane.get(self.max_wait)
+            started = time.monotonic()
+            self.wait.observe(started - queued)
+            self.priority_wait[priority].observe(started - queued)
+            try:
+                self.handler(item)
+                self.processed.inc()
+            except Exception as e:
+                self.failed.inc()
+                traceback.print_exc()
+                log(str(e))
+            finally:
+                self.run_time.observe(time.monotonic() - started)
+                lane.task_done()
@@ -0,0 +1,10 @@
+'''
+Name: Dallas Fraser
+Date: 2026-10-18
+Project: Facebook Bot
+Purpose: The asyncio version of the bot for an ASGI server
+
+    uvicorn asgi:app --port 8081
+'''
+from api.aio import AsyncBot
+app = AsyncBot()
@@ -0,0 +1,117 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Throughput of the sync webhook against the asyncio one
+
+Both paths process the same conversation steps against a local stand-in for
+the Graph API (with latency) and an in memory users collection. The sync
+path is what one gunicorn sync worker does; the async path is one process
+running the ASGI app. Neither shows the typing indicator so both make the
+same Graph requests, one for each reply.
+
+Run from the root of the repo:
+    LOCAL=FALSE python -m benchmarks.async_vs_sync
+'''
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import time
+
+
+def sync_run(api, senders, steps):
+    api.mongo = MemoryUsers(users(senders))
+    start = time.monotonic()
+    for step in range(0, steps):
+        data = post(range(0, senders), step)
+        for events in api.group_events(data).values():
+            api.handle_events(events, typing=api.skip_typing)
+    return time.monotonic() - start
+
+
+def async_run(api, senders, steps):
+    from api.aio import AsyncBot
+    bot = AsyncBot(users=AsyncMemoryUsers(users(senders)))
+    # without the typing indicator, same as the sync path
+    bot.dispatch = lambda sender_id, events: bot.schedule(sender_id,
+                                                          events,
+                                                          quiet=True)
+
+    async def run():
+        start = time.monotonic()
+        for step in range(0, steps):
+            body = json.dumps(post(range(0, senders), step)).encode("utf-8")
+            await call(bot, body)
+        await bot.drain()
+        elapsed = time.monotonic() - start
+        await bot.session.close()
+        return elapsed
+    # asyncio.run needs python 3.7
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+
+def free_port():
+    """Returns a port nothing listens on"""
+    with contextlib.closing(socket.socket()) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+async def call(bot, body):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+    scope = {"type": "http", "method": "POST", "path": "/",
+             "query_string": b""}
+    await bot(scope, receive, send)
+    return sent
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--senders", type=int, default=100)
+    parser.add_argument("--steps", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="seconds the Graph API stand-in takes")
+    args = parser.parse_args()
+    # the api reads GRAPH_URL when it is first imported, which importing the
+    # stand-in already does, so the stand-in's port is picked beforehand
+    port = free_port()
+    os.environ["GRAPH_URL"] = "http://127.0.0.1:{}/".format(port)
+    import api
+    from api.fakes import MemoryUsers, AsyncMemoryUsers
+    from benchmarks.standin import StandIn, users, post
+    graph = StandIn(latency=args.latency, port=port).start()
+    events = args.senders * args.steps
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            sync_time = sync_run(api, args.senders, args.steps)
+            sync_requests = graph.requests
+            api.seen_events = api.TTLSet("bench.seen", 100000, 600)
+            async_time = async_run(api, args.senders, args.steps)
+            async_requests = graph.requests - sync_requests
+    graph.stop()
+    if sync_requests != async_requests:
+        print("the paths made different graph requests so their throughput "
+              "can not be compared")
+    print("{:>6} {:>8} {:>10} {:>10}".format("path", "events",
+                                             "seconds", "events/s"))
+    for (name, elapsed) in (("sync", sync_time), ("async", async_time)):
+        print("{:>6} {:>8} {:>10.2f} {:>10.1f}".format(name,
+                                                      events,
+                                                      elapsed,
+                                                      events / elapsed))
+    print("graph requests: sync {} async {}".format(sync_requests,
+                                                    async_requests))
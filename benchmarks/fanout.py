@@ -0,0 +1,60 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Benchmark of the league leaders step with its reads made in turn
+against made at once
+
+Answers the platform from a local stand-in with some latency and turns the
+season cache off so every step makes both of its reads.
+
+Run from the root of the repo:
+    LOCAL=FALSE python -m benchmarks.fanout
+'''
+import argparse
+import json
+import time
+import api
+from api import db
+from api.fanout import FanOut
+from api.platform_client import PlatformClient
+from benchmarks.standin import StandIn
+
+
+class Platform(StandIn):
+    """Answers every request with league leaders"""
+    def respond(self, body):
+        return json.dumps([{"name": "Dallas Fraser",
+                            "team": "Domus",
+                            "hits": 10}] * 5).encode("utf-8")
+
+
+def run(fan_out, steps):
+    """Run the league leaders step
+
+    Parameters:
+        fan_out: makes the step's reads (FanOut)
+        steps: the number of steps (int)
+    Returns:
+        milliseconds: the time per step (float)
+    """
+    api.fan_out = fan_out
+    start = time.perf_counter()
+    for __ in range(0, steps):
+        api.display_league_leaders({}, "1", callback=lambda *args: None)
+    return (time.perf_counter() - start) / steps * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    platform = Platform(args.latency).start()
+    db.platform = PlatformClient(platform.url)
+    db.cache_ttl = lambda endpoint: 0
+    print("{:>10} {:>10}".format("reads", "ms/step"))
+    for (name, fan_out) in [("in turn", FanOut(workers=0)),
+                            ("at once", FanOut(workers=2))]:
+        print("{:>10} {:>10.1f}".format(name, run(fan_out, args.steps)))
+    platform.stop()
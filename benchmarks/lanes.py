@@ -0,0 +1,66 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Benchmark of event throughput against the number of sender lanes
+
+Run from the root of the repo:
+    LOCAL=FALSE python -m benchmarks.lanes
+'''
+import argparse
+import threading
+import time
+from api.worker import WorkerPool
+
+
+def run(lanes, senders, events, latency):
+    """Process the events on the given number of lanes
+
+    Parameters:
+        lanes: the number of lanes (int)
+        senders: the number of different senders (int)
+        events: the number of events per sender (int)
+        latency: the simulated i/o time of handling an event (float)
+    Returns:
+        (throughput, ordered): events per second and whether every
+                               sender's events were handled in order
+    """
+    seen = {}
+    lock = threading.Lock()
+
+    def handler(event):
+        # stands in for the mongo, platform and send api calls
+        time.sleep(latency)
+        with lock:
+            seen.setdefault(event["sender"]["id"], []).append(event["n"])
+    pool = WorkerPool("bench.lanes.{}".format(lanes),
+                      lanes,
+                      handler,
+                      key=lambda event: event["sender"]["id"])
+    pool.start()
+    start = time.monotonic()
+    for n in range(0, events):
+        for sender in range(0, senders):
+            pool.submit({"sender": {"id": str(sender)}, "n": n})
+    pool.join()
+    elapsed = time.monotonic() - start
+    ordered = all(seen[str(sender)] == list(range(0, events))
+                  for sender in range(0, senders))
+    return (senders * events / elapsed, ordered)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--senders", type=int, default=100)
+    parser.add_argument("--events", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--lanes", type=int, nargs="+",
+                        default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+    print("{:>6} {:>12} {:>8}".format("lanes", "events/s", "ordered"))
+    for lanes in args.lanes:
+        (throughput, ordered) = run(lanes,
+                                    args.senders,
+                                    args.events,
+                                    args.latency)
+        print("{:>6} {:>12.1f} {:>8}".format(lanes, throughput, str(ordered)))
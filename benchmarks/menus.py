@@ -0,0 +1,49 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Benchmark of encoding the menus every time against pre-encoded
+
+Run from the root of the repo:
+    LOCAL=FALSE python -m benchmarks.menus
+'''
+import argparse
+import json
+import time
+from api import build_messages, CAPTAIN_BUTTONS, CAPTAIN_QUICK_REPLIES,\
+    SUMMARY_REPLIES, random_intro
+
+
+def run(menu, encoded, count):
+    """Build and encode a menu's messages
+
+    Parameters:
+        menu: the menu (Menu)
+        encoded: use the pre-encoded menu (boolean)
+        count: the number of times to build it (int)
+    Returns:
+        microseconds: the time per menu (float)
+    """
+    items = menu if encoded else list(menu)
+    start = time.perf_counter()
+    for i in range(0, count):
+        for data in build_messages(random_intro(),
+                                   str(1000000 + i),
+                                   **{menu.kind: items}):
+            if not isinstance(data, str):
+                data = json.dumps(data)
+    return (time.perf_counter() - start) / count * 1000000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=20000)
+    args = parser.parse_args()
+    print("{:>16} {:>10} {:>10}".format("menu", "before us", "after us"))
+    for (name, menu) in [("captain buttons", CAPTAIN_BUTTONS),
+                         ("captain replies", CAPTAIN_QUICK_REPLIES),
+                         ("summary replies", SUMMARY_REPLIES)]:
+        print("{:>16} {:>10.2f} {:>10.2f}".format(
+                name,
+                run(menu, False, args.count),
+                run(menu, True, args.count)))
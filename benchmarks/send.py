@@ -0,0 +1,93 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: Benchmark of Send API messages per second with and without keep-alive
+
+Posts to a local TLS stand-in for the Graph API, once with a new connection
+per post (the way the bot used to send), once through the SendClient and
+once through the SendClient as batch requests of a step's replies.
+
+Run from the root of the repo:
+    LOCAL=FALSE python -m benchmarks.send
+'''
+import argparse
+import json
+import tempfile
+import threading
+import time
+import requests
+from api.send import SendClient
+from benchmarks.standin import StandIn, certificate
+
+
+def run(post, threads, messages, step=1):
+    """Send the messages from some threads
+
+    Parameters:
+        post: sends a list of messages (function)
+        threads: the number of sending threads (int)
+        messages: the number of messages per thread (int)
+        step: the number of messages passed to post at once (int)
+    Returns:
+        throughput: messages per second (float)
+    """
+    def sender(thread):
+        for n in range(0, messages, step):
+            post([{"recipient": {"id": str(thread)},
+                   "message": {"text": "message {}".format(n + i)}}
+                  for i in range(0, min(step, messages - n))])
+    workers = [threading.Thread(target=sender, args=(i,))
+               for i in range(0, threads)]
+    start = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * messages / (time.monotonic() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--step", type=int, default=3,
+                        help="messages per step when batching")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        (cert, key) = certificate(directory)
+
+        def cold(messages):
+            for data in messages:
+                requests.post(standin.url,
+                              params={"access_token": "token"},
+                              headers={"Content-Type": "application/json"},
+                              data=json.dumps(data),
+                              verify=cert)
+
+        def pooled(messages):
+            for data in messages:
+                client.post(data)
+        standin = StandIn(args.latency, certificate=(cert, key)).start()
+        client = SendClient(standin.url,
+                            "token",
+                            pool_size=args.threads,
+                            verify=cert,
+                            batch_url=standin.url)
+        print("{:>10} {:>12} {:>12} {:>10}".format("client", "messages/s",
+                                                   "connections",
+                                                   "requests"))
+        for (name, post, step) in [("cold", cold, 1),
+                                   ("pooled", pooled, 1),
+                                   ("batched", client.post_batch, args.step)]:
+            standin.connections.clear()
+            standin.requests = 0
+            throughput = run(post, args.threads, args.messages, step)
+            print("{:>10} {:>12.1f} {:>12} {:>10}".format(
+                name,
+                throughput,
+                len(standin.connections),
+                standin.requests))
+        client.close()
+        standin.stop()
@@ -0,0 +1,132 @@
+'''
+@author: Dallas Fraser
+@date: 2026-10-18
+@organization: Fun
+@summary: A local stand-in for the Graph API and the webhook posts used by
+the benchmarks
+
+Importing this imports the api package, which reads its settings (GRAPH_URL
+among them) from the environment.
+'''
+import json
+import os
+import ssl
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+from api.fakes import Server
+from api.variables import BASE
+
+
+class StandIn():
+    """A local HTTP server that answers every post after some latency
+
+    Parameters:
+        latency: the seconds to wait before answering (float)
+        certificate: serve https with this (certificate, key) (tuple)
+        port: the port to listen on, a free one if 0 (int)
+    """
+    def __init__(self, latency=0.0, certificate=None, port=0):
+        self.latency = latency
+        self.requests = 0
+        self.bodies = []
+        self.connections = set()
+        self._lock = threading.Lock()
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                with standin._lock:
+                    standin.requests += 1
+                    standin.connections.add(self.client_address)
+                    standin.bodies.append(body)
+                time.sleep(standin.latency)
+                response = standin.respond(body)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            do_GET = do_POST
+
+            def log_message(self, *args):
+                pass
+        self.server = Server(("127.0.0.1", port), Handler)
+        scheme = "http"
+        if certificate is not None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(*certificate)
+            self.server.socket = context.wrap_socket(self.server.socket,
+                                                     server_side=True)
+            scheme = "https"
+        self.url = "{}://127.0.0.1:{}/".format(scheme,
+                                               self.server.server_port)
+
+    def respond(self, body):
+        """Returns the body of the response to a request"""
+        form = parse_qs(body.decode("utf-8", "replace"))
+        if "batch" in form:
+            count = len(json.loads(form["batch"][0]))
+            return json.dumps([{"code": 200, "body": "{}"}] * count).encode()
+        return b'{"recipient_id": "1", "message_id": "m"}'
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def certificate(directory):
+    """Creates a self signed certificate for 127.0.0.1
+
+    Parameters:
+        directory: where to write the certificate (string)
+    Returns:
+        (certificate, key): the paths of the certificate and its key
+    """
+    path = os.path.join(directory, "standin.pem")
+    key = os.path.join(directory, "standin.key")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048",
+                    "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+                    "-addext", "subjectAltName=IP:127.0.0.1",
+                    "-keyout", key, "-out", path],
+                   check=True,
+                   stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL)
+    return (path, key)
+
+
+def users(count):
+    """Returns some registered users sitting at the base options"""
+    return [{"_id": i,
+             "fid": str(i),
+             "pid": i + 1,
+             "name": "Player {}".format(i),
+             "state": BASE,
+             "captain": -1,
+             "game": {},
+             "teamroster": {},
+             "batter": -1} for i in range(0, count)]
+
+
+def post(senders, step):
+    """Returns a webhook post with one text message from each sender"""
+    return {"object": "page",
+            "entry": [{"messaging": [
+                {"sender": {"id": str(sender)},
+                 "recipient": {"id": "page"},
+                 "timestamp": step,
+                 "message": {"mid": "{}.{}".format(sender, step),
+                             "text": "hello"}}
+                for sender in senders]}]}
@@ -0,0 +1,85 @@
+'''
+Name: Dallas Fraser
+Date: 2026-10-18
+Project: Facebook Bot
+Purpose: Replays journaled webhook posts through the event processing
+
+Replies and typing indicators are counted instead of sent, but Mongo and the
+platform are used as configured so point them somewhere safe first.
+
+    python replay.py journal/journal-*.gz --speed 10
+'''
+import argparse
+import json
+import time
+from api import app, group_events, handle_events
+from api.journal import read_segment
+
+
+class StubOutbound():
+    """Counts what would have been sent to facebook"""
+    def __init__(self):
+        self.messages = 0
+        self.actions = 0
+
+    def callback(self, message, sender_id, quick_replies=[], buttons=[]):
+        self.messages += 1
+
+    def typing(self, sender_id):
+        self.actions += 1
+
+
+def replay(paths, speed, outbound):
+    """Replay the posts of the journal segments
+
+    Parameters:
+        paths: the journal segments in the order to replay (list)
+        speed: how many times faster than recorded, 0 for max speed (float)
+        outbound: the stubbed outbound callbacks (StubOutbound)
+    Returns:
+        (posts, events): the number of posts and events replayed
+    """
+    posts = 0
+    events = 0
+    first = None
+    start = time.monotonic()
+    for path in paths:
+        for (timestamp, body) in read_segment(path):
+            if first is None:
+                first = timestamp
+            if speed > 0:
+                wait = (timestamp - first) / speed - (time.monotonic() - start)
+                if wait > 0:
+                    time.sleep(wait)
+            data = json.loads(body.decode("utf-8"))
+            posts += 1
+            if data.get("object") != "page":
+                continue
+            with app.app_context():
+                for sender_events in group_events(data).values():
+                    events += len(sender_events)
+                    handle_events(sender_events,
+                                  callback=outbound.callback,
+                                  typing=outbound.typing)
+    return (posts, events)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("segments", nargs="+",
+                        help="journal segments to replay in order")
+    parser.add_argument("--speed", default="1",
+                        help="1 for real time, N for N times faster or max")
+    args = parser.parse_args()
+    speed = 0 if args.speed == "max" else float(args.speed)
+    outbound = StubOutbound()
+    start = time.monotonic()
+    (posts, events) = replay(args.segments, speed, outbound)
+    elapsed = time.monotonic() - start
+    print("Replayed {} posts ({} events) in {:.2f}s".format(posts,
+                                                           events,
+                                                           elapsed))
+    if elapsed > 0:
+        print("{:.1f} events/s".format(events / elapsed))
+    print("{} messages and {} sender actions stubbed".format(
+        outbound.messages, outbound.actions))
@@ -0,0 +1,35 @@
+'''
+Name: Dallas Fraser
+Date: 2026-10-18
+Project: Facebook Bot
+Purpose: Registers the persistent menu and get started button of the page
+
+Uses the PAGE_ACCESS_TOKEN and GRAPH_URL the bot is configured with.
+
+    python setup_profile.py
+    python setup_profile.py --show
+    python setup_profile.py --delete
+'''
+import argparse
+import json
+import sys
+from api.messenger_profile import messenger_profile, set_messenger_profile,\
+    delete_messenger_profile
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--show", action="store_true",
+                        help="print the profile instead of registering it")
+    parser.add_argument("--delete", action="store_true",
+                        help="remove the menu and get started button")
+    args = parser.parse_args()
+    if args.show:
+        print(json.dumps(messenger_profile(), indent=2))
+        sys.exit(0)
+    if args.delete:
+        done = delete_messenger_profile()
+    else:
+        done = set_messenger_profile()
+    print("Done" if done else "Failed, see the log above")
+    sys.exit(0 if done else 1)